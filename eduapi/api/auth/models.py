@@ -5,6 +5,8 @@ from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
 from django.dispatch import receiver
 from django.db.models.signals import post_save
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.sessions.models import Session
 from django_counter_field import CounterField
 
 from rest_framework.authtoken.models import Token
@@ -68,6 +70,23 @@ class IgniteUser(AbstractBaseUser, PermissionsMixin, TimestampedModel):
     USERNAME_FIELD = 'member_id'
     # REQUIRED_FIELDS = ['oxygen_id']
 
+    def __init__(self, *args, **kwargs):
+        super(IgniteUser, self).__init__(*args, **kwargs)
+
+        # keep tracking the name for doing something when name is changed and saved (None when name is deferred):
+        self._init_name = self.__dict__.get('name')
+        self.name_changed = False
+
+    def save(self, *args, **kwargs):
+        # mark whether the saved name was changed (available for the post_save signal receivers):
+        update_fields = kwargs.get('update_fields')
+        self.name_changed = bool(self.pk) and (update_fields is None or 'name' in update_fields) and self.name != self._init_name
+
+        super(IgniteUser, self).save(*args, **kwargs)
+
+        if self.name_changed:
+            self._init_name = self.name
+
     def username(self):
         return self.name
 
@@ -179,6 +198,34 @@ class ChildGuardian(TimestampedModel):
         unique_together = (('child', 'guardian'),)
 
 
+class UserSession(models.Model):
+    '''
+    Indexed mapping of the users to their logged in sessions (maintained on login), to find the sessions of users
+    without decoding all the sessions. The mapping is deleted with its session (on logout, or expired sessions cleanup).
+    '''
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='user_sessions')
+    session = models.OneToOneField(Session, primary_key=True, related_name='user_session')
+
+    @classmethod
+    def logout_users(cls, users_ids):
+        '''Logs out the users everywhere - deletes all their sessions and auth tokens.'''
+        Session.objects.filter(
+            pk__in=cls.objects.filter(user_id__in=users_ids).values('session_id')
+        ).delete()
+        Token.objects.filter(user_id__in=users_ids).delete()
+
+
+@receiver(user_logged_in)
+def map_user_session(sender, request, user, **kwargs):
+    '''
+    Maps the logged in user to the session.
+    '''
+
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        UserSession.objects.update_or_create(session_id=session_key, defaults={'user': user})
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     '''
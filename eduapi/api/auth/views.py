@@ -74,7 +74,7 @@ class ObtainApiAuthToken(ObtainAuthToken):
 
             #sync the logged in user data from SparkDrive in background via Celery task:
             sync_logged_in_user.delay(
-                user,
+                user.pk,
                 serializer.validated_data['sessionId'],
                 serializer.validated_data['secureSessionId']
             )
@@ -14,6 +14,7 @@ from django.utils.safestring import mark_safe
 import re
 
 from api.models import Project, Notification
+from api.drafts_diff import get_project_draft_diff
 from editor_tools.tools import BadWordsTool
 
 
@@ -249,21 +250,7 @@ class ProjectsReviewAdmin(admin.ModelAdmin):
                             'publishDate': project_origin.publish_date.strftime('%Y-%m-%d %H:%M'),
                             'draftPublishMode': change_publish_mode,
                             'draftOldPublishMode': old_publish_mode,
-                            'draftDiff': {
-                                'id': project_origin.id,
-                                'title': project_origin.draft_object.title,
-                                'diffFields': project_origin.draft_diff_fields(),
-                                'lessons': [{
-                                    'id': lesson.id,
-                                    'title': lesson.draft_object.title,
-                                    'diffFields': lesson.draft_diff_fields(),
-                                    'steps': [{
-                                        'id': step.id,
-                                        'title': step.draft_object.title,
-                                        'diffFields': step.draft_diff_fields(),
-                                    } for step in lesson.steps.all() if step.has_draft]
-                                } for lesson in project_origin.lessons.all() if lesson.has_draft]
-                            }
+                            'draftDiff': get_project_draft_diff(project_origin)
                         }
                         #apply draft:
                         project.draft_apply()
@@ -318,21 +305,7 @@ class ProjectsReviewAdmin(admin.ModelAdmin):
                             'publishDate': project_origin.publish_date.strftime('%Y-%m-%d %H:%M'),
                             'draftPublishMode': change_publish_mode,
                             'draftOldPublishMode': old_publish_mode,
-                            'draftDiff': {
-                                'id': project_origin.id,
-                                'title': project_origin.draft_object.title,
-                                'diffFields': project_origin.draft_diff_fields(),
-                                'lessons': [{
-                                    'id': lesson.id,
-                                    'title': lesson.draft_object.title,
-                                    'diffFields': lesson.draft_diff_fields(),
-                                    'steps': [{
-                                        'id': step.id,
-                                        'title': step.draft_object.title,
-                                        'diffFields': step.draft_diff_fields(),
-                                    } for step in lesson.steps.all() if step.has_draft]
-                                } for lesson in project_origin.lessons.all() if lesson.has_draft]
-                            },
+                            'draftDiff': get_project_draft_diff(project_origin),
                             'feedback': review_feedback_text,
                         }
                         #notify owner when draft was failed:
@@ -365,6 +338,7 @@ class ProjectsReviewAdmin(admin.ModelAdmin):
             'has_changed_publish_mode': has_changed_publish_mode,
             'project_notifications': project_notifications,
             'publish_modes': dict(Project.PUBLISH_MODES),
+            'project_draft_diff': get_project_draft_diff(project) if project.publish_mode == Project.PUBLISH_MODE_PUBLISHED else None,
             'form': form,
             'bad_words_list': self._get_bad_words_list_to_display_for_project(project),
         }
@@ -0,0 +1,103 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Project, Lesson, Step
+
+
+# The cached diff is keyed by the state of the draft and origin trees, the timeout only cleans up old diffs:
+DRAFT_DIFF_CACHE_TIMEOUT = 60*60*24
+
+
+def get_project_draft_tree_state(draft_project):
+    '''
+    Returns tuple of the state of the project draft tree and its origin tree, with a single query: the last 'updated'
+    and the number of rows (and deleted rows) of the projects, lessons and steps.
+    Any save of a draft or an origin object in the trees, apply of the draft, and add or delete of lessons and steps
+    change the state.
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT '
+            '(SELECT MAX("updated") FROM "%(project)s" WHERE "id" IN (%%s, %%s)), '
+            '(SELECT ROW(MAX("updated"), COUNT(*), SUM(CASE WHEN "is_deleted" THEN 1 ELSE 0 END))::text '
+            'FROM "%(lesson)s" WHERE "project_id" IN (%%s, %%s)), '
+            '(SELECT ROW(MAX(s."updated"), COUNT(*), SUM(CASE WHEN s."is_deleted" THEN 1 ELSE 0 END))::text '
+            'FROM "%(step)s" AS s INNER JOIN "%(lesson)s" AS l ON l."id" = s."lesson_id" '
+            'WHERE l."project_id" IN (%%s, %%s))' % {
+                'project': Project._meta.db_table,
+                'lesson': Lesson._meta.db_table,
+                'step': Step._meta.db_table,
+            },
+            [draft_project.pk, draft_project.draft_origin_id] * 3
+        )
+        return tuple(cursor.fetchone())
+
+
+def get_project_draft_diff(project):
+    '''
+    Returns the diff of the project draft tree compared to its origin, or None if the project has no draft.
+    The project can be either the origin project or its draft.
+    The diff is cached by the state of the draft and origin trees (see get_project_draft_tree_state).
+    '''
+    draft_project = project.draft_get()
+    if not draft_project:
+        return None
+
+    tree_state_hash = hashlib.md5(repr(get_project_draft_tree_state(draft_project))).hexdigest()
+    diff_key = 'draft_diff_%s_%s' % (draft_project.id, tree_state_hash)
+    draft_diff = cache.get(diff_key)
+    if draft_diff is None:
+        draft_diff = calculate_project_draft_diff(draft_project)
+        cache.set(diff_key, draft_diff, timeout=DRAFT_DIFF_CACHE_TIMEOUT)
+    return draft_diff
+
+
+def calculate_project_draft_diff(draft_project):
+    '''
+    Calculates the diff of the project draft tree compared to its origin, with a fixed number of queries regardless
+    of the number of lessons and steps.
+    Note: Drafts can not add or remove lessons and steps (the drafts lists do not allow create and delete), so the
+    diff contains only the changed fields of the lessons and steps drafts.
+
+    Returns dict of the project draft diff:
+    {
+        'id': <origin project id>, 'title': <draft title>, 'diffFields': [<changed fields>],
+        'lessons': [{'id': <origin lesson id>, 'title', 'diffFields', 'steps': [{'id', 'title', 'diffFields'}, ...]}, ...],
+    }
+    '''
+    draft_project_qs = Project.objects_with_drafts.filter(pk=draft_project.pk)
+
+    # Get the draft lessons and steps:
+    draft_lessons_qs = Lesson.objects.filter(project=draft_project, draft_origin__isnull=False)
+    draft_lessons = list(draft_lessons_qs.order_by('order').values('id', 'title', 'draft_origin'))
+    draft_steps_qs = Step.objects.filter(lesson__project=draft_project, draft_origin__isnull=False)
+    draft_steps = list(draft_steps_qs.order_by('order').values('id', 'title', 'lesson', 'draft_origin'))
+
+    # Calculate the changed fields of all the objects in the tree:
+    project_diff_fields = Project.draft_bulk_diff_fields(draft_project_qs).get(draft_project.pk, [])
+    lessons_diff_fields = Lesson.draft_bulk_diff_fields(draft_lessons_qs)
+    steps_diff_fields = Step.draft_bulk_diff_fields(draft_steps_qs)
+
+    # Build the steps diff of each draft lesson:
+    lessons_steps_diff = {}
+    for draft_step in draft_steps:
+        lessons_steps_diff.setdefault(draft_step['lesson'], []).append({
+            'id': draft_step['draft_origin'],
+            'title': draft_step['title'],
+            'diffFields': steps_diff_fields.get(draft_step['id'], []),
+        })
+
+    # Build the lessons diff:
+    return {
+        'id': draft_project.draft_origin_id,
+        'title': draft_project.title,
+        'diffFields': project_diff_fields,
+        'lessons': [{
+            'id': draft_lesson['draft_origin'],
+            'title': draft_lesson['title'],
+            'diffFields': lessons_diff_fields.get(draft_lesson['id'], []),
+            'steps': lessons_steps_diff.get(draft_lesson['id'], []),
+        } for draft_lesson in draft_lessons],
+    }
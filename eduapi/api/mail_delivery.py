@@ -0,0 +1,205 @@
+import json
+import time
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+import sendwithus
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django.utils.timezone import now as utc_now
+from django_redis import get_redis_connection
+
+
+# HTTP status codes of failed sends that are worth retrying (rate limits and server errors):
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Redis list of the emails that could not be delivered (JSON of {template_name, email, error, time}):
+REDIS_LIST_DEAD_LETTERS = 'EMAIL_DELIVERY_DEAD_LETTERS'
+
+
+class MailDeliveryError(Exception):
+    """Failed to deliver an email. If retryable, sending the email again later might succeed."""
+    def __init__(self, message, retryable=True):
+        super(MailDeliveryError, self).__init__(message)
+        self.retryable = retryable
+
+
+class MailProvider(object):
+    """
+    Interface of the email providers, that send emails of templates.
+    Each email is a dict of {recipient: {address, name?}, email_data?: {<dict>}, ...} (see sendwithus send API).
+    """
+    # Whether the provider sends by the template id (of the templates list), or by the template name:
+    requires_template_id = True
+
+    def get_templates(self):
+        """Returns dict of the provider templates {name: {id, name, ...}}. Raises MailDeliveryError if failed."""
+        raise NotImplementedError
+
+    def send(self, template_id, email):
+        """Sends the email of the template. Raises MailDeliveryError if failed."""
+        raise NotImplementedError
+
+    def send_batch(self, template_id, emails, concurrency=1):
+        """
+        Sends the emails of the template, concurrently by the given number of threads.
+        Returns list of the errors of the emails (in the emails order), None for each email sent.
+        """
+        def send_email(email):
+            try:
+                self.send(template_id, email)
+            except MailDeliveryError as exc:
+                return exc
+            return None
+
+        if concurrency > 1 and len(emails) > 1:
+            pool = ThreadPool(processes=min(concurrency, len(emails)))
+            try:
+                return pool.map(send_email, emails)
+            finally:
+                pool.close()
+                pool.join()
+        return [send_email(email) for email in emails]
+
+
+class PooledSendWithUsApi(sendwithus.api):
+    """
+    The sendwithus API client (SDK), that sends its requests through a pooled HTTP session, to reuse keep-alive
+    connections across sends (the SDK opens a new connection for each request).
+    """
+
+    def __init__(self, api_key, pool_size=10, timeout=15, **kwargs):
+        sendwithus.api.__init__(self, api_key=api_key, **kwargs)  #Note: sendwithus.api is old style class.
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def _api_request(self, endpoint, http_method, *args, **kwargs):
+        # Same request as the SDK builds (path, auth, client headers and JSON payload), sent through the session:
+        return self.session.request(
+            http_method,
+            self._build_request_path(endpoint),
+            auth=self._build_http_auth(),
+            headers=self._build_request_headers(kwargs.get('headers')),
+            data=self._build_payload(kwargs.get('payload')),
+            timeout=self.timeout,
+        )
+
+
+class SendWithUsMailProvider(MailProvider):
+    """Sends the emails via sendwithus API."""
+
+    def __init__(self):
+        self.client = PooledSendWithUsApi(
+            api_key=settings.SEND_WITH_US_API_KEY,
+            pool_size=settings.EMAIL_DELIVERY_CONCURRENCY,
+        )
+
+    def get_templates(self):
+        resp = self.client.templates()
+        if resp.status_code != 200:
+            raise MailDeliveryError('Failed to load templates list (status %s).' % (resp.status_code,))
+        return {template['name']: template for template in resp.json()}
+
+    def send(self, template_id, email):
+        try:
+            resp = self.client.send(email_id=template_id, **email)
+        except requests.RequestException as exc:
+            raise MailDeliveryError('Request failed: %s' % (exc,))
+        if resp.status_code != 200:
+            raise MailDeliveryError(
+                'Send failed (status %s).' % (resp.status_code,),
+                retryable=resp.status_code in RETRYABLE_STATUS_CODES
+            )
+
+
+class LocMemMailProvider(MailProvider):
+    """
+    Keeps the sent emails in memory (LocMemMailProvider.outbox), for testing and developing offline.
+    Set failures dict of {address: number of sends to fail} to simulate transient failures, and send_delay seconds
+    to simulate the latency of a remote provider.
+    """
+    requires_template_id = False
+    outbox = []
+    failures = {}
+    send_delay = 0
+    _lock = threading.Lock()
+
+    def get_templates(self):
+        return {}
+
+    def send(self, template_id, email):
+        if self.send_delay:
+            time.sleep(self.send_delay)
+        address = email.get('recipient', {}).get('address')
+        with self._lock:
+            if self.failures.get(address):
+                self.failures[address] -= 1
+                raise MailDeliveryError('Simulated failure of %s.' % (address,))
+            self.deliver(template_id, email)
+
+    def deliver(self, template_id, email):
+        self.outbox.append(dict(email, email_id=template_id))
+
+
+class FileMailProvider(LocMemMailProvider):
+    """Writes the sent emails to a file (JSON line per email), set by EMAIL_DELIVERY_FILE_PATH setting."""
+
+    def deliver(self, template_id, email):
+        with open(settings.EMAIL_DELIVERY_FILE_PATH, 'a') as emails_file:
+            emails_file.write(json.dumps(dict(email, email_id=template_id)) + '\n')
+
+
+def get_mail_provider():
+    """Returns new instance of the mail provider class set by EMAIL_DELIVERY_PROVIDER setting."""
+    return import_string(settings.EMAIL_DELIVERY_PROVIDER)()
+
+
+class LazyMailProvider(object):
+    """
+    Class attribute of the mail provider, that creates the provider on first use (e.g in the worker that sends emails,
+    not in every process that imports the tasks), and then keeps it for the process.
+    """
+    def __init__(self):
+        self.provider = None
+
+    def __get__(self, instance, owner):
+        if self.provider is None:
+            self.provider = get_mail_provider()
+        return self.provider
+
+
+def add_dead_letters(template_name, failed_emails):
+    """Stores the emails that could not be delivered: failed_emails is list of (email, error)."""
+    if not failed_emails:
+        return
+    cur_time = str(utc_now())
+    redis_conn = get_redis_connection('default')
+    pipe = redis_conn.pipeline()
+    for email, error in failed_emails:
+        pipe.lpush(REDIS_LIST_DEAD_LETTERS, json.dumps({
+            'template_name': template_name,
+            'email': email,
+            'error': str(error),
+            'time': cur_time,
+        }))
+    pipe.ltrim(REDIS_LIST_DEAD_LETTERS, 0, settings.EMAIL_DELIVERY_DEAD_LETTERS_MAX - 1)
+    pipe.execute()
+
+
+def get_dead_letters(count=100):
+    """Returns list of the last dead letters {template_name, email, error, time} (newest first)."""
+    redis_conn = get_redis_connection('default')
+    return [json.loads(x) for x in redis_conn.lrange(REDIS_LIST_DEAD_LETTERS, 0, count - 1)]
+
+
+def pop_dead_letters(count=100):
+    """Removes and returns the oldest dead letters {template_name, email, error, time}, e.g to send them again."""
+    redis_conn = get_redis_connection('default')
+    pipe = redis_conn.pipeline()
+    pipe.lrange(REDIS_LIST_DEAD_LETTERS, -count, -1)
+    pipe.ltrim(REDIS_LIST_DEAD_LETTERS, 0, -count - 1)
+    dead_letters = pipe.execute()[0]
+    return [json.loads(x) for x in reversed(dead_letters)]
@@ -0,0 +1,73 @@
+import optparse
+from django.core.management.base import BaseCommand
+
+from api.search_indexes.reindex import reindex_search, get_reindex_run
+
+
+class Command(BaseCommand):
+    help = '''Reindexes all the search indexes in parallel chunks across worker processes, and switches the live index
+    to the new index when done.
+
+    Elasticsearch - the new index is built aside of the live index, and the index name alias is switched atomically.
+    Postgres - the documents are replaced in place, and documents not reindexed are removed when done.
+
+    The progress is checkpointed per chunk, so running the command again resumes an unfinished (e.g crashed) run,
+    unless --restart is set.
+    '''
+
+    option_list = BaseCommand.option_list + (
+        optparse.make_option(
+            '--using',
+            action='store',
+            dest='using',
+            default='default',
+            help='The search connection to reindex.'
+        ),
+        optparse.make_option(
+            '--workers',
+            action='store',
+            dest='workers',
+            type='int',
+            default=None,
+            help='Number of worker processes (default: number of CPUs).'
+        ),
+        optparse.make_option(
+            '--chunk-size',
+            action='store',
+            dest='chunk_size',
+            type='int',
+            default=1000,
+            help='Number of objects to index in each chunk.'
+        ),
+        optparse.make_option(
+            '--restart',
+            action='store_false',
+            dest='resume',
+            default=True,
+            help='Start a new run, even if there is an unfinished run to resume.'
+        ),
+        optparse.make_option(
+            '--status',
+            action='store_true',
+            dest='status',
+            default=False,
+            help='Print the status of the unfinished run and exit.'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            reindex_run = get_reindex_run()
+            if reindex_run:
+                self.stdout.write('Reindex run %(run_id)s: %(done_chunks_count)s of %(chunks_count)s chunks done.' % reindex_run)
+            else:
+                self.stdout.write('No unfinished reindex run.')
+            return
+
+        reindex_search(
+            using=options['using'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+            resume=options['resume'],
+            log=self.stdout.write,
+        )
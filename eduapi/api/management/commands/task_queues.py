@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils_app.task_queues import get_task_queues_depth
+
+
+class Command(BaseCommand):
+    help = 'Prints the number of messages waiting in each task queue.'
+
+    def handle(self, *args, **options):
+        queues_depth = get_task_queues_depth()
+        for queue_name, depth in sorted(queues_depth.items()):
+            self.stdout.write('%s: %i messages waiting%s' % (
+                queue_name,
+                depth,
+                ' (backed up)' if depth >= settings.TASK_QUEUES_DEPTH_WARNING else '',
+            ))
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0061_auto_20160124_1655'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='forked_from',
+            field=models.ForeignKey(related_name='forks', on_delete=django.db.models.deletion.SET_NULL, blank=True, to='api.Project', help_text=b'The project this project was forked (deep copied) from', null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.contrib.postgres.fields
+import jsonfield.fields
+import api.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0062_project_forked_from'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.CharField(help_text=b'The search index identifier of the object (app_label.model_name.pk)', max_length=255, serialize=False, primary_key=True)),
+                ('django_ct', models.CharField(help_text=b'The content type of the object (app_label.model_name)', max_length=100, db_index=True)),
+                ('django_id', models.IntegerField(help_text=b'The primary key of the object', db_index=True)),
+                ('content', api.models.fields.TSVectorField(help_text=b'The weighted full text search document', null=True)),
+                ('tags', django.contrib.postgres.fields.ArrayField(default=list, help_text=b'The object tags for exact tags filtering', base_field=models.CharField(max_length=255), size=None, blank=True)),
+                ('data', jsonfield.fields.JSONField(default={}, help_text=b'The object index fields values', blank=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchdocument',
+            unique_together=set([('django_ct', 'django_id')]),
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX api_searchdocument_content_gin ON api_searchdocument USING gin(content);',
+            reverse_sql='DROP INDEX api_searchdocument_content_gin;',
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX api_searchdocument_tags_gin ON api_searchdocument USING gin(tags);',
+            reverse_sql='DROP INDEX api_searchdocument_tags_gin;',
+        ),
+    ]
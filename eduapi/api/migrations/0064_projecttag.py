@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def forward_project_tags(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    Project = apps.get_model('api', 'Project')
+    ProjectTag = apps.get_model('api', 'ProjectTag')
+    tags_field = Project._meta.get_field('tags')
+
+    project_tags = []
+    for project_id, tags in Project.objects.using(db_alias).filter(
+        draft_origin__isnull=True
+    ).exclude(
+        tags=''
+    ).values_list('id', 'tags').iterator():
+        project_tags += [ProjectTag(project_id=project_id, name=tag) for tag in set(tags_field.get_tags_list(tags))]
+    ProjectTag.objects.using(db_alias).bulk_create(project_tags, batch_size=1000)
+
+def backward_project_tags(apps, schema_editor):
+    pass  #do nothing
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0063_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectTag',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=150, db_index=True)),
+                ('project', models.ForeignKey(related_name='project_tags', to='api.Project')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='projecttag',
+            unique_together=set([('project', 'name')]),
+        ),
+        migrations.RunPython(
+            forward_project_tags,
+            backward_project_tags
+        ),
+    ]
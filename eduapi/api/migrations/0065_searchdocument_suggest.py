@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import api.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0064_projecttag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchdocument',
+            name='suggest',
+            field=api.models.fields.TSVectorField(help_text=b'The words of the autocomplete (edge n-gram) fields, for prefix search', null=True),
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX api_searchdocument_suggest_gin ON api_searchdocument USING gin(suggest);',
+            reverse_sql='DROP INDEX api_searchdocument_suggest_gin;',
+        ),
+    ]
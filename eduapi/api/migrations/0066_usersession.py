@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+from django.utils import timezone
+
+
+def forward_user_sessions(apps, schema_editor):
+    from django.contrib.sessions.backends.db import SessionStore
+
+    db_alias = schema_editor.connection.alias
+    Session = apps.get_model('sessions', 'Session')
+    UserSession = apps.get_model('api', 'UserSession')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    # Map the existing logged in sessions (decoded once):
+    sessions_users = {}
+    for session_key, session_data in Session.objects.using(db_alias).filter(
+        expire_date__gt=timezone.now()
+    ).values_list('session_key', 'session_data').iterator():
+        user_id = SessionStore().decode(session_data).get('_auth_user_id')
+        if user_id:
+            sessions_users[session_key] = int(user_id)
+    existing_users_ids = set(User.objects.using(db_alias).filter(
+        pk__in=set(sessions_users.values())
+    ).values_list('pk', flat=True))
+    UserSession.objects.using(db_alias).bulk_create([
+        UserSession(session_id=session_key, user_id=user_id)
+        for session_key, user_id in sessions_users.items() if user_id in existing_users_ids
+    ], batch_size=1000)
+
+def backward_user_sessions(apps, schema_editor):
+    pass  #do nothing
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sessions', '0001_initial'),
+        ('api', '0065_searchdocument_suggest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSession',
+            fields=[
+                ('session', models.OneToOneField(related_name='user_session', primary_key=True, serialize=False, to='sessions.Session')),
+                ('user', models.ForeignKey(related_name='user_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(
+            forward_user_sessions,
+            backward_user_sessions
+        ),
+    ]
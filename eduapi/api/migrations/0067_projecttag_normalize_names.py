@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def forward_normalize_project_tags_names(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    ProjectTag = apps.get_model('api', 'ProjectTag')
+
+    # Lower case the tags names (see ProjectTag.normalize_name), and delete the tags that become duplicates:
+    project_tags_names = set()
+    duplicate_tags_ids = []
+    renamed_tags = []
+    for tag_id, project_id, name in ProjectTag.objects.using(db_alias).order_by('id').values_list('id', 'project_id', 'name').iterator():
+        normalized_name = name.strip().lower()
+        if (project_id, normalized_name) in project_tags_names:
+            duplicate_tags_ids.append(tag_id)
+            continue
+        project_tags_names.add((project_id, normalized_name))
+        if normalized_name != name:
+            renamed_tags.append((tag_id, normalized_name))
+
+    for i in xrange(0, len(duplicate_tags_ids), 1000):
+        ProjectTag.objects.using(db_alias).filter(id__in=duplicate_tags_ids[i:i+1000]).delete()
+    for tag_id, normalized_name in renamed_tags:
+        ProjectTag.objects.using(db_alias).filter(id=tag_id).update(name=normalized_name)
+
+def backward_normalize_project_tags_names(apps, schema_editor):
+    pass  #do nothing
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0066_usersession'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            forward_normalize_project_tags_names,
+            backward_normalize_project_tags_names
+        ),
+    ]
@@ -2,6 +2,7 @@ from ..auth.models import *
 from models import *
 from state import *
 from invites import  *
+from search import *
 
 # External models to have in the module:
 from notifications.models import Notification
@@ -92,3 +92,12 @@ class ArrayJSONField(ArrayField):
             return None
         # since base_field is JSONField, we can use it for dumping the value for display:
         return self.base_field.dumps_for_display(value)
+
+
+class TSVectorField(fields.Field):
+    """
+    Postgres full text search document (tsvector) field.
+    The value is calculated and set in database only (see api.search_indexes.postgres_backend).
+    """
+    def db_type(self, connection):
+        return 'tsvector'
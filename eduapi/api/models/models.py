@@ -1,7 +1,8 @@
+import copy
 import json
 
 from django.contrib.postgres.fields import ArrayField
-from django.db import models
+from django.db import models, transaction, connection
 from django.db.models import Q, Count, Prefetch
 from django.conf import settings
 from django.conf.global_settings import LANGUAGES
@@ -19,7 +20,7 @@ import string
 
 from .mixins import OrderedObjectInContainer
 from .fields import TagsField, ArrayJSONField
-from api.tasks import add_permissions_to_classroom_students, notify_and_mail_users
+from api.tasks import add_permissions_to_classroom_students, notify_and_mail_users, get_object_ref
 
 from marketplace.models import Purchase
 
@@ -287,6 +288,8 @@ class Project(TimestampedModel, PublishableModel, DeleteStatusModel, ChangeableD
 
     is_searchable = models.BooleanField(help_text='Whether the object will be searchable in list of projects', default=True)
 
+    forked_from = models.ForeignKey('self', related_name='forks', null=True, blank=True, on_delete=models.SET_NULL, help_text='The project this project was forked (deep copied) from')
+
     # The classrooms that this project is a part of, or from the other perspective,
     # the projects in the classroom.
     classrooms = models.ManyToManyField(Classroom, through='ProjectInClassroom', related_name='projects')
@@ -303,7 +306,7 @@ class Project(TimestampedModel, PublishableModel, DeleteStatusModel, ChangeableD
                           'teacher_additional_resources', 'teachers_files_list', 'skills_acquired',
                           'learning_objectives', 'grades_range', 'subject', 'technology',]
     # Define allowed fields to update in draft model but will not be applied to origin object
-    draft_writable_meta_fields = ['publish_mode', 'current_editor',]
+    draft_writable_meta_fields = ['publish_mode', 'current_editor', 'updated',]
     # Define allowed fields to create in draft model but will not be updated after creation
     draft_create_fields = []
 
@@ -346,23 +349,67 @@ class Project(TimestampedModel, PublishableModel, DeleteStatusModel, ChangeableD
         # keep tracking the publish_mode for doing something when publish_mode is changed and saved:
         self._init_publish_mode = self.publish_mode if self.pk else None
 
+        # keep tracking the tags for updating the project tags table when tags are changed and saved:
+        self._init_tags = self.__dict__.get('tags') if self.pk else ''
+
     def draft_get_or_create(self, draft_create_fields=None):
         # create the draft with publish_mode 'edit':
         draft_create_fields = draft_create_fields or {}
         draft_create_fields.update({
             'publish_mode': Project.PUBLISH_MODE_EDIT,
         })
-        draft_obj, draft_created = super(Project, self).draft_get_or_create(draft_create_fields)
+        # Note: the draft project and its whole tree are created in a single transaction, to not leave a half built draft.
+        with transaction.atomic():
+            draft_obj, draft_created = super(Project, self).draft_get_or_create(draft_create_fields)
 
-        # if draft was created, then make drafts for all of its lessons:
-        if draft_created:
-            for lesson in self.lessons.all():
-                lesson.draft_get_or_create(draft_create_fields={
-                    'project': draft_obj,
-                })
+            # if draft was created, then make drafts for all of its lessons and their steps:
+            # Note: each level of the tree is created with a single bulk insert, and the counters are fixed at the end.
+            if draft_created:
+                lessons_drafts_ids = Lesson.draft_bulk_create(
+                    self.lessons.all(),
+                    {'project_id': draft_obj.pk}
+                )
+                Step.draft_bulk_create(
+                    Step.objects.filter(lesson_id__in=lessons_drafts_ids.keys()),
+                    lambda step: {'lesson_id': lessons_drafts_ids[step.lesson_id]}
+                )
+                draft_obj.fix_draft_counters()
 
         return draft_obj, draft_created
 
+    def fix_draft_counters(self):
+        """
+        Fixes the counters of the draft project and its lessons drafts, that were bulk created without counters signals.
+        """
+        self.lesson_count = self.lessons.count()
+        Project.objects_with_drafts.filter(pk=self.pk).update(lesson_count=self.lesson_count)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE "%(lesson)s" SET "%(lesson_steps_count)s" = ('
+                'SELECT COUNT(*) FROM "%(step)s" '
+                'WHERE "%(step)s"."%(step_lesson)s" = "%(lesson)s"."%(lesson_pk)s" AND NOT "%(step)s"."%(step_is_deleted)s"'
+                ') WHERE "%(lesson)s"."%(lesson_project)s" = %%s' % {
+                    'lesson': Lesson._meta.db_table,
+                    'lesson_pk': Lesson._meta.pk.column,
+                    'lesson_steps_count': Lesson._meta.get_field('steps_count').column,
+                    'lesson_project': Lesson._meta.get_field('project').column,
+                    'step': Step._meta.db_table,
+                    'step_lesson': Step._meta.get_field('lesson').column,
+                    'step_is_deleted': Step._meta.get_field('is_deleted').column,
+                },
+                [self.pk]
+            )
+
+    def draft_post_apply(self, applied_origins_ids, applied_time):
+        # If anything in the drafts tree was applied, set the origin project 'updated' field to the apply time (already
+        # set if the project itself was applied - the save also reindexes the project), and reindex the lessons applied
+        # in bulk:
+        if any(applied_origins_ids.values()):
+            self.draft_origin.save(update_fields=['updated'], change_updated_field=applied_time)
+            ProjectTag.update_project_tags(self.draft_origin)
+            from api.search_indexes.index_queue import index_objects
+            index_objects(Lesson, applied_origins_ids.get(Lesson, []))
+
     def draft_discard(self, draft_delete_kwargs=None):
         # Note: Since lessons drafts are connected to project draft, the deleting the project draft deletes also lessons drafts.
         draft_delete_kwargs = draft_delete_kwargs or {}
@@ -372,6 +419,43 @@ class Project(TimestampedModel, PublishableModel, DeleteStatusModel, ChangeableD
         draft_discarded = super(Project, self).draft_discard(draft_delete_kwargs)
         return draft_discarded
 
+    def fork(self, owner, fork_fields=None):
+        """
+        Forks (deep copies) the project with all its lessons and steps for the given owner, and returns the new project.
+        The fork is created in edit mode, and keeps provenance to this project in its forked_from field.
+        The whole tree is copied with a fixed number of queries, regardless of the number of lessons and steps.
+        """
+        # Fields that are not copied to the fork:
+        fork_skip_fields = [
+            'id', 'draft_origin', 'forked_from', 'owner', 'current_editor',
+            'publish_mode', 'publish_date', 'min_publish_date',
+            'added', 'updated', 'is_deleted', 'lesson_count', 'students_count',
+        ]
+
+        with transaction.atomic():
+            fork_project = Project(**{
+                f.attname: getattr(self, f.attname)
+                for f in self._meta.concrete_fields if f.name not in fork_skip_fields
+            })
+            fork_project.owner = owner
+            fork_project.forked_from = self
+            for fork_field_key, fork_field_value in (fork_fields or {}).items():
+                setattr(fork_project, fork_field_key, fork_field_value)
+            fork_project.save()
+
+            # Copy all lessons and their steps:
+            lessons_ids_map = Lesson.bulk_copy_lessons_to_project(self.lessons.order_by('order'), fork_project)
+
+            # Copy the extra lessonsInit groups with the new lessons ids:
+            fork_extra = copy.deepcopy(fork_project.extra) or {}
+            if fork_extra.get('lessonsInit'):
+                for lessons_group in fork_extra['lessonsInit']:
+                    lessons_group['lessonsIds'] = [lessons_ids_map[x] for x in lessons_group.get('lessonsIds', []) if x in lessons_ids_map]
+                fork_project.extra = fork_project.validate_extra_field(fork_extra)
+                Project.objects.filter(pk=fork_project.pk).update(extra=fork_project.extra)
+
+        return fork_project
+
     def get_lessons_with_order(self):
         '''
         Returned the lessons of this project, ordered, and with the field 'order'
@@ -390,8 +474,13 @@ class Project(TimestampedModel, PublishableModel, DeleteStatusModel, ChangeableD
         # first, really save the model:
         super(Project, self).save(*args, **kwargs)
 
-        # current publish_mode was saved to db:
+        # current tags were saved to db:
         update_fields = kwargs.get('update_fields')
+        if (update_fields is None or 'tags' in update_fields) and self.tags != self._init_tags:
+            ProjectTag.update_project_tags(self)
+            self._init_tags = self.tags
+
+        # current publish_mode was saved to db:
         if update_fields is None or 'publish_mode' in update_fields:
 
             # re-set the init publish mode to the current saved:
@@ -475,6 +564,28 @@ class Project(TimestampedModel, PublishableModel, DeleteStatusModel, ChangeableD
 
         return False
 
+    @classmethod
+    def is_editor_q(cls, user, project_field=None):
+        """
+        Returns Q filter of the projects that the user is editor of (same as is_editor), to check many projects in one query.
+        Use project_field to filter related objects by their project (e.g 'project' for lessons).
+        """
+        prefix = '%s__' % project_field if project_field else ''
+
+        # Not authenticated user is not editor of any project:
+        if not user.is_authenticated():
+            return models.Q(**{'%spk__in' % prefix: []})
+
+        # super user
+        if user.is_superuser:
+            return models.Q()
+
+        return (
+            models.Q(**{'%sowner' % prefix: user}) |  # owner
+            models.Q(**{'%sowner__in' % prefix: user.delegators.all()}) |  # delegate
+            models.Q(**{'%sowner__in' % prefix: user.children.all()})  # guardian (moderator)
+        )
+
     def is_reviewer(self, user):
         """Super Users are reviewers of projects."""
 
@@ -646,13 +757,16 @@ class Project(TimestampedModel, PublishableModel, DeleteStatusModel, ChangeableD
             recipients_q_params |= models.Q(pk__in=self.owner.delegates.all())  # owner delegates
         recipients_qs = get_user_model().objects.filter(recipients_q_params)
 
-        # Prepare notify kwargs.
-        notify_kwargs['actor'] = self
+        # Prepare notify kwargs (objects are passed to the task as references).
+        notify_kwargs['actor'] = get_object_ref(self)
         notify_kwargs['verb'] = notify_verb
+        for opt in ('target', 'action_object'):
+            if opt in notify_kwargs:
+                notify_kwargs[opt] = get_object_ref(notify_kwargs[opt])
 
         # Notify and optionally send mails to recipients:
         notify_and_mail_users.delay(
-            recipients_qs,
+            list(recipients_qs.values_list('pk', flat=True)),
             _mail_template=send_mail_with_template,
             **notify_kwargs
         )
@@ -798,6 +912,8 @@ class Lesson(OrderedObjectInContainer, TimestampedModel, DeleteStatusModel, Chan
 
     # Define allowed fields to update in draft model
     draft_writable_data_fields = ['title', 'duration',]
+    # Define allowed fields to update in draft model but will not be applied to origin object
+    draft_writable_meta_fields = ['updated',]
     # Define allowed fields to create in draft model but will not be updated after creation
     draft_create_fields = ['project',]
 
@@ -846,10 +962,9 @@ class Lesson(OrderedObjectInContainer, TimestampedModel, DeleteStatusModel, Chan
                 'project': draft_project,
             })
             draft_obj, draft_created = super(Lesson, self).draft_get_or_create(draft_create_fields)
-            # if draft was created, then make drafts for all of its steps:
+            # if draft was created, then make drafts for all of its steps (single bulk insert):
             if draft_created:
-                for step in self.steps.all():
-                    step.draft_get_or_create()
+                Step.draft_bulk_create(self.steps.all(), {'lesson_id': draft_obj.pk})
         # otherwise, if draft project doesn't exist - create drafts for the project:
         else:
             self.project.draft_get_or_create()
@@ -863,6 +978,71 @@ class Lesson(OrderedObjectInContainer, TimestampedModel, DeleteStatusModel, Chan
         # Do not allow discard only lesson draft - discard the whole project draft
         return False
 
+    @classmethod
+    def bulk_copy_lessons_to_project(cls, lessons, to_project):
+        """
+        Copies the lessons with all their steps to the end of the project lessons list (keeping the lessons order as
+        given), using a fixed number of queries regardless of the number of lessons and steps.
+        Returns dict of {copied lesson id: new lesson id}.
+        """
+        lessons = list(lessons)
+        if not lessons:
+            return {}
+
+        # Get all the steps of the lessons:
+        lessons_steps = {}
+        for step in Step.objects.filter(lesson_id__in=[x.id for x in lessons]).order_by('lesson', 'order'):
+            lessons_steps.setdefault(step.lesson_id, []).append(step)
+
+        with transaction.atomic():
+            # Lock the project lessons ordering (same as OrderedObjectInContainer), and append the new lessons to the end:
+            qs_project_lessons = Lesson.objects.filter(project=to_project)
+            list(qs_project_lessons.values('order').order_by('-order').select_for_update())
+            first_order = qs_project_lessons.count()
+
+            Lesson.objects.bulk_create([
+                Lesson(
+                    project=to_project,
+                    order=first_order + i,
+                    title=lesson.title,
+                    duration=lesson.duration,
+                    application=lesson.application,
+                    application_blob=lesson.application_blob,
+                    steps_count=len(lessons_steps.get(lesson.id, [])),
+                ) for i, lesson in enumerate(lessons)
+            ])
+
+            # Get the new lessons ids by their order in the project:
+            new_lessons_ids_by_order = dict(
+                qs_project_lessons.filter(order__gte=first_order).values_list('order', 'id')
+            )
+            lessons_ids_map = {
+                lesson.id: new_lessons_ids_by_order[first_order + i]
+                for i, lesson in enumerate(lessons)
+            }
+
+            Step.objects.bulk_create([
+                Step(
+                    lesson_id=lessons_ids_map[step.lesson_id],
+                    order=step.order,
+                    title=step.title,
+                    description=step.description,
+                    image=step.image,
+                    application_blob=step.application_blob,
+                    instructions_list=step.instructions_list,
+                ) for lesson_steps in lessons_steps.values() for step in lesson_steps
+            ])
+
+            # Fix the project lessons counter once:
+            Project.objects_with_drafts.filter(pk=to_project.pk).update(lesson_count=first_order + len(lessons))
+            to_project.lesson_count = first_order + len(lessons)
+
+        # Index the new lessons in bulk (bulk create does not send save signals):
+        from api.search_indexes.index_queue import index_objects
+        index_objects(Lesson, lessons_ids_map.values())
+
+        return lessons_ids_map
+
     def copy_lesson_steps(self, to_lesson):
         base_steps = self.steps.all()
         new_steps = [Step(
@@ -914,6 +1094,8 @@ class Step(OrderedObjectInContainer, TimestampedModel, DeleteStatusModel, Change
 
     # Define allowed fields to update in draft model
     draft_writable_data_fields = ['title', 'description', 'image', 'instructions_list',]
+    # Define allowed fields to update in draft model but will not be applied to origin object
+    draft_writable_meta_fields = ['updated',]
     # Define allowed fields to create in draft model but will not be updated after creation
     draft_create_fields = ['lesson',]
 
@@ -993,13 +1175,72 @@ class ProjectInClassroom(OrderedObjectInContainer, TimestampedModel):
 
         ret = super(ProjectInClassroom, self).save(*args, **kwargs)
 
-        # If a locked project is added to the classroom, update purchases
+        # If a locked project is added to the classroom, update purchases of the project (once for repeated saves)
         if self.project.lock != Project.NO_LOCK:
-            add_permissions_to_classroom_students.delay(self.classroom)
+            add_permissions_to_classroom_students.coalesce(self.classroom_id, project_id=self.project_id)
 
         return ret
 
 
+class ProjectTag(models.Model):
+    '''
+    A single tag of a project, normalized from the project tags field (maintained when the project is saved).
+    Used for indexed filtering of projects by tags, and for counting the projects of each tag.
+    Tags names are stored lower case (see normalize_name), so tags are matched case insensitive.
+    '''
+
+    project = models.ForeignKey(Project, related_name='project_tags')
+    name = models.CharField(max_length=150, db_index=True)
+
+    class Meta:
+        unique_together = (('project', 'name'),)
+
+    @staticmethod
+    def normalize_name(name):
+        """Returns the tag name as stored in the tags rows."""
+        return name.strip().lower()
+
+    @classmethod
+    def update_project_tags(cls, project):
+        """Updates the tags rows of the project to its current tags field (drafts have no tags rows)."""
+        tags = set()
+        if project.draft_origin_id is None:
+            tags = set(filter(None, [
+                cls.normalize_name(tag) for tag in Project._meta.get_field('tags').get_tags_list(project.tags or '')
+            ]))
+        current_tags = set(cls.objects.filter(project=project).values_list('name', flat=True))
+
+        if current_tags - tags:
+            cls.objects.filter(project=project, name__in=current_tags - tags).delete()
+        if tags - current_tags:
+            cls.objects.bulk_create([cls(project=project, name=tag) for tag in tags - current_tags])
+
+    @classmethod
+    def get_projects_with_tags(cls, tags):
+        """Returns values queryset of the ids of the projects that have all the tags (to use as subquery)."""
+        tags = set([cls.normalize_name(tag) for tag in tags])
+        return cls.objects.filter(
+            name__in=tags
+        ).values(
+            'project'
+        ).annotate(
+            tags_count=Count('pk')
+        ).filter(
+            tags_count=len(tags)
+        ).values('project')
+
+    @classmethod
+    def get_tags_counts(cls, projects_queryset):
+        """Returns values queryset of the tags of the projects, with the number of projects of each tag (tag, count)."""
+        return cls.objects.filter(
+            project__in=projects_queryset.order_by().values('pk')
+        ).values(
+            'name'
+        ).annotate(
+            count=Count('project')
+        ).order_by('-count', 'name')
+
+
 class ProjectGroup(models.Model):
     group_name = models.CharField(max_length=15, unique=True)
     projects = ArrayField(models.IntegerField(verbose_name='Projects IDs'))
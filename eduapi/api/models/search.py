@@ -0,0 +1,24 @@
+from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from jsonfield import JSONField
+
+from .fields import TSVectorField
+
+
+class SearchDocument(models.Model):
+    """
+    Search index document of an object, used by the Postgres search backend (api.search_indexes.postgres_backend).
+    """
+    id = models.CharField(help_text='The search index identifier of the object (app_label.model_name.pk)', primary_key=True, max_length=255)
+    django_ct = models.CharField(help_text='The content type of the object (app_label.model_name)', max_length=100, db_index=True)
+    django_id = models.IntegerField(help_text='The primary key of the object', db_index=True)
+
+    content = TSVectorField(help_text='The weighted full text search document', null=True)  # GIN indexed
+    suggest = TSVectorField(help_text='The words of the autocomplete (edge n-gram) fields, for prefix search', null=True)  # GIN indexed
+    tags = ArrayField(models.CharField(max_length=255), help_text='The object tags for exact tags filtering', default=list, blank=True)  # GIN indexed
+    data = JSONField(help_text='The object index fields values', blank=True, default={})
+
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (('django_ct', 'django_id'),)
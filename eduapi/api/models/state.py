@@ -273,7 +273,7 @@ class ClassroomState(TimestampedModel):
             ((self.__original_status != self.APPROVED_STATUS) or (self.__original_pk is None))
             ):
 
-            add_permissions_to_classroom_students.delay(self.classroom)
+            add_permissions_to_classroom_students.coalesce(self.classroom_id, student_id=self.user_id)
 
             if self.user.is_child:
                 # Send email invites.
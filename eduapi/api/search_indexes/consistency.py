@@ -0,0 +1,99 @@
+from django.utils import timezone
+from haystack import connections
+from haystack.query import SearchQuerySet
+
+from .index_queue import index_objects
+
+
+def _normalize_updated(updated):
+    # The index keeps datetimes without timezone and microseconds (UTC):
+    if updated is None:
+        return None
+    if timezone.is_aware(updated):
+        updated = timezone.make_naive(updated, timezone.utc)
+    return updated.replace(microsecond=0)
+
+
+def _get_indexed_updated(search_query_set, pks, updated_field):
+    """Returns dict of {pk: updated} of the indexed objects of the pks."""
+    results = search_query_set.filter(django_id__in=pks)[:len(pks)]
+    return {
+        int(result.pk): _normalize_updated(getattr(result, updated_field, None))
+        for result in results if result is not None
+    }
+
+
+def _get_orphan_pks(search_query_set, index_queryset, chunk_size):
+    """Returns the pks of the indexed objects that do not exist in the index queryset, scanning the index in chunks."""
+    orphan_pks = set()
+    indexed_count = search_query_set.count()
+    for i in xrange(0, indexed_count, chunk_size):
+        indexed_pks = set([int(x) for x in search_query_set.values_list('pk', flat=True)[i:i+chunk_size]])
+        existing_pks = set(index_queryset.filter(pk__in=indexed_pks).values_list('pk', flat=True))
+        orphan_pks |= indexed_pks - existing_pks
+    return orphan_pks
+
+
+def check_model_index_consistency(model, using='default', chunk_size=500, reindex=True):
+    """
+    Compares the objects of the model index queryset and the search index, in chunks of pks, and returns the drift:
+    {db_count, index_count, missing: [pks not indexed], stale: [pks indexed before updated], orphans: [pks indexed and
+    not found in the database (e.g deleted)]}.
+    If reindex is True, then the drifted objects are enqueued to be reindexed (orphans are removed from the index).
+    """
+    index = connections[using].get_unified_index().get_index(model)
+    updated_field = index.get_updated_field() or 'updated'
+    index_queryset = index.index_queryset(using=using)
+    search_query_set = SearchQuerySet(using=using).models(model)
+
+    # Compare the database and the index pk/updated watermarks of each chunk (by pks order):
+    db_count = 0
+    missing_pks, stale_pks = set(), set()
+    last_pk = None
+    while True:
+        chunk_queryset = index_queryset.order_by('pk')
+        if last_pk is not None:
+            chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+        db_updated = dict(chunk_queryset.values_list('pk', updated_field)[:chunk_size])
+        if not db_updated:
+            break
+        db_count += len(db_updated)
+        last_pk = max(db_updated.keys())
+
+        indexed_updated = _get_indexed_updated(search_query_set, db_updated.keys(), updated_field)
+        for pk, updated in db_updated.items():
+            if pk not in indexed_updated:
+                missing_pks.add(pk)
+            elif indexed_updated[pk] is None or indexed_updated[pk] < _normalize_updated(updated):
+                stale_pks.add(pk)
+
+    # Find the orphans only when there are more indexed objects than expected:
+    index_count = search_query_set.count()
+    orphan_pks = set()
+    if index_count > db_count - len(missing_pks):
+        orphan_pks = _get_orphan_pks(search_query_set, index_queryset, chunk_size)
+
+    if reindex:
+        index_objects(model, missing_pks | stale_pks | orphan_pks)
+
+    return {
+        'db_count': db_count,
+        'index_count': index_count,
+        'missing': sorted(missing_pks),
+        'stale': sorted(stale_pks),
+        'orphans': sorted(orphan_pks),
+    }
+
+
+def check_index_consistency(using='default', chunk_size=500, reindex=True):
+    """
+    Checks the search index consistency of all the indexed models (see check_model_index_consistency).
+    Returns dict of {model label: drift}.
+    """
+    unified_index = connections[using].get_unified_index()
+    return {
+        '%s.%s' % (model._meta.app_label, model._meta.model_name): check_model_index_consistency(
+            model, using=using, chunk_size=chunk_size, reindex=reindex
+        )
+        for model in unified_index.get_indexed_models()
+    }
@@ -0,0 +1,167 @@
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from .updates import update_objects_index
+from .reindex import REDIS_HASH_REINDEX_RUN, REDIS_SET_REINDEX_FLUSHED_OBJECTS
+from .results_cache import bump_search_results_generation
+
+
+# Redis hash of the pending objects to index {'app_label.model_name.pk': enqueue timestamp}:
+REDIS_HASH_QUEUE = 'SEARCH_INDEX_QUEUE'
+# Redis hash of the last flush stats:
+REDIS_HASH_QUEUE_STATS = 'SEARCH_INDEX_QUEUE_STATS'
+# Redis key marking that a flush task is already scheduled:
+REDIS_KEY_FLUSH_SCHEDULED = 'SEARCH_INDEX_QUEUE_FLUSH_SCHEDULED'
+
+# Objects changed inside a transaction, pending to be enqueued after the transaction is committed {model: set(pks)}:
+_pending_on_commit = threading.local()
+
+
+def _object_marker(model, pk):
+    return '%s.%s.%s' % (model._meta.app_label, model._meta.model_name, pk)
+
+
+def enqueue_objects_index(model, pks):
+    """
+    Adds the model objects to the search index queue, and schedules a flush of the queue.
+    Objects that are already pending in the queue are coalesced (keeping their first enqueue time).
+    """
+    pks = set(pks)
+    if not pks:
+        return
+
+    redis_conn = get_redis_connection('default')
+    enqueue_time = time.time()
+    pipe = redis_conn.pipeline(transaction=False)
+    for pk in pks:
+        pipe.hsetnx(REDIS_HASH_QUEUE, _object_marker(model, pk), enqueue_time)
+    pipe.execute()
+
+    # Schedule flush task only once for all the objects enqueued until it runs:
+    flush_delay = settings.SEARCH_INDEX_QUEUE_FLUSH_DELAY
+    if redis_conn.set(REDIS_KEY_FLUSH_SCHEDULED, enqueue_time, nx=True, ex=max(flush_delay, 1) * 10):
+        from api.tasks import flush_search_index_queue
+        flush_search_index_queue.apply_async(countdown=flush_delay)
+
+
+def enqueue_objects_index_on_commit(model, pks):
+    """
+    Adds the model objects to the search index queue after the current transaction is committed, so the flush does
+    not index uncommitted state. Outside of a transaction the objects are enqueued now.
+    Note: Django 1.8 has no commit hooks, so the objects are kept until the end of the request or task (see
+    enqueue_pending_objects_index), or until the next enqueue outside of a transaction.
+    """
+    if transaction.get_connection().in_atomic_block:
+        pending_objects = getattr(_pending_on_commit, 'objects', None)
+        if pending_objects is None:
+            pending_objects = _pending_on_commit.objects = {}
+        pending_objects.setdefault(model, set()).update(pks)
+    else:
+        enqueue_pending_objects_index()
+        enqueue_objects_index(model, pks)
+
+
+def enqueue_pending_objects_index(**kwargs):
+    """
+    Adds the objects that were changed inside a transaction to the search index queue.
+    Connected to the end of the requests and tasks (see IgniteSignalProcessor). Objects of a transaction that was
+    rolled back are enqueued as well, and the flush indexes their committed state (or removes them if not found).
+    """
+    pending_objects = getattr(_pending_on_commit, 'objects', None)
+    _pending_on_commit.objects = None
+    for model, pks in (pending_objects or {}).items():
+        enqueue_objects_index(model, pks)
+
+
+def index_objects(model, pks):
+    """
+    Indexes the model objects - enqueues them when the search index queue is enabled, otherwise updates the index now.
+    """
+    if settings.SEARCH_INDEX_QUEUE_ENABLED:
+        enqueue_objects_index_on_commit(model, pks)
+    else:
+        update_objects_index(model, pks)
+
+
+def flush_objects_index_queue():
+    """
+    Indexes all the pending objects in the search index queue, with bulk update and remove per model.
+    Returns dict of the flush stats {count, max_lag, flush_time}.
+    """
+    redis_conn = get_redis_connection('default')
+    redis_conn.delete(REDIS_KEY_FLUSH_SCHEDULED)  # objects enqueued from now on will schedule another flush
+
+    # Move the pending objects aside, so objects enqueued while flushing are kept for the next flush:
+    processing_hash = '%s_PROCESSING_%s' % (REDIS_HASH_QUEUE, uuid.uuid4().hex)
+    try:
+        redis_conn.rename(REDIS_HASH_QUEUE, processing_hash)
+    except ResponseError:
+        # queue is empty:
+        return {'count': 0, 'max_lag': 0, 'flush_time': time.time()}
+
+    pending_objects = redis_conn.hgetall(processing_hash)
+
+    # Log the flushed objects during a reindex run, to reindex them into the new index too (see catch_up_reindex):
+    if redis_conn.exists(REDIS_HASH_REINDEX_RUN):
+        redis_conn.sadd(REDIS_SET_REINDEX_FLUSHED_OBJECTS, *pending_objects.keys())
+
+    # Group the objects pks by model:
+    models_pks = {}
+    for marker in pending_objects.keys():
+        app_label, model_name, pk = marker.rsplit('.', 2)
+        models_pks.setdefault((app_label, model_name), set()).add(int(pk))
+
+    try:
+        batch_size = settings.SEARCH_INDEX_QUEUE_BATCH_SIZE
+        for (app_label, model_name), pks in models_pks.items():
+            model = apps.get_model(app_label, model_name)
+            pks = sorted(pks)
+            for i in xrange(0, len(pks), batch_size):
+                update_objects_index(model, pks[i:i+batch_size])
+    except Exception:
+        # Return the objects to the queue (keeping their first enqueue time), to be indexed in the next flush:
+        pipe = redis_conn.pipeline(transaction=False)
+        for marker, enqueue_time in pending_objects.items():
+            pipe.hsetnx(REDIS_HASH_QUEUE, marker, enqueue_time)
+        pipe.delete(processing_hash)
+        pipe.execute()
+        raise
+
+    redis_conn.delete(processing_hash)
+
+    # Invalidate the cached search results (once again, after all the batches were indexed):
+    bump_search_results_generation()
+
+    # Save the flush stats:
+    flush_time = time.time()
+    flush_stats = {
+        'count': len(pending_objects),
+        'max_lag': flush_time - min(float(x) for x in pending_objects.values()),
+        'flush_time': flush_time,
+    }
+    redis_conn.hmset(REDIS_HASH_QUEUE_STATS, flush_stats)
+    return flush_stats
+
+
+def get_objects_index_queue_stats():
+    """
+    Returns dict of the search index queue stats:
+    {pending_count, pending_max_lag, last_flush_count, last_flush_max_lag, last_flush_time}.
+    """
+    redis_conn = get_redis_connection('default')
+    pending_enqueue_times = [float(x) for x in redis_conn.hvals(REDIS_HASH_QUEUE)]
+    last_flush_stats = redis_conn.hgetall(REDIS_HASH_QUEUE_STATS)
+    return {
+        'pending_count': len(pending_enqueue_times),
+        'pending_max_lag': time.time() - min(pending_enqueue_times) if pending_enqueue_times else 0,
+        'last_flush_count': int(last_flush_stats.get('count', 0)),
+        'last_flush_max_lag': float(last_flush_stats.get('max_lag', 0)),
+        'last_flush_time': float(last_flush_stats['flush_time']) if 'flush_time' in last_flush_stats else None,
+    }
@@ -12,6 +12,13 @@ class ProjectIndex(indexes.SearchIndex, indexes.Indexable):
     owner_name = indexes.CharField(model_attr='owner__name')  # Note: can be faceted to get owners counters
     teacher_additional_resources = indexes.CharField(model_attr='teacher_additional_resources')
     updated = indexes.DateTimeField(model_attr='updated')
+    lessons_titles = indexes.MultiValueField()
+    suggest = indexes.EdgeNgramField()  # autocomplete of titles, tags and author name
+
+    # visibility fields (for filtering allowed projects in the search engine):
+    publish_mode = indexes.CharField(model_attr='publish_mode')
+    is_searchable = indexes.BooleanField(model_attr='is_searchable')
+    owner_id = indexes.IntegerField(model_attr='owner_id')
 
     # settings
     _tags_model_field = Project._meta.get_field_by_name('tags')[0]
@@ -25,24 +32,20 @@ class ProjectIndex(indexes.SearchIndex, indexes.Indexable):
             updated__lte=datetime.datetime.now()
         ).select_related(
             'owner'
+        ).prefetch_related(
+            'lessons'
         )
 
+    def prepare_lessons_titles(self, obj):
+        return [lesson.title for lesson in obj.lessons.all()]
+
+    def prepare_suggest(self, obj):
+        return ' '.join([obj.title, obj.owner.name or ''] + self.prepare_tags(obj) + self.prepare_lessons_titles(obj))
+
     def prepare_tags(self, obj):
         value = self._tags_model_field.get_tags_list(obj.tags)
         return value
 
-    def update_owner_projects(self, owner, using=None):
-        # get all projects of the owner for updating index:
-        index_queryset = self.get_model().objects.filter(
-            owner=owner
-        ).select_related(
-            'owner'
-        )
-
-        backend = self._get_backend(using)
-        if backend is not None:
-            backend.update(self, index_queryset)
-
 
 class LessonIndex(indexes.SearchIndex, indexes.Indexable):
     text = indexes.CharField(document=True, use_template=True)
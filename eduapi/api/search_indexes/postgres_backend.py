@@ -0,0 +1,382 @@
+import datetime
+import json
+import logging
+import re
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections as db_connections, transaction
+from haystack import connections, indexes
+from haystack.backends import BaseEngine, BaseSearchBackend, BaseSearchQuery
+from haystack.constants import ID, DJANGO_CT, DJANGO_ID, DOCUMENT_FIELD
+from haystack.models import SearchResult
+from haystack.utils import get_identifier
+
+from api.models import SearchDocument
+
+
+logger = logging.getLogger('haystack')
+
+
+def _get_model_ct(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.model_name)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Haystack search backend that keeps the search documents in Postgres (SearchDocument table), with a weighted
+    tsvector column (GIN indexed) for full text search, and a tags array column (GIN indexed) for exact tags filtering.
+    The n-gram fields (e.g EdgeNgramField for autocomplete) are kept in a separate tsvector column (GIN indexed) of
+    the words as is (the 'simple' configuration), and are searched by words prefix.
+
+    Connection options:
+        DATABASE - the database alias to use (default: 'default').
+        SEARCH_CONFIG - the Postgres text search configuration (default: 'english').
+        FIELD_WEIGHTS - dict of {index field name: weight} of the fields to add to the tsvector. The document field
+                        is always added with the lowest weight 'D'.
+    """
+    DEFAULT_FIELD_WEIGHTS = {
+        'title': 'A',
+        'tags': 'B',
+        'owner_name': 'C',
+    }
+    # ts_rank weights of {D, C, B, A}:
+    RANK_WEIGHTS = '{0.1, 0.2, 0.4, 1.0}'
+    SUGGEST_SEARCH_CONFIG = 'simple'
+
+    def __init__(self, connection_alias, **connection_options):
+        super(PostgresSearchBackend, self).__init__(connection_alias, **connection_options)
+        self.database = connection_options.get('DATABASE', 'default')
+        self.search_config = connection_options.get('SEARCH_CONFIG', 'english')
+        self.field_weights = connection_options.get('FIELD_WEIGHTS', self.DEFAULT_FIELD_WEIGHTS)
+        self.table = SearchDocument._meta.db_table
+
+    def _prepare_document(self, index, obj):
+        """Returns tuple of (sql, params) of the values row of the object search document."""
+        prepared_data = index.full_prepare(obj)
+        content_field_name = index.get_content_field()
+
+        ngram_fields_names = [name for name, field in index.fields.items() if isinstance(field, indexes.NgramField)]
+        data = {
+            key: value for key, value in prepared_data.items()
+            if key not in [ID, DJANGO_CT, DJANGO_ID, content_field_name] + ngram_fields_names
+        }
+        suggest_text = ' '.join([unicode(prepared_data.get(name) or '') for name in sorted(ngram_fields_names)])
+
+        # Build the weighted tsvector of the document field and the weighted fields:
+        weighted_texts = [(prepared_data.get(content_field_name), 'D')]
+        for field_name, weight in sorted(self.field_weights.items()):
+            value = data.get(field_name)
+            if isinstance(value, (list, tuple, set)):
+                value = ' '.join([unicode(x) for x in value])
+            weighted_texts.append((value, weight))
+        content_sql = ' || '.join(
+            ['setweight(to_tsvector(%s::regconfig, %s), %s)'] * len(weighted_texts)
+        )
+        content_params = []
+        for text, weight in weighted_texts:
+            content_params += [self.search_config, unicode(text) if text else '', weight]
+
+        tags = data.get('tags') or []
+        if not isinstance(tags, (list, tuple, set)):
+            tags = [tags]
+
+        return (
+            '(%%s, %%s, %%s, %s, to_tsvector(%%s::regconfig, %%s), %%s, %%s, now())' % content_sql,
+            [prepared_data[ID], prepared_data[DJANGO_CT], int(prepared_data[DJANGO_ID])] + content_params + [
+                self.SUGGEST_SEARCH_CONFIG,
+                suggest_text,
+                [unicode(x) for x in tags],
+                json.dumps(data, cls=DjangoJSONEncoder),
+            ]
+        )
+
+    def update(self, index, iterable, commit=True):
+        try:
+            # Prepare the documents (keep the last document of each object id):
+            documents = {}
+            for obj in iterable:
+                document_sql, document_params = self._prepare_document(index, obj)
+                documents[document_params[0]] = (document_sql, document_params)
+            documents = documents.values()
+            with transaction.atomic(using=self.database), db_connections[self.database].cursor() as cursor:
+                for i in xrange(0, len(documents), self.batch_size):
+                    documents_batch = documents[i:i+self.batch_size]
+                    # Replace the documents (delete and insert in bulk):
+                    cursor.execute(
+                        'DELETE FROM "%s" WHERE "id" IN %%s' % self.table,
+                        [tuple([params[0] for _, params in documents_batch])]
+                    )
+                    insert_params = []
+                    for _, params in documents_batch:
+                        insert_params += params
+                    cursor.execute(
+                        'INSERT INTO "%s" ("id", "django_ct", "django_id", "content", "suggest", "tags", "data", "updated") VALUES %s' % (
+                            self.table,
+                            ', '.join([sql for sql, _ in documents_batch]),
+                        ),
+                        insert_params
+                    )
+        except Exception as e:
+            if not self.silently_fail:
+                raise
+            logger.error('Failed to update index of %s: %s', index.get_model().__name__, e, exc_info=True)
+
+    def remove(self, obj_or_string, commit=True):
+        try:
+            with db_connections[self.database].cursor() as cursor:
+                cursor.execute('DELETE FROM "%s" WHERE "id" = %%s' % self.table, [get_identifier(obj_or_string)])
+        except Exception as e:
+            if not self.silently_fail:
+                raise
+            logger.error('Failed to remove document "%s" from index: %s', get_identifier(obj_or_string), e, exc_info=True)
+
+    def clear(self, models=None, commit=True):
+        with db_connections[self.database].cursor() as cursor:
+            if models:
+                cursor.execute(
+                    'DELETE FROM "%s" WHERE "django_ct" IN %%s' % self.table,
+                    [tuple([_get_model_ct(model) for model in models])]
+                )
+            else:
+                cursor.execute('DELETE FROM "%s"' % self.table)
+
+    def remove_documents_updated_before(self, models, updated_before):
+        """Removes the documents of the models that were not updated since the given timestamp."""
+        with db_connections[self.database].cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM "%s" WHERE "django_ct" IN %%s AND "updated" < to_timestamp(%%s)' % self.table,
+                [tuple([_get_model_ct(model) for model in models]), updated_before]
+            )
+            return cursor.rowcount
+
+    def _get_sort_sql(self, sort_by):
+        sort_sql = []
+        for sort_field in sort_by or []:
+            direction = 'DESC' if sort_field.startswith('-') else 'ASC'
+            sort_field = sort_field.lstrip('-')
+            if sort_field == 'score':
+                sort_sql.append('"score" %s' % direction)
+            elif sort_field in [ID, DJANGO_ID, 'pk']:
+                sort_sql.append('"django_id" %s' % direction)
+            elif re.match(r'^\w+$', sort_field):
+                sort_sql.append('("data"::jsonb ->> \'%s\') %s' % (sort_field, direction))
+        return sort_sql or ['"score" DESC', '"django_id" DESC']
+
+    def search(self, query_string, sort_by=None, start_offset=0, end_offset=None, fields='', models=None,
+               result_class=None, limit_to_registered_models=True, sql_params=None, rank_query=None, **kwargs):
+        if not query_string:
+            return {'results': [], 'hits': 0}
+
+        unified_index = connections[self.connection_alias].get_unified_index()
+        if models:
+            models_cts = [_get_model_ct(model) for model in models]
+        elif limit_to_registered_models:
+            models_cts = [_get_model_ct(model) for model in unified_index.get_indexed_models()]
+        else:
+            models_cts = None
+
+        # Score by weighted ranking of the searched terms:
+        params = []
+        if rank_query:
+            score_sql = 'ts_rank(%s::float4[], "content", to_tsquery(%s::regconfig, %s))'
+            params += [self.RANK_WEIGHTS, self.search_config, rank_query]
+        else:
+            score_sql = '0'
+
+        where_sql = '(%s)' % query_string
+        if models_cts is not None:
+            if not models_cts:
+                return {'results': [], 'hits': 0}
+            where_sql = '"django_ct" IN %%s AND %s' % where_sql
+            params.append(tuple(models_cts))
+        params += list(sql_params or [])
+
+        sql = 'SELECT "django_ct", "django_id", "data", %s AS "score", COUNT(*) OVER () AS "hits" FROM "%s" WHERE %s ORDER BY %s' % (
+            score_sql,
+            self.table,
+            where_sql,
+            ', '.join(self._get_sort_sql(sort_by)),
+        )
+        if end_offset is not None:
+            sql += ' LIMIT %d' % max(end_offset - start_offset, 0)
+        if start_offset:
+            sql += ' OFFSET %d' % start_offset
+
+        with db_connections[self.database].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            if rows:
+                hits = rows[0][4]
+            elif start_offset:
+                # page is out of range - count all the matching documents:
+                cursor.execute('SELECT COUNT(*) FROM (%s) AS "page"' % sql.split(' ORDER BY ')[0], params)
+                hits = cursor.fetchone()[0]
+            else:
+                hits = 0
+
+        result_class = result_class or SearchResult
+        results = []
+        for django_ct, django_id, data, score, _ in rows:
+            app_label, model_name = django_ct.split('.')
+            data = json.loads(data) if isinstance(data, basestring) else (data or {})
+
+            # Convert the stored data values to the index fields types:
+            model_index = unified_index.get_indexes().get(apps.get_model(app_label, model_name))
+            result_data = {}
+            for key, value in data.items():
+                if model_index and key in model_index.fields:
+                    value = model_index.fields[key].convert(value)
+                result_data[str(key)] = value
+
+            results.append(result_class(app_label, model_name, django_id, score, **result_data))
+
+        return {
+            'results': results,
+            'hits': hits,
+            'facets': {},
+            'spelling_suggestion': None,
+        }
+
+    def more_like_this(self, model_instance, additional_query_string=None, result_class=None, **kwargs):
+        raise NotImplementedError('Postgres search backend does not support more like this.')
+
+
+class PostgresSearchQuery(BaseSearchQuery):
+    """
+    Builds the query string as SQL condition on the SearchDocument table. The values are passed to the backend as
+    SQL parameters (sql_params), and the searched terms are passed for ranking (rank_query).
+    """
+    TERM_REGEX = re.compile(r'[^\W_]+', re.UNICODE)
+    TEXT_FILTER_TYPES = ['content', 'contains', 'fuzzy', 'startswith', 'exact', 'in']
+    COMPARE_FILTER_TYPES = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+    def build_query(self):
+        self._sql_params = []
+        self._rank_terms = []
+        return super(PostgresSearchQuery, self).build_query()
+
+    def build_params(self, *args, **kwargs):
+        search_kwargs = super(PostgresSearchQuery, self).build_params(*args, **kwargs)
+        search_kwargs['sql_params'] = list(getattr(self, '_sql_params', []))
+        rank_terms = getattr(self, '_rank_terms', [])
+        if rank_terms:
+            search_kwargs['rank_query'] = ' | '.join(sorted(set(rank_terms)))
+        return search_kwargs
+
+    def matching_all_fragment(self):
+        return 'TRUE'
+
+    def _build_text_fragment(self, value, weight, prefix):
+        terms = [x.lower() for x in self.TERM_REGEX.findall(unicode(value))]
+        if not terms:
+            return 'TRUE'
+        self._rank_terms += ['%s:*' % x for x in terms]
+        term_suffix = (':*' if prefix else ':' if weight else '') + (weight or '')
+        self._sql_params += [self.backend.search_config, ' & '.join(['%s%s' % (x, term_suffix) for x in terms])]
+        return '"content" @@ to_tsquery(%s::regconfig, %s)'
+
+    def _build_suggest_fragment(self, value):
+        terms = [x.lower() for x in self.TERM_REGEX.findall(unicode(value))]
+        if not terms:
+            return 'TRUE'
+        self._rank_terms += ['%s:*' % x for x in terms]
+        self._sql_params += [self.backend.SUGGEST_SEARCH_CONFIG, ' & '.join(['%s:*' % x for x in terms])]
+        return '"suggest" @@ to_tsquery(%s::regconfig, %s)'
+
+    def _build_data_fragment(self, field, filter_type, value):
+        field_sql = '("data"::jsonb ->> %s)'
+        if filter_type in self.COMPARE_FILTER_TYPES:
+            if isinstance(value, (int, long, float)):
+                field_sql += '::numeric'
+            elif isinstance(value, datetime.datetime):
+                field_sql += '::timestamptz'
+            elif isinstance(value, datetime.date):
+                field_sql += '::date'
+            self._sql_params += [field, value]
+            return '%s %s %%s' % (field_sql, self.COMPARE_FILTER_TYPES[filter_type])
+        if filter_type == 'range':
+            self._sql_params += [field, unicode(value[0]), field, unicode(value[1])]
+            return '(%s >= %%s AND %s <= %%s)' % (field_sql, field_sql)
+        if filter_type == 'in':
+            values = tuple([unicode(x) for x in value])
+            if not values:
+                return 'FALSE'
+            self._sql_params += [field, values]
+            return '%s IN %%s' % field_sql
+        if filter_type in ['contains', 'startswith', 'content', 'fuzzy']:
+            like_value = unicode(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            self._sql_params += [field, ('%s%%' if filter_type == 'startswith' else '%%%s%%') % like_value]
+            return '%s ILIKE %%s' % field_sql
+        # JSON booleans are 'true' / 'false' as text:
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        self._sql_params += [field, unicode(value)]
+        return '%s = %%s' % field_sql
+
+    def _build_multivalued_fragment(self, field, filter_type, value):
+        # match any of the values, by words prefix ('startswith') or by words:
+        terms = self.TERM_REGEX.findall(unicode(value))
+        if not terms:
+            return 'TRUE'
+        word_suffix = '' if filter_type == 'startswith' else r'\M'
+        self._sql_params += [field, ''.join([r'(?=.*\m%s%s)' % (x, word_suffix) for x in terms])]
+        return 'EXISTS (SELECT 1 FROM jsonb_array_elements_text("data"::jsonb -> %s) AS "value" WHERE "value" ~* %s)'
+
+    def _get_search_field(self, field):
+        return connections[self.backend.connection_alias].get_unified_index().all_searchfields().get(field)
+
+    def _is_multivalued_field(self, field):
+        search_field = self._get_search_field(field)
+        return search_field is not None and search_field.is_multivalued
+
+    def _is_ngram_field(self, field):
+        return isinstance(self._get_search_field(field), indexes.NgramField)
+
+    def _build_id_fragment(self, filter_type, value):
+        values = value if filter_type == 'in' else [value]
+        django_ids = tuple(sorted(set([int(unicode(x).split('.')[-1]) for x in values])))
+        if not django_ids:
+            return 'FALSE'
+        self._sql_params.append(django_ids)
+        return '"django_id" IN %s'
+
+    def build_query_fragment(self, field, filter_type, value):
+        # get the raw value of input types (e.g Clean, Exact):
+        if hasattr(value, 'input_type_name'):
+            value = value.query_string
+
+        if field in [ID, DJANGO_ID, 'pk']:
+            return self._build_id_fragment(filter_type, value)
+
+        # tags exact filter uses the tags array:
+        if field == 'tags' and filter_type in ['exact', 'in']:
+            tags = [unicode(x) for x in (value if filter_type == 'in' else [value])]
+            if not tags:
+                return 'FALSE'
+            self._sql_params.append(tags)
+            return '"tags" && %s::varchar[]'
+
+        # words prefix search in the n-gram fields (autocomplete):
+        if filter_type in self.TEXT_FILTER_TYPES and self._is_ngram_field(field):
+            return self._build_suggest_fragment(value)
+
+        # full text search in the content or in a weighted field:
+        weight = '' if field in ['content', DOCUMENT_FIELD] else self.backend.field_weights.get(field)
+        if weight is not None and filter_type in self.TEXT_FILTER_TYPES:
+            values = value if filter_type == 'in' else [value]
+            fragments = [self._build_text_fragment(x, weight, prefix=filter_type == 'startswith') for x in values]
+            if not fragments:
+                return 'FALSE'
+            return fragments[0] if len(fragments) == 1 else '(%s)' % ' OR '.join(fragments)
+
+        # text search in the values of multi value field (not weighted in the content):
+        if filter_type in ['content', 'contains', 'startswith', 'exact'] and self._is_multivalued_field(field):
+            return self._build_multivalued_fragment(field, filter_type, value)
+
+        return self._build_data_fragment(field, filter_type, value)
+
+
+class PostgresSearchEngine(BaseEngine):
+    backend = PostgresSearchBackend
+    query = PostgresSearchQuery
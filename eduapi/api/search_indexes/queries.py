@@ -1,23 +1,28 @@
 from haystack.query import SearchQuerySet, SQ
 from api.models import Project, Lesson, IgniteUser
 
+from .results_cache import get_cached_search_results, normalize_search_query
 
-def get_searched_projects_ids(search_query, filter_or=False, search_in_lesson=False):
-    search_query_set = SearchQuerySet()
-    search_query_set = search_query_set.models(Project)
 
+def _build_search_query_set(search_query_set, search_query, include_sq_callback, exclude_callback, filter_or=False, extra_sq_filter=None):
+    """
+    Filters the search query set by the search params of the search query (separated by spaces).
+    Params that start with '-' are excluded with exclude_callback(search_query_set, param), and the rest are included
+    with the SQ filter returned from include_sq_callback(param).
+    Returns None if there are no search params.
+    """
     search_params = filter(None, search_query.split(' '))
 
-    # If no search params, then return all:
+    # If no search params:
     if not search_params:
-        return search_query_set.all()
+        return None
 
     sq_filter = None
     for param in search_params:
         if param.startswith('-'):
-            search_query_set = search_query_set.exclude(content=param[1:])
+            search_query_set = exclude_callback(search_query_set, param[1:])
         else:
-            _sq_filter = SQ(content__startswith=param)
+            _sq_filter = include_sq_callback(param)
             if sq_filter:
                 if filter_or:
                     sq_filter |= _sq_filter
@@ -26,100 +31,208 @@ def get_searched_projects_ids(search_query, filter_or=False, search_in_lesson=Fa
             else:
                 sq_filter = _sq_filter
 
-    # If search_in_lesson, then include the results from lesson index:
-    if search_in_lesson:
-        lesson_projects_ids = get_projects_ids_searched_by_lesson_titles(search_query)
-        _sq_filter = SQ(id__in=lesson_projects_ids)
+    if extra_sq_filter is not None:
         if sq_filter:
             if filter_or:
-                sq_filter |= _sq_filter
+                sq_filter |= extra_sq_filter
             else:
-                sq_filter &= _sq_filter
+                sq_filter &= extra_sq_filter
         else:
-            sq_filter = _sq_filter
+            sq_filter = extra_sq_filter
 
     # Since sq.exclude.exclude.filter_or returns wrong data, we bypass it with a single .filter in the end:
     if sq_filter is not None:
         search_query_set = search_query_set.filter(sq_filter)
 
-    return search_query_set.values_list('pk', flat=True)
-
+    return search_query_set
 
-def get_projects_ids_searched_by_lesson_titles(search_query, filter_or=False):
-    search_query_set = SearchQuerySet()
-    search_query_set = search_query_set.models(Lesson)
 
-    search_params = filter(None, search_query.split(' '))
+def get_projects_search_query_set(search_query, filter_or=False, search_in_lesson=False, search_tags_author=False):
+    """
+    Returns lazy SearchQuerySet of the projects searched, ranked by the search engine.
+    Slicing the returned SearchQuerySet fetches only the slice from the search engine (and its .count() is the total).
+    """
+    search_query_set = SearchQuerySet().models(Project)
 
-    # If no search params, then return all:
-    if not search_params:
-        return set(search_query_set.values_list('project_id', flat=True))
+    if search_tags_author:
+        def include_sq(param):
+            return SQ(title=param) | SQ(tags=param) | SQ(owner_name=param)
 
-    sq_filter = None
-    for param in search_params:
-        if param.startswith('-'):
-            search_query_set = search_query_set.exclude(content=param[1:])
-        else:
+        def exclude(sqs, param):
+            return sqs.exclude(title=param).exclude(tags=param).exclude(owner_name=param)
+    else:
+        def include_sq(param):
             _sq_filter = SQ(content__startswith=param)
-            if sq_filter:
-                if filter_or:
-                    sq_filter |= _sq_filter
-                else:
-                    sq_filter &= _sq_filter
-            else:
-                sq_filter = _sq_filter
+            # If search_in_lesson, then include also projects with lessons titles matching:
+            if search_in_lesson:
+                _sq_filter |= SQ(lessons_titles__startswith=param)
+            return _sq_filter
 
-    # Since sq.exclude.exclude.filter_or returns wrong data, we bypass it with a single .filter in the end:
-    if sq_filter is not None:
-        search_query_set = search_query_set.filter(sq_filter)
+        def exclude(sqs, param):
+            return sqs.exclude(content=param)
 
-    return set(search_query_set.values_list('project_id', flat=True))
+    searched_query_set = _build_search_query_set(search_query_set, search_query, include_sq, exclude, filter_or)
+    return searched_query_set if searched_query_set is not None else search_query_set.all()
 
 
-def get_projects_ids_searched_by_title_tags_author(search_query, filter_or=False):
+def _get_searched_projects_ids(search_query, filter_or=False, search_in_lesson=False):
     search_query_set = SearchQuerySet()
     search_query_set = search_query_set.models(Project)
 
-    search_params = filter(None, search_query.split(' '))
-
-    # If no search params, then return all:
-    if not search_params:
-        return search_query_set.all()
+    # If search_in_lesson, then include the results from lesson index:
+    extra_sq_filter = None
+    if search_in_lesson:
+        lesson_projects_ids = get_projects_ids_searched_by_lesson_titles(search_query)
+        extra_sq_filter = SQ(id__in=lesson_projects_ids)
 
-    sq_filter = None
-    for param in search_params:
-        if param.startswith('-'):
-            param = param[1:]  # remove - sign
-            search_query_set = search_query_set.exclude(title=param)
-            search_query_set = search_query_set.exclude(tags=param)
-            search_query_set = search_query_set.exclude(owner_name=param)
-        else:
-            _sq_filter = SQ(title=param)
-            _sq_filter |= SQ(tags=param)
-            _sq_filter |= SQ(owner_name=param)
-            if sq_filter:
-                if filter_or:
-                    sq_filter |= _sq_filter
-                else:
-                    sq_filter &= _sq_filter
-            else:
-                sq_filter = _sq_filter
+    search_query_set = _build_search_query_set(
+        search_query_set,
+        search_query,
+        lambda param: SQ(content__startswith=param),
+        lambda sqs, param: sqs.exclude(content=param),
+        filter_or,
+        extra_sq_filter,
+    )
 
-    # Since sq.exclude.exclude.filter_or returns wrong data, we bypass it with a single .filter in the end:
-    if sq_filter is not None:
-        search_query_set = search_query_set.filter(sq_filter)
+    # If no search params, then return all:
+    if search_query_set is None:
+        return SearchQuerySet().models(Project).all()
 
     return search_query_set.values_list('pk', flat=True)
 
 
-def get_projects_ids_searched_by_exact_tags(search_query_list, filter_or=False):
+def _get_projects_ids_searched_by_lesson_titles(search_query, filter_or=False):
     search_query_set = SearchQuerySet()
-    search_query_set = search_query_set.models(Project)
+    search_query_set = search_query_set.models(Lesson)
+
+    searched_query_set = _build_search_query_set(
+        search_query_set,
+        search_query,
+        lambda param: SQ(content__startswith=param),
+        lambda sqs, param: sqs.exclude(content=param),
+        filter_or,
+    )
+
+    # If no search params, then return all:
+    if searched_query_set is None:
+        searched_query_set = search_query_set
+
+    return set(searched_query_set.values_list('project_id', flat=True))
 
-    search_query_list = search_query_list if isinstance(search_query_list, list) else [search_query_list]
 
-    for search_query in search_query_list:
-        filter_callback = search_query_set.filter_or if filter_or else search_query_set.filter
-        search_query_set = filter_callback(tags__exact=search_query)
+def _get_projects_ids_searched_by_title_tags_author(search_query, filter_or=False):
+    search_query_set = get_projects_search_query_set(search_query, filter_or, search_tags_author=True)
+
+    # If no search params, then return all:
+    if not filter(None, search_query.split(' ')):
+        return search_query_set
 
     return search_query_set.values_list('pk', flat=True)
+
+
+def get_searched_projects_ids(search_query, filter_or=False, search_in_lesson=False):
+    # If no search params, then return all (not cached):
+    if not filter(None, search_query.split(' ')):
+        return _get_searched_projects_ids(search_query, filter_or, search_in_lesson)
+
+    return get_cached_search_results('projects_ids', {
+        'q': normalize_search_query(search_query),
+        'filter_or': filter_or,
+        'search_in_lesson': search_in_lesson,
+    }, lambda: list(_get_searched_projects_ids(search_query, filter_or, search_in_lesson)))
+
+
+def get_projects_ids_searched_by_lesson_titles(search_query, filter_or=False):
+    return get_cached_search_results('lessons_projects_ids', {
+        'q': normalize_search_query(search_query),
+        'filter_or': filter_or,
+    }, lambda: _get_projects_ids_searched_by_lesson_titles(search_query, filter_or))
+
+
+def get_projects_ids_searched_by_title_tags_author(search_query, filter_or=False):
+    # If no search params, then return all (not cached):
+    if not filter(None, search_query.split(' ')):
+        return _get_projects_ids_searched_by_title_tags_author(search_query, filter_or)
+
+    return get_cached_search_results('title_tags_author_projects_ids', {
+        'q': normalize_search_query(search_query),
+        'filter_or': filter_or,
+    }, lambda: list(_get_projects_ids_searched_by_title_tags_author(search_query, filter_or)))
+
+
+def _get_projects_search_suggestions(search_query, projects_limit):
+    search_terms = [x.lower() for x in search_query.split()]
+
+    def _matches(text):
+        words = text.lower().split()
+        return all(any(word.startswith(term) for word in words) for term in search_terms)
+
+    suggestions = []
+    search_query_set = SearchQuerySet().models(Project).autocomplete(suggest=search_query)[:projects_limit]
+    for result in search_query_set:
+        if result is None:
+            continue
+        project_id = int(result.pk)
+        texts = [('title', getattr(result, 'title', None))]
+        texts += [('tag', x) for x in getattr(result, 'tags', None) or []]
+        texts += [('author', getattr(result, 'owner_name', None))]
+        texts += [('lessonTitle', x) for x in getattr(result, 'lessons_titles', None) or []]
+        for suggestion_type, text in texts:
+            if text and _matches(text):
+                suggestions.append({'text': text, 'type': suggestion_type, 'projectId': project_id})
+    return suggestions
+
+
+def get_projects_search_suggestions(search_query, projects_limit=20):
+    """
+    Returns list of suggestions to complete the search query, from the titles, tags, author names and lessons titles of
+    the top projects matched by words prefix (edge n-gram autocomplete field), ordered by the projects rank:
+    [{'text', 'type': title|tag|author|lessonTitle, 'projectId'}, ...]
+    Note: The suggestions are of all the indexed projects, filter the allowed projects by the 'projectId'.
+    """
+    if not search_query.split():
+        return []
+    return get_cached_search_results('projects_suggestions', {
+        'q': normalize_search_query(search_query),
+        'projects_limit': projects_limit,
+    }, lambda: _get_projects_search_suggestions(search_query, projects_limit))
+
+
+class SearchQuerySetObjects(object):
+    """
+    Sequence of the model objects of a SearchQuerySet, ranked by the search engine, for paginating the search results.
+    Only the sliced page is fetched from the search engine, and its objects are fetched from the queryset (so objects
+    not allowed in the queryset are omitted from the page). The length is the total hits count of the search engine.
+    If cache_params is given (dict of the normalized query and filters of the search), then the total and the pages ids
+    are cached in the shared search results cache.
+    """
+
+    def __init__(self, search_query_set, queryset, cache_params=None):
+        self.search_query_set = search_query_set
+        self.queryset = queryset
+        self.cache_params = cache_params
+
+    def _get_cached(self, name, params, get_results_callback):
+        if self.cache_params is None:
+            return get_results_callback()
+        params.update(self.cache_params)
+        params['ordering'] = list(self.search_query_set.query.order_by)
+        return get_cached_search_results(name, params, get_results_callback)
+
+    def count(self):
+        return self._get_cached('projects_count', {}, self.search_query_set.count)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k+1][0]
+
+        page_ids = self._get_cached(
+            'projects_page_ids',
+            {'start': k.start, 'stop': k.stop},
+            lambda: [int(result.pk) for result in self.search_query_set[k] if result is not None]
+        )
+        page_objects = {obj.pk: obj for obj in self.queryset.filter(pk__in=page_ids)}
+        return [page_objects[pk] for pk in page_ids if pk in page_objects]
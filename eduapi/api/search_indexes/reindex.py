@@ -0,0 +1,286 @@
+import datetime
+import json
+import multiprocessing
+import time
+
+from django import db
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from haystack import connections
+
+from .updates import update_backend_objects_index
+from .results_cache import bump_search_results_generation
+
+
+# Redis hash of the current reindex run {run_id, using, target_index_name, started, chunks}:
+REDIS_HASH_REINDEX_RUN = 'SEARCH_REINDEX_RUN'
+# Redis set of the chunks done in the current reindex run:
+REDIS_SET_REINDEX_DONE_CHUNKS = 'SEARCH_REINDEX_DONE_CHUNKS'
+# Redis set of the objects flushed from the search index queue during the current reindex run (e.g hard deletes, that
+# were removed only from the old index) {'app_label.model_name.pk'}:
+REDIS_SET_REINDEX_FLUSHED_OBJECTS = 'SEARCH_REINDEX_FLUSHED_OBJECTS'
+# Seconds of objects updated before the run started that are reindexed again after the switch (clocks differences):
+REINDEX_CATCH_UP_MARGIN = 60
+
+
+def _get_model_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.model_name)
+
+
+def _chunk_key(chunk):
+    return '%s:%s:%s' % (chunk[0], chunk[1], chunk[2])
+
+
+def _is_elasticsearch_backend(backend):
+    return hasattr(backend, 'index_name') and hasattr(backend, 'conn')
+
+
+def get_reindex_backend(using, target_index_name=None):
+    """
+    Returns a new backend of the connection, that writes to the target index name (if the backend has index name).
+    """
+    engine = connections[using]
+    connection_options = dict(engine.options)
+    if target_index_name:
+        connection_options['INDEX_NAME'] = target_index_name
+    return engine.backend(using, **connection_options)
+
+
+def plan_reindex_chunks(using, chunk_size):
+    """
+    Returns list of the chunks to reindex of all the indexed models: [(model label, first pk, last pk), ...].
+    The last chunk of each model has no last pk, to include objects created during the reindex.
+    """
+    chunks = []
+    unified_index = connections[using].get_unified_index()
+    for model in sorted(unified_index.get_indexed_models(), key=_get_model_label):
+        index = unified_index.get_index(model)
+        pks = list(index.index_queryset(using=using).order_by('pk').values_list('pk', flat=True))
+        for i in xrange(0, len(pks), chunk_size):
+            chunk_pks = pks[i:i+chunk_size]
+            last_pk = chunk_pks[-1] if i + chunk_size < len(pks) else None
+            chunks.append((_get_model_label(model), chunk_pks[0], last_pk))
+    return chunks
+
+
+def reindex_chunk(using, target_index_name, chunk):
+    """
+    Indexes the objects of the chunk into the target index. Returns the number of objects indexed.
+    """
+    model_label, first_pk, last_pk = chunk
+    model = apps.get_model(model_label)
+    index = connections[using].get_unified_index().get_index(model)
+    backend = get_reindex_backend(using, target_index_name)
+
+    index_queryset = index.index_queryset(using=using).filter(pk__gte=first_pk).order_by('pk')
+    if last_pk is not None:
+        index_queryset = index_queryset.filter(pk__lte=last_pk)
+    objects = list(index_queryset)
+    if objects:
+        backend.update(index, objects)
+    return len(objects)
+
+
+def _reindex_chunk_worker(args):
+    using, target_index_name, chunk = args
+    return chunk, reindex_chunk(using, target_index_name, chunk)
+
+
+def _init_reindex_worker():
+    # Do not share the parent process database connections:
+    db.connections.close_all()
+
+
+def _start_reindex_run(redis_conn, using, chunk_size):
+    run_id = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    backend = connections[using].get_backend()
+    reindex_run = {
+        'run_id': run_id,
+        'using': using,
+        # build Elasticsearch index aside of the live index, other backends are reindexed in place:
+        'target_index_name': '%s_%s' % (backend.index_name, run_id) if _is_elasticsearch_backend(backend) else '',
+        'started': time.time(),
+        'chunks': json.dumps(plan_reindex_chunks(using, chunk_size)),
+    }
+    pipe = redis_conn.pipeline()
+    pipe.delete(REDIS_HASH_REINDEX_RUN, REDIS_SET_REINDEX_DONE_CHUNKS, REDIS_SET_REINDEX_FLUSHED_OBJECTS)
+    pipe.hmset(REDIS_HASH_REINDEX_RUN, reindex_run)
+    pipe.execute()
+    return reindex_run
+
+
+def get_reindex_run():
+    """
+    Returns dict of the current (unfinished) reindex run, or None if there is no reindex run:
+    {run_id, using, target_index_name, started, chunks_count, done_chunks_count}
+    """
+    redis_conn = get_redis_connection('default')
+    reindex_run = redis_conn.hgetall(REDIS_HASH_REINDEX_RUN)
+    if not reindex_run:
+        return None
+    return {
+        'run_id': reindex_run['run_id'],
+        'using': reindex_run['using'],
+        'target_index_name': reindex_run['target_index_name'] or None,
+        'started': float(reindex_run['started']),
+        'chunks_count': len(json.loads(reindex_run['chunks'])),
+        'done_chunks_count': redis_conn.scard(REDIS_SET_REINDEX_DONE_CHUNKS),
+    }
+
+
+def switch_reindexed_index(using, target_index_name, started):
+    """
+    Switches the live index to the reindexed index:
+    Elasticsearch - points the index name alias to the target index atomically, and deletes the old indices.
+    On the first run the live index is not an alias yet, and Elasticsearch does not allow an alias with the name of an
+    existing index, so the live index is deleted right before the alias is created - searches fail for that moment.
+    If creating the alias fails, all the data is still in the target index, and resuming the run retries the switch.
+    Postgres - removes the documents that were not reindexed in the run (objects deleted before/during the run).
+    """
+    backend = connections[using].get_backend()
+    if _is_elasticsearch_backend(backend):
+        alias = backend.index_name
+        indices = backend.conn.indices
+
+        # make sure the target index exists (e.g no objects were indexed) before switching the live index to it:
+        if not indices.exists(index=target_index_name):
+            get_reindex_backend(using, target_index_name).setup()
+
+        if indices.exists_alias(name=alias):
+            old_indices = indices.get_alias(name=alias).keys()
+            indices.update_aliases(body={'actions': [
+                {'remove': {'index': x, 'alias': alias}} for x in old_indices
+            ] + [
+                {'add': {'index': target_index_name, 'alias': alias}},
+            ]})
+            for old_index in old_indices:
+                if old_index != target_index_name:
+                    indices.delete(index=old_index)
+        else:
+            # the live index is not an alias yet (first run) - replace it with the alias:
+            if indices.exists(index=alias):
+                indices.delete(index=alias)
+            indices.put_alias(index=target_index_name, name=alias)
+    elif hasattr(backend, 'remove_documents_updated_before'):
+        backend.remove_documents_updated_before(
+            connections[using].get_unified_index().get_indexed_models(),
+            started - REINDEX_CATCH_UP_MARGIN,
+        )
+
+
+def _pop_reindex_flushed_objects(redis_conn):
+    pipe = redis_conn.pipeline()
+    pipe.smembers(REDIS_SET_REINDEX_FLUSHED_OBJECTS)
+    pipe.delete(REDIS_SET_REINDEX_FLUSHED_OBJECTS)
+    flushed_objects = pipe.execute()[0]
+
+    models_pks = {}
+    for marker in flushed_objects:
+        model_label, pk = marker.rsplit('.', 1)
+        models_pks.setdefault(model_label, set()).add(int(pk))
+    return models_pks
+
+
+def catch_up_reindex(using, target_index_name, updated_since):
+    """
+    Reindexes into the target index the objects changed since the given timestamp, that the reindex chunks might have
+    missed (their changes might have been indexed only to the old index):
+    - objects updated since the timestamp - updated, or removed if they are not in the index queryset anymore (e.g
+      deleted, unpublished).
+    - objects flushed from the search index queue during the run (e.g hard deleted) - updated or removed.
+    Returns the number of objects reindexed.
+    """
+    count = 0
+    redis_conn = get_redis_connection('default')
+    flushed_models_pks = _pop_reindex_flushed_objects(redis_conn)
+    updated_since = datetime.datetime.fromtimestamp(updated_since, timezone.utc)
+    unified_index = connections[using].get_unified_index()
+    backend = get_reindex_backend(using, target_index_name)
+    batch_size = settings.SEARCH_INDEX_QUEUE_BATCH_SIZE
+    for model in unified_index.get_indexed_models():
+        index = unified_index.get_index(model)
+        updated_field = index.get_updated_field() or 'updated'
+
+        # all the objects updated since the timestamp, including the ones that are not indexed anymore:
+        updated_queryset = model._base_manager.filter(**{'%s__gte' % updated_field: updated_since})
+        if 'draft_origin' in [x.name for x in model._meta.fields]:
+            updated_queryset = updated_queryset.filter(draft_origin__isnull=True)  #drafts are not indexed
+        pks = set(updated_queryset.values_list('pk', flat=True))
+        pks.update(flushed_models_pks.get(_get_model_label(model), []))
+
+        pks = sorted(pks)
+        for i in xrange(0, len(pks), batch_size):
+            update_backend_objects_index(index, backend, model, pks[i:i+batch_size], using=using)
+        count += len(pks)
+    return count
+
+
+def reindex_search(using='default', workers=None, chunk_size=1000, resume=True, log=None):
+    """
+    Reindexes all the indexed models, in parallel chunks across worker processes, and switches the live index to the
+    new one when all the chunks are done.
+    The progress is checkpointed per chunk, so if resume is True, an unfinished run (e.g crashed) is continued from its
+    pending chunks. Returns dict of the run stats {run_id, chunks_count, indexed_count, catch_up_count}.
+    """
+    log = log or (lambda message: None)
+    workers = workers or multiprocessing.cpu_count()
+    redis_conn = get_redis_connection('default')
+
+    # Start a new run, or resume the current run:
+    reindex_run = redis_conn.hgetall(REDIS_HASH_REINDEX_RUN)
+    if not (resume and reindex_run and reindex_run['using'] == using):
+        reindex_run = _start_reindex_run(redis_conn, using, chunk_size)
+        log('Started reindex run %s.' % reindex_run['run_id'])
+    else:
+        log('Resuming reindex run %s.' % reindex_run['run_id'])
+    target_index_name = reindex_run['target_index_name'] or None
+    started = float(reindex_run['started'])
+    chunks = [tuple(x) for x in json.loads(reindex_run['chunks'])]
+    done_chunks_keys = redis_conn.smembers(REDIS_SET_REINDEX_DONE_CHUNKS)
+    pending_chunks = [x for x in chunks if _chunk_key(x) not in done_chunks_keys]
+    log('%s of %s chunks pending.' % (len(pending_chunks), len(chunks)))
+
+    # Reindex the pending chunks, and checkpoint each chunk done:
+    # Note: The checkpoints are written by this process only (redis connections are not shared with the workers).
+    indexed_count = 0
+    workers_args = [(using, target_index_name, x) for x in pending_chunks]
+    if workers > 1 and len(pending_chunks) > 1:
+        db.connections.close_all()
+        pool = multiprocessing.Pool(processes=workers, initializer=_init_reindex_worker)
+        try:
+            chunks_results = pool.imap_unordered(_reindex_chunk_worker, workers_args)
+            for chunk, count in chunks_results:
+                redis_conn.sadd(REDIS_SET_REINDEX_DONE_CHUNKS, _chunk_key(chunk))
+                indexed_count += count
+                log('Chunk %s done (%s objects).' % (_chunk_key(chunk), count))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    else:
+        for worker_args in workers_args:
+            chunk, count = _reindex_chunk_worker(worker_args)
+            redis_conn.sadd(REDIS_SET_REINDEX_DONE_CHUNKS, _chunk_key(chunk))
+            indexed_count += count
+            log('Chunk %s done (%s objects).' % (_chunk_key(chunk), count))
+
+    # Reindex the objects changed while reindexing into the new index (including removing the deleted objects), and
+    # switch to the new index. Then catch up again the objects changed since the first catch up started:
+    catch_up_started = time.time()
+    catch_up_count = catch_up_reindex(using, target_index_name, started - REINDEX_CATCH_UP_MARGIN)
+    switch_reindexed_index(using, target_index_name, started)
+    catch_up_count += catch_up_reindex(using, target_index_name, catch_up_started - REINDEX_CATCH_UP_MARGIN)
+    bump_search_results_generation()
+    redis_conn.delete(REDIS_HASH_REINDEX_RUN, REDIS_SET_REINDEX_DONE_CHUNKS, REDIS_SET_REINDEX_FLUSHED_OBJECTS)
+    log('Reindex run %s finished (%s objects, %s caught up).' % (reindex_run['run_id'], indexed_count, catch_up_count))
+
+    return {
+        'run_id': reindex_run['run_id'],
+        'chunks_count': len(chunks),
+        'indexed_count': indexed_count,
+        'catch_up_count': catch_up_count,
+    }
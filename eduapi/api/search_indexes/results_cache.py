@@ -0,0 +1,47 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# The cached search results are invalidated by the generation, that is bumped whenever the search index is updated:
+SEARCH_RESULTS_GENERATION_KEY = 'search_results_generation'
+
+
+def bump_search_results_generation():
+    '''
+    Marks the search index as changed, so all the cached search results are re-calculated on next use.
+    '''
+    try:
+        cache.incr(SEARCH_RESULTS_GENERATION_KEY)
+    except ValueError:
+        cache.set(SEARCH_RESULTS_GENERATION_KEY, 1, timeout=None)
+
+
+def normalize_search_query(search_query):
+    '''
+    Returns the search query normalized for caching: lower case search params, without duplicates and sorted (the
+    search params are combined regardless of their order).
+    '''
+    return ' '.join(sorted(set(search_query.lower().split())))
+
+
+def get_cached_search_results(name, params, get_results_callback):
+    '''
+    Returns the search results from the shared cache, or calculates them with get_results_callback() and caches them
+    for a short time (SEARCH_RESULTS_CACHE_TIMEOUT seconds, disabled if 0).
+    The search results are cached by name and params (dict of the normalized query, filters and ordering), and by the
+    current search results generation.
+    '''
+    if not settings.SEARCH_RESULTS_CACHE_TIMEOUT:
+        return get_results_callback()
+
+    generation = cache.get(SEARCH_RESULTS_GENERATION_KEY, 0)
+    params_hash = hashlib.md5(json.dumps(params, sort_keys=True)).hexdigest()
+    results_key = 'search_results_%s_%s_%s' % (name, generation, params_hash)
+    results = cache.get(results_key)
+    if results is None:
+        results = get_results_callback()
+        cache.set(results_key, results, timeout=settings.SEARCH_RESULTS_CACHE_TIMEOUT)
+    return results
@@ -1,49 +1,79 @@
 from haystack.signals import RealtimeSignalProcessor
-from haystack.query import SearchQuerySet
-from haystack.exceptions import NotHandled
+from django.conf import settings
+from django.core.signals import request_finished
+from celery.signals import task_postrun
 
 from api.models import Project, Lesson, IgniteUser
+from api.tasks import reindex_owner_projects
+from .index_queue import enqueue_objects_index_on_commit, enqueue_pending_objects_index
+from .results_cache import bump_search_results_generation
 
 
 class IgniteSignalProcessor(RealtimeSignalProcessor):
     index_models = [Project, Lesson, IgniteUser]  # explicitly define models that influence the index by haystack
 
+    def setup(self):
+        super(IgniteSignalProcessor, self).setup()
+        # Enqueue the objects changed inside transactions at the end of the requests and tasks:
+        request_finished.connect(enqueue_pending_objects_index)
+        task_postrun.connect(enqueue_pending_objects_index)
+
+    def teardown(self):
+        super(IgniteSignalProcessor, self).teardown()
+        request_finished.disconnect(enqueue_pending_objects_index)
+        task_postrun.disconnect(enqueue_pending_objects_index)
+
     def handle_save(self, sender, instance, **kwargs):
         if sender not in self.index_models:
             return
 
-        # If IgniteUser was saved and changed name, then update all its authored projects owner_name:
+        # Drafts are not indexed:
+        if getattr(instance, 'draft_origin_id', None) is not None:
+            return
+
+        # If IgniteUser was saved and changed name, then reindex all its authored projects owner_name in background:
         if sender == IgniteUser:
-            owner_projects_qs = Project.objects.filter(owner=instance)
-            base_owner_projects_sq = SearchQuerySet()
-            base_owner_projects_sq = base_owner_projects_sq.models(Project)
-            for owner_project_instance in owner_projects_qs:
-                # get owner project from haystack index:
-                owner_projects_sq = base_owner_projects_sq.filter(id=owner_project_instance.id)
-                if owner_projects_sq.count() == 0:
-                    # continue till get to the first project found in haystack.
-                    # Note: all projects should be found in haystack always, so this would never happen.
-                    continue
-                old_owner_name = owner_projects_sq[0].owner_name
-                # if indexed owner_name is different from the current user name:
-                if old_owner_name != instance.name:
-                    using_backends = self.connection_router.for_write(instance=owner_project_instance)
-                    for using in using_backends:
-                        try:
-                            index = self.connections[using].get_unified_index().get_index(Project)
-                            if hasattr(index, 'update_owner_projects'):
-                                # update the owner_name of the owner projects:
-                                index.update_owner_projects(owner=instance, using=using)
-                        except NotHandled:
-                            # TODO: Maybe log it or let the exception bubble?
-                            pass
-                break
+            if getattr(instance, 'name_changed', False):
+                reindex_owner_projects.delay(instance.pk)
+
+        # If search index queue is enabled, then enqueue the object to be indexed in bulk later:
+        elif settings.SEARCH_INDEX_QUEUE_ENABLED:
+            enqueue_objects_index_on_commit(sender, [instance.pk])
 
         else:
             super(IgniteSignalProcessor, self).handle_save(sender, instance, **kwargs)
+            bump_search_results_generation()
+
+        # If Lesson was saved, then reindex its project lessons titles:
+        if sender == Lesson:
+            self._handle_lesson_project(instance)
 
     def handle_delete(self, sender, instance, **kwargs):
         if sender not in self.index_models:
             return
 
-        super(IgniteSignalProcessor, self).handle_delete(sender, instance, **kwargs)
+        # Drafts are not indexed:
+        if getattr(instance, 'draft_origin_id', None) is not None:
+            return
+
+        # If search index queue is enabled, then enqueue the object to be removed from the index in bulk later:
+        # Note: objects that are not found anymore are removed from the index when the queue is flushed.
+        if settings.SEARCH_INDEX_QUEUE_ENABLED:
+            if sender != IgniteUser:  # users are not indexed
+                enqueue_objects_index_on_commit(sender, [instance.pk])
+        else:
+            super(IgniteSignalProcessor, self).handle_delete(sender, instance, **kwargs)
+            bump_search_results_generation()
+
+        # If Lesson was deleted, then reindex its project lessons titles:
+        if sender == Lesson:
+            self._handle_lesson_project(instance)
+
+    def _handle_lesson_project(self, lesson):
+        if settings.SEARCH_INDEX_QUEUE_ENABLED:
+            enqueue_objects_index_on_commit(Project, [lesson.project_id])
+        else:
+            project = Project.objects.filter(pk=lesson.project_id).first()
+            if project:
+                super(IgniteSignalProcessor, self).handle_save(Project, project)
+                bump_search_results_generation()
@@ -0,0 +1,43 @@
+from haystack import connections, connection_router
+from haystack.exceptions import NotHandled
+
+from .results_cache import bump_search_results_generation
+
+
+def update_objects_index(model, pks):
+    """
+    Updates the search index of the model objects with the given pks, with a single bulk update for each backend.
+    Objects that are not found in the index queryset (e.g deleted) are removed from the index.
+    """
+    pks = set(pks)
+    if not pks:
+        return
+
+    for using in connection_router.for_write(models=[model]):
+        try:
+            index = connections[using].get_unified_index().get_index(model)
+        except NotHandled:
+            continue
+
+        backend = index._get_backend(using)
+        if backend is None:
+            continue
+
+        update_backend_objects_index(index, backend, model, pks, using=using)
+
+    # invalidate the cached search results:
+    bump_search_results_generation()
+
+
+def update_backend_objects_index(index, backend, model, pks, using=None):
+    """
+    Updates the objects with the given pks in the index of the backend, and removes the objects that are not found in
+    the index queryset (e.g deleted, unpublished or drafts).
+    """
+    index_queryset = index.index_queryset(using=using).filter(pk__in=pks)
+    found_pks = set(index_queryset.values_list('pk', flat=True))
+    if found_pks:
+        backend.update(index, index_queryset.filter(pk__in=found_pks))
+
+    for pk in set(pks) - found_pks:
+        backend.remove('%s.%s.%s' % (model._meta.app_label, model._meta.model_name, pk))
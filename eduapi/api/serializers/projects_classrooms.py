@@ -45,6 +45,7 @@ from ..models import (
     Lesson,
     ProjectInClassroom,
 )
+from ..drafts_diff import get_project_draft_diff
 import querysets
 
 
@@ -180,6 +181,7 @@ class ProjectSerializer(ProjectClassroomAuthenticatedMixin, CheckBeforePublishMi
     isEditor = serializers.SerializerMethodField()
 
     isSearchable = serializers.ReadOnlyField(source='is_searchable')
+    forkedFrom = serializers.ReadOnlyField(source='forked_from_id')
 
     lock = serializers.ReadOnlyField()
     lockMessage = serializers.ReadOnlyField(source="lock_message")
@@ -375,6 +377,7 @@ class ProjectSerializer(ProjectClassroomAuthenticatedMixin, CheckBeforePublishMi
             'isEditor',
 
             'isSearchable',
+            'forkedFrom',
 
             'currEditor',
 
@@ -778,21 +781,7 @@ class ProjectSerializer(ProjectClassroomAuthenticatedMixin, CheckBeforePublishMi
                     'publishDate': instance_origin.publish_date.strftime('%Y-%m-%d %H:%M'),
                     'draftPublishMode': instance.publish_mode,
                     'draftOldPublishMode': old_publish_mode,
-                    'draftDiff': {
-                        'id': instance.id,
-                        'title': instance.title,
-                        'diffFields': instance.draft_diff_fields(),
-                        'lessons': [{
-                                        'id': lesson.id,
-                                        'title': lesson.draft_object.title,
-                                        'diffFields': lesson.draft_diff_fields(),
-                                        'steps': [{
-                                                      'id': step.id,
-                                                      'title': step.draft_object.title,
-                                                      'diffFields': step.draft_diff_fields(),
-                                                  } for step in lesson.steps.all() if step.has_draft]
-                                    } for lesson in instance_origin.lessons.all() if lesson.has_draft]
-                    },
+                    'draftDiff': get_project_draft_diff(instance),
                 }
 
                 #if changed publish mode to published on draft, then apply draft:
@@ -1023,21 +1012,7 @@ class ProjectModeSerializer(CheckBeforePublishMixin, DraftSerializerMixin, seria
                     'publishDate': instance_origin.publish_date.strftime('%Y-%m-%d %H:%M'),
                     'draftPublishMode': instance.publish_mode,
                     'draftOldPublishMode': old_publish_mode,
-                    'draftDiff': {
-                        'id': instance.id,
-                        'title': instance.title,
-                        'diffFields': instance.draft_diff_fields(),
-                        'lessons': [{
-                                        'id': lesson.id,
-                                        'title': lesson.draft_object.title,
-                                        'diffFields': lesson.draft_diff_fields(),
-                                        'steps': [{
-                                                      'id': step.id,
-                                                      'title': step.draft_object.title,
-                                                      'diffFields': step.draft_diff_fields(),
-                                                  } for step in lesson.steps.all() if step.has_draft]
-                                    } for lesson in instance_origin.lessons.all() if lesson.has_draft]
-                    },
+                    'draftDiff': get_project_draft_diff(instance),
                 }
 
                 #if changed publish mode to published on draft, then apply draft:
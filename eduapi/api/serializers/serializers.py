@@ -2,7 +2,6 @@ import json
 import re
 
 from django.conf import settings
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from notifications.models import Notification
@@ -345,8 +344,6 @@ class LessonListSerializer(BulkListSerializer, DraftListSerializerMixin, seriali
 
         # Perform creations and updates.
         ret = []
-        # Prevent recalculation of lesson counters in project
-        cache.set('fix_message_set_project_%s' % self.context.get('view').kwargs.get('project_pk'), True, timeout=5)
         for lesson_data in validated_data:
             lesson = lesson_mapping.get(lesson_data.get('id'))
             if lesson is None:
@@ -585,13 +582,8 @@ class LessonSerializer(BulkSerializerMixin, CheckBeforePublishMixin, ProjectDraf
         instance = super(LessonSerializer, self).create(validated_data)
         self._save_steps_list(instance, steps_data)
 
-        # set mark if many lessons are updated for same project in short time period
-        # if there are - check counter in a few minutes
-        if cache.get('project_%s' % instance.project_id) and not cache.get('fix_message_set_project_%s' % instance.project_id):
-            fix_lesson_counter.apply_async(args=[instance.project_id,], countdown=5)
-            cache.set('fix_message_set_project_%s' % instance.project_id, True, timeout=5)
-        else:
-            cache.set('project_%s' % instance.project_id, True, timeout=5)
+        # check the lessons counter of the project once after many lessons are created in short time period
+        fix_lesson_counter.coalesce(instance.project_id)
         return instance
 
     def update(self, instance, validated_data):
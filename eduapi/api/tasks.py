@@ -1,15 +1,18 @@
+import copy
 import json
+import time
 import feedparser
 
 from datetime import timedelta
+from collections import defaultdict
 
 from django.conf import settings
-from django.db import IntegrityError
+from django.db import connection, models, transaction
+from django.apps import apps
 from django.db.models import Q
 from django.db.models import Count
 from django.core.urlresolvers import reverse
 from django.contrib.contenttypes.models import ContentType
-from django.contrib.sessions.models import Session
 from django.contrib.auth import get_user_model
 from django.utils.timezone import now as utc_now
 from django.utils.dateparse import parse_datetime
@@ -17,11 +20,10 @@ from django.core.cache import cache
 
 from celery.utils.log import get_task_logger
 from celery.task import task, Task
+from celery.worker.control import Panel
 from django_redis import get_redis_connection
 from notifications.models import Notification, EXTRA_DATA
-import sendwithus
 
-from rest_framework.authtoken.models import Token
 from six import text_type
 
 from api.auth.models import IgniteUser
@@ -29,6 +31,10 @@ import api.models
 import marketplace.models
 
 from api.auth.oxygen_operations import OxygenOperations
+from api.mail_delivery import LazyMailProvider, add_dead_letters, MailDeliveryError
+
+from utils_app.coalescing import CoalescedTask
+from utils_app.single_run import SingleRunTask
 
 # import celery app:
 from utils_app.celeryapp import app
@@ -36,12 +42,18 @@ from utils_app.celeryapp import app
 
 class SendMailTemplate(Task):
     '''
-    This celery task sends bulk of emails template to the given recipients via sendwithus.
+    This celery task sends bulk of emails template to the given recipients via the mail provider (see api.mail_delivery).
     '''
-    sendwithus_api = sendwithus.api(api_key=settings.SEND_WITH_US_API_KEY)
+    mail_provider = LazyMailProvider()  #created on first use
     logger = get_task_logger('send_mail_template')
     templates_default_refresh_threshold_hours = 24
     redis_hash_templates = 'SEND_MAIL_TEMPLATE'
+    templates_cache = {}  #worker-local cache of the templates {templates, version, expires, stale_time}
+
+    @property
+    def sendwithus_api(self):
+        '''The sendwithus API (SDK) client of the mail provider (if any).'''
+        return getattr(self.mail_provider, 'client', None)
 
     @classmethod
     def get_templates_info(cls):
@@ -69,12 +81,65 @@ class SendMailTemplate(Task):
         '''Sets the refresh threshold timedelta to consider the templates as stale.'''
         redis_conn = get_redis_connection('default')
         redis_conn.hset(cls.redis_hash_templates, 'refresh_threshold_hours', timedelta_hours)
+        cls.bump_templates_version(redis_conn)
 
     @classmethod
     def purge_templates(cls):
-        '''Purges the templates, and gets fresh data from server next time needed.'''
+        '''Purges the templates, and gets fresh data from server next time needed. Broadcasts the workers to purge their templates cache.'''
         redis_conn = get_redis_connection('default')
         redis_conn.hdel(cls.redis_hash_templates, 'templates_ids', 'load_time')
+        cls.bump_templates_version(redis_conn)
+        cls.clear_templates_cache()
+        try:
+            app.control.broadcast('purge_mail_templates_cache')
+        except Exception as exc:
+            #workers will reload the templates when their cache expires (see get_cached_templates):
+            cls.logger.warning('Failed to broadcast mail templates cache purge: %s', exc)
+
+    @classmethod
+    def bump_templates_version(cls, redis_conn=None):
+        '''Changes the templates version stamp, so the workers reload their cached templates when the cache expires.'''
+        redis_conn = redis_conn or get_redis_connection('default')
+        redis_conn.hincrby(cls.redis_hash_templates, 'version', 1)
+
+    @classmethod
+    def clear_templates_cache(cls):
+        '''Clears the worker-local templates cache.'''
+        cls.templates_cache.clear()
+
+    @classmethod
+    def get_cached_templates(cls):
+        '''
+        Returns the templates dict from the worker-local cache, without Redis round trips until the cache expires
+        (EMAIL_TEMPLATES_CACHE_TIMEOUT seconds). Then the cached templates are kept if the templates version stamp in
+        Redis was not changed (and the templates are not stale), otherwise they are reloaded (see get_templates).
+        Empty templates (failed to load) are not cached, so they are loaded again on next use.
+        '''
+        templates_cache = cls.templates_cache
+        cur_time = time.time()
+        if templates_cache and templates_cache['expires'] > cur_time:
+            return templates_cache['templates']
+
+        redis_conn = get_redis_connection('default')
+        version = redis_conn.hget(cls.redis_hash_templates, 'version')
+        if not templates_cache or templates_cache['version'] != version or templates_cache['stale_time'] <= cur_time:
+            templates = cls.get_templates()
+            if not templates:
+                cls.clear_templates_cache()
+                return templates
+            templates_info = cls.get_templates_info()
+            templates_load_time = parse_datetime(templates_info['load_time']) if templates_info['load_time'] else None
+            stale_time = cur_time
+            if templates_load_time:
+                stale_time += (templates_load_time - utc_now()).total_seconds() + templates_info['refresh_threshold_hours'] * 3600
+            templates_cache.update({
+                'templates': templates,
+                # version after the templates were reloaded (in case they were refreshed from the server):
+                'version': redis_conn.hget(cls.redis_hash_templates, 'version'),
+                'stale_time': stale_time,
+            })
+        templates_cache['expires'] = cur_time + settings.EMAIL_TEMPLATES_CACHE_TIMEOUT
+        return templates_cache['templates']
 
     @classmethod
     def get_templates(cls, force_refresh=False):
@@ -83,19 +148,16 @@ class SendMailTemplate(Task):
         templates_info = cls.get_templates_info()
         templates_dict = None
         if force_refresh or templates_info['is_stale']:
-            resp = cls.sendwithus_api.templates()
-            if resp.status_code == 200:
-                #make templates dict:
-                templates = resp.json()
-                templates_dict = {}
-                for template in templates:
-                    templates_dict[template['name']] = template
+            try:
+                templates_dict = cls.mail_provider.get_templates()
+            except MailDeliveryError:
+                # TODO: Handle failure.
+                cls.logger.critical('Failed to load templates list!')
+            else:
                 #store templates in Redis email templates hash:
                 redis_conn.hset(cls.redis_hash_templates, 'templates', json.dumps(templates_dict))
                 redis_conn.hset(cls.redis_hash_templates, 'load_time', templates_info['cur_time'])
-            else:
-                # TODO: Handle failure.
-                cls.logger.critical('Failed to load templates list!')
+                cls.bump_templates_version(redis_conn)
         #get templates dict from Redis:
         if templates_dict is None:
             templates_dict_json = redis_conn.hget(cls.redis_hash_templates, 'templates')
@@ -105,12 +167,14 @@ class SendMailTemplate(Task):
     @classmethod
     def get_template_by_name(cls, template_name):
         #return the template data identified by name:
-        return cls.get_templates().get(template_name, None)
+        return cls.get_cached_templates().get(template_name, None)
 
-    def run(self, template_name, emails):
+    def run(self, template_name, emails, attempt=0):
         '''
         This is the function you run for the task.
-        Sends bulk email template to the given emails, and returns tuple of (total_emails, total_processed).
+        Sends bulk email template to the given emails concurrently, and returns the number of emails sent.
+        Emails that failed to be sent are sent again by a new task with exponential backoff, and after the last retry
+        (or if the failure is not retryable) they are stored as dead letters (see api.mail_delivery).
         Note that processed emails do not ensure that the email was delivered nor opened.
         Attribute 'emails' is of the given structure: [{ recipient: {address, name?}, email_data?:{<dict>} }, ...]
         [See https://www.sendwithus.com/docs/api#send for more options]
@@ -121,27 +185,40 @@ class SendMailTemplate(Task):
             return 0
 
         # get template id from name:
-        template = self.get_template_by_name(template_name)
-        if not template:
-            self.logger.error('Email template name \'%s\' was not found!', template_name)
-            return False
+        if self.mail_provider.requires_template_id:
+            template = self.get_template_by_name(template_name)
+        else:
+            template = {'id': template_name, 'name': template_name}
 
-        # send all emails:
+        # send all emails (if the template was not found, e.g templates failed to load, then all the emails failed):
         emails = emails if isinstance(emails, list) else [emails]  #force emails to be a list
+        if template:
+            errors = self.mail_provider.send_batch(template['id'], emails, concurrency=settings.EMAIL_DELIVERY_CONCURRENCY)
+        else:
+            self.logger.error('Email template name \'%s\' was not found!', template_name)
+            errors = [MailDeliveryError('Email template name \'%s\' was not found.' % (template_name,))] * len(emails)
         num_emails_sent = 0
-        for email in emails:
-            # send the email:
-            resp = self.sendwithus_api.send(
-                email_id=template['id'],
-                **email
-            )
-
-            if resp.status_code != 200:
-                # TODO: Handle failure.
-                self.logger.error('Email failed to be sent to: %s <%s>.', email.get('recipient', {}).get('name', ''), email.get('recipient', {}).get('address', ''))
-            else:
-                self.logger.info('Email successfully sent to: %s <%s>.', email.get('recipient', {}).get('name', ''), email.get('recipient', {}).get('address', ''))
+        retry_emails, dead_emails = [], []
+        for email, error in zip(emails, errors):
+            recipient = email.get('recipient', {})
+            if error is None:
+                self.logger.info('Email successfully sent to: %s <%s>.', recipient.get('name', ''), recipient.get('address', ''))
                 num_emails_sent += 1
+            elif error.retryable and attempt < settings.EMAIL_DELIVERY_MAX_RETRIES:
+                self.logger.warning('Email failed to be sent to: %s <%s> (%s), will retry.', recipient.get('name', ''), recipient.get('address', ''), error)
+                retry_emails.append(email)
+            else:
+                self.logger.error('Email failed to be sent to: %s <%s> (%s).', recipient.get('name', ''), recipient.get('address', ''), error)
+                dead_emails.append((email, error))
+
+        # retry the failed emails with backoff, and store the undeliverable emails:
+        if retry_emails:
+            self.apply_async(
+                args=[template_name, retry_emails],
+                kwargs={'attempt': attempt + 1},
+                countdown=settings.EMAIL_DELIVERY_RETRY_BACKOFF * (2 ** attempt),
+            )
+        add_dead_letters(template_name, dead_emails)
 
         # return number of successful emails sent:
         return num_emails_sent
@@ -150,27 +227,101 @@ class SendMailTemplate(Task):
 send_mail_template = SendMailTemplate()
 
 
+@Panel.register
+def purge_mail_templates_cache(state, **kwargs):
+    '''Worker remote control command that clears the worker templates cache (broadcast by SendMailTemplate.purge_templates).'''
+    SendMailTemplate.clear_templates_cache()
+    return {'ok': 'mail templates cache purged'}
 
-@task()
-def add_permissions_to_classroom_students(classroom):
+
+
+# region Task Payloads
+# Tasks take primary keys and plain JSON arguments (see CELERY_TASK_SERIALIZER in celeryapp), and fetch the objects
+# when they run. Objects of any model (e.g notification actor/target) are passed as references made by get_object_ref.
+# Note: Messages queued before the tasks were id-based pass the model instances (pickled), so the tasks accept both.
+
+def get_object_ref(obj):
+    """Returns JSON-serializable reference of the model instance to pass to a task: {'model', 'pk'}."""
+    if obj is None:
+        return None
+    return {
+        'model': '%s.%s' % (obj._meta.app_label, obj._meta.model_name),
+        'pk': obj.pk,
+    }
+
+
+def _get_task_object(model, pk):
+    """Returns the object of the model by the pk (or the object itself for old queued messages), or None if not found."""
+    if pk is None or isinstance(pk, models.Model):
+        return pk
+    return model._base_manager.filter(pk=pk).first()
+
+
+def _get_task_ref_object(ref):
+    """Returns the object of the reference made by get_object_ref (or the object itself for old queued messages)."""
+    if ref is None or isinstance(ref, models.Model):
+        return ref
+    return _get_task_object(apps.get_model(ref['model']), ref['pk'])
+
+
+def _get_task_ref_objects(refs):
+    """Returns dict of {(model, pk): object} of the references made by get_object_ref, fetched in one query per model."""
+    pks_by_model = defaultdict(set)
+    for ref in refs:
+        if isinstance(ref, dict):
+            pks_by_model[ref['model']].add(ref['pk'])
+    objects = {}
+    for model_label, pks in pks_by_model.items():
+        for pk, obj in apps.get_model(model_label)._base_manager.in_bulk(pks).items():
+            objects[(model_label, pk)] = obj
+    return objects
+
+
+def _get_task_objects_pks(objs):
+    """Returns list of pks of the objects pks/instances/queryset (or of a single object)."""
+    objs = objs if hasattr(objs, '__iter__') else [objs]
+    return [x.pk if isinstance(x, models.Model) else x for x in objs]
+# endregion Task Payloads
+
+
+@task(base=CoalescedTask, coalesce_debounce=2)
+def add_permissions_to_classroom_students(classroom_id, project_id=None, student_id=None):
     """Adds permissions to the classroom's students as necessary.
 
     Called after the classroom was updated with new students/projects.
 
-    Adds permissions to the new students/projects.
+    Adds permissions to the new students/projects. The permissions are
+    computed and inserted with a single INSERT ... SELECT statement that
+    skips the existing purchases (ON CONFLICT DO NOTHING on the purchase
+    unique key). Set project_id or student_id to process only the delta of
+    the project/student that was added to the classroom.
 
-    Note that this method doesn't handle students/projects that were 
+    Note that this method doesn't handle students/projects that were
     removed from the classroom.
+
+    Enqueue with add_permissions_to_classroom_students.coalesce(...) with
+    the same delta arguments, to add the permissions once for repeated
+    updates of the same project/student in the classroom.
+
+    Returns the number of permissions added.
     """
 
     Purchase = marketplace.models.Purchase
     ClassroomState = api.models.ClassroomState
 
+    classroom = _get_task_object(api.models.Classroom, classroom_id)
+    if classroom is None:
+        return 0
+
     # Get all of the locked projects in the classroom.
     locked_projects = classroom.projects.exclude(lock=api.models.Project.NO_LOCK)
+    if project_id is not None:
+        locked_projects = locked_projects.filter(id=project_id)
 
     # Get all of the students in the classroom
     students = classroom.students.filter(classrooms_states__status=ClassroomState.APPROVED_STATUS)
+    if student_id is not None:
+        students = students.filter(id=student_id)
 
     # Get all of the users who should get a "view" permission to the projects.
     # Those users include:
@@ -179,73 +330,158 @@ def add_permissions_to_classroom_students(classroom):
     users = get_user_model().objects.filter(
 
         # Students
-        Q(id__in=students) | 
+        Q(id__in=students.values('id')) | 
 
         # Moderators
         Q(id__in=api.models.ChildGuardian.objects.filter(
-            child_id__in=students
+            child_id__in=students.values('id')
         ).values_list('guardian_id', flat=True))
     )
 
-    # Get all of the existing purchases. This is just an optimization to 
-    # reduce the number of requests to the database if the database already 
-    # contains the relevant data.
-    existing_purchases = [
-        (p.project_id, p.user_id) 
-        for p 
-        in Purchase.objects.filter(project__in=locked_projects, user__in=users)
-    ]
-
-    # Go over all of th locked projects and users.
-    for lp in locked_projects:
-        for u in users:
+    # Insert a purchase for each of the locked projects and users. Purchases 
+    # that already exist (including purchases created concurrently) are 
+    # skipped by the database.
+    projects_sql, projects_params = locked_projects.values('id').query.sql_with_params()
+    users_sql, users_params = users.values('id').query.sql_with_params()
+    cur_time = utc_now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO "%(purchase)s" ("added", "updated", "project_id", "user_id", "permission") '
+            'SELECT %%s, %%s, "locked_projects"."id", "users"."id", %%s '
+            'FROM (%(projects_sql)s) AS "locked_projects" CROSS JOIN (%(users_sql)s) AS "users" '
+            'ON CONFLICT ("project_id", "user_id") DO NOTHING' % {
+                'purchase': Purchase._meta.db_table,
+                'projects_sql': projects_sql,
+                'users_sql': users_sql,
+            },
+            [cur_time, cur_time, Purchase.VIEW_PERM] + list(projects_params) + list(users_params)
+        )
+        return cursor.rowcount
 
-            # If the student doesn't have a permission to the project.
-            if (lp.id, u.id) not in existing_purchases:
 
-                # Try to set a permission. Note that because of race-conditions,
-                # even if the purchase doesn't exist in existing_purchases, it 
-                # might exist when we reach this point.
-                try:
-                    Purchase(
-                        project_id=lp.id,
-                        user_id=u.id,
-                        permission=Purchase.VIEW_PERM
-                    ).save()
 
-                except IntegrityError:
-                    # Purchase already exists - ignore.
-                    pass
+# region Project Tasks
+@task(base=SingleRunTask)
+def publish_ready_projects():
+    """
+    Publishes the projects that are ready to publish and their min_publish_date has passed, in bulk: the publish mode
+    of all the due projects is flipped in one statement, and then their states are reset, they are reindexed and their
+    owners are notified in batches.
+    """
+    Project = api.models.Project
+    cur_time = utc_now()
+
+    # Flip the publish mode of the due projects (the publish date is set like Project.save does when published):
+    with transaction.atomic():
+        published_projects_ids = list(Project.objects.filter(
+            publish_mode=Project.PUBLISH_MODE_READY,
+            min_publish_date__lte=cur_time,
+        ).select_for_update().values_list('id', flat=True))
+        if not published_projects_ids:
+            return
+        Project.objects.filter(id__in=published_projects_ids).update(
+            publish_mode=Project.PUBLISH_MODE_PUBLISHED,
+            publish_date=cur_time,
+            updated=cur_time,
+        )
 
+    # Reset the projects states:
+    api.models.ProjectState.objects.filter(project_id__in=published_projects_ids).delete()
+
+    # Reindex the projects, and invalidate the cached search results:
+    from api.search_indexes.index_queue import index_objects
+    from api.search_indexes.results_cache import bump_search_results_generation
+    index_objects(Project, published_projects_ids)
+    bump_search_results_generation()
+
+    # Notify the owners and their delegates:
+    published_projects = list(Project.objects.filter(id__in=published_projects_ids).only(
+        'id', 'title', 'owner', 'publish_mode', 'publish_date', 'min_publish_date'
+    ))
+    owners_delegates = defaultdict(list)
+    for owner_id, delegate_id in api.models.OwnerDelegate.objects.filter(
+        owner_id__in=[x.owner_id for x in published_projects]
+    ).values_list('owner_id', 'user_id'):
+        owners_delegates[owner_id].append(delegate_id)
+    notify_and_mail_users_bulk.delay([{
+            'recipients': [project.owner_id] + owners_delegates[project.owner_id],
+            'actor': get_object_ref(project),
+            'verb': 'project_publish_mode_change_by_target',
+            'target': None,
+            'description': 'Project "%s" published because publication date has arrived - %s.' %(project.title, project.min_publish_date.strftime('%Y-%m-%d %H:%M')),
+            'publishMode': project.publish_mode,
+            'oldPublishMode': Project.PUBLISH_MODE_READY,
+            'publishDate': project.publish_date.strftime('%Y-%m-%d %H:%M'),
+        } for project in published_projects],
+        _mail_template='IGNITE_notification_publish_mode_change',
+    )
 
+    logger = get_task_logger('publish_ready_projects')
+    logger.info('Published %i projects that were ready: %s.', len(published_projects_ids), ', '.join([str(x) for x in published_projects_ids]))
 
-# region Project Tasks
 @task()
-def publish_ready_projects():
-    ready_projects_to_publish = api.models.Project.objects.filter(
-        publish_mode=api.models.Project.PUBLISH_MODE_READY,
-        min_publish_date__lte=utc_now(),
+def fork_project(project_id, owner_id, fork_fields=None):
+    """
+    Forks the project for the owner (see Project.fork), and notifies the owner when the fork is ready.
+    Used for forking very large projects in the background.
+    """
+    project = api.models.Project.objects.get(pk=project_id)
+    owner = get_user_model().objects.get(pk=owner_id)
+    new_project = project.fork(owner, fork_fields)
+    new_project.notify_owner(
+        'project_fork_ready',
+        {
+            'target': project,
+            'description': 'Project "%s" was forked from project "%s".' %(new_project.title, project.title),
+        },
+        include_recipient_delegates=False,
     )
-    published_projects_ids = []
-    for project in ready_projects_to_publish:
-        old_publish_mode = project.publish_mode
-        project.publish_mode = api.models.Project.PUBLISH_MODE_PUBLISHED
-        project.save()
-        published_projects_ids.append(project.id)
-        project.notify_owner(
-            'project_publish_mode_change_by_target',
-            {
-                'target': None,
-                'description': 'Project "%s" published because publication date has arrived - %s.' %(project.title, project.min_publish_date.strftime('%Y-%m-%d %H:%M')),
-                'publishMode': project.publish_mode,
-                'oldPublishMode': old_publish_mode,
-                'publishDate': project.publish_date.strftime('%Y-%m-%d %H:%M'),
-            },
-            send_mail_with_template='IGNITE_notification_publish_mode_change',
-        )
-    if published_projects_ids:
-        logger = get_task_logger('publish_ready_projects')
-        logger.info('Published %i projects that were ready: %s.', len(published_projects_ids), ', '.join([str(x) for x in published_projects_ids]))
+    return new_project.id
+
+@task()
+def flush_search_index_queue():
+    """
+    Indexes the objects pending in the search index queue in bulk (see api.search_indexes.index_queue).
+    """
+    from api.search_indexes.index_queue import flush_objects_index_queue
+    flush_stats = flush_objects_index_queue()
+    if flush_stats['count']:
+        logger = get_task_logger('flush_search_index_queue')
+        logger.info('Indexed %i objects from search index queue, max lag %.1f seconds.', flush_stats['count'], flush_stats['max_lag'])
+    return flush_stats
+
+@task()
+def reindex_owner_projects(owner_id):
+    """
+    Reindexes all the projects of the owner in chunked bulk updates (e.g when the owner name was changed).
+    """
+    from api.search_indexes.updates import update_objects_index
+    owner_projects_ids = list(api.models.Project.objects.filter(owner_id=owner_id).order_by('id').values_list('id', flat=True))
+    chunk_size = settings.SEARCH_INDEX_QUEUE_BATCH_SIZE
+    for i in xrange(0, len(owner_projects_ids), chunk_size):
+        update_objects_index(api.models.Project, owner_projects_ids[i:i+chunk_size])
+    return len(owner_projects_ids)
+
+@task(base=SingleRunTask)
+def check_search_index_consistency():
+    """
+    Audits the search index against the database, and enqueues reindex of the drifted objects (missing, stale and
+    orphans), e.g objects changed with queryset .update() that were not indexed (see api.search_indexes.consistency).
+    """
+    from api.search_indexes.consistency import check_index_consistency
+    index_drift = check_index_consistency(chunk_size=settings.SEARCH_INDEX_QUEUE_BATCH_SIZE)
+    logger = get_task_logger('check_search_index_consistency')
+    for model_label, model_drift in index_drift.items():
+        if model_drift['missing'] or model_drift['stale'] or model_drift['orphans']:
+            logger.warning(
+                'Search index drift of %s: %i missing, %i stale, %i orphans (database %i, index %i). Reindex enqueued.',
+                model_label, len(model_drift['missing']), len(model_drift['stale']), len(model_drift['orphans']),
+                model_drift['db_count'], model_drift['index_count']
+            )
+    return {
+        model_label: {key: len(value) if isinstance(value, list) else value for key, value in model_drift.items()}
+        for model_label, model_drift in index_drift.items()
+    }
 
 @task()
 def send_staff_emails_of_projects_in_review_summary():
@@ -292,10 +528,9 @@ def send_staff_emails_of_projects_in_review_summary():
 
 
 # region Notification Tasks
-@task()
-def notify_user(recipient, actor, verb, **kwargs):
+def _make_notification(recipient, actor, verb, **kwargs):
     """
-    Handler function to create Notification instance upon action signal call.
+    Returns new (unsaved) Notification instance of the actor (and optional target/action_object) for the recipient.
     """
 
     new_notification = Notification(
@@ -319,67 +554,219 @@ def notify_user(recipient, actor, verb, **kwargs):
     if len(kwargs) and EXTRA_DATA:
         new_notification.data = kwargs
 
-    new_notification.save()
+    return new_notification
+
 
+def create_notification(recipient, actor, verb, **kwargs):
+    """
+    Creates and returns Notification instance of the actor (and optional target/action_object) for the recipient.
+    """
+    new_notification = _make_notification(recipient, actor, verb, **kwargs)
+    new_notification.save()
     return new_notification
 
 
-@task()
-def notify_and_mail_users(recipients, actor, verb, _mail_template=None, _mail_template_notification_to_email_data=None, **kwargs):
-    # Force recipients to be list (iterable):
-    recipients = recipients if hasattr(recipients, '__iter__') else [recipients]
-
-    # If send email with template:
-    emails = None
-    if _mail_template:
-        # Import NotificationSerializer for default notification to email data to pass to mail server (defined in NotificationSerializer class):
-        if not _mail_template_notification_to_email_data:
-            from api.serializers.serializers import NotificationSerializer
-            _mail_template_notification_to_email_data = NotificationSerializer().notification_to_email_data
-        emails = []
-
-    # Create notification for each recipient:
-    new_notification = None
-    for recipient in recipients:
-        new_notification = notify_user(recipient, actor, verb, **kwargs)
-
-        # Prepare email notification for recipient, when _mail_template is set:
-        if _mail_template:
-            emails.append({
-                'recipient': {
-                    'name': recipient.name,
-                    'address': recipient.email,
-                },
-                'email_data': {
-                    'notification': _mail_template_notification_to_email_data(new_notification, _mail_template),
-                },
-            })
+def _bulk_save_notifications(new_notifications):
+    """
+    Saves the new notifications in bulk inserts, and returns them with their pks set (ordered by pk).
+    Note: bulk_create does not set the pks (Django 1.8), so the rows are inserted with RETURNING of their ids.
+    """
+    if not new_notifications:
+        return []
+
+    meta = Notification._meta
+    fields = [f for f in meta.local_concrete_fields if not isinstance(f, models.AutoField)]
+    qn = connection.ops.quote_name
+    insert_sql = 'INSERT INTO %s (%s) VALUES %%s RETURNING %s' % (
+        qn(meta.db_table),
+        ', '.join([qn(f.column) for f in fields]),
+        qn(meta.pk.column),
+    )
+    row_sql = '(%s)' % ', '.join(['%s'] * len(fields))
+
+    batch_size = settings.NOTIFICATIONS_BULK_BATCH_SIZE
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in xrange(0, len(new_notifications), batch_size):
+            batch = new_notifications[i:i+batch_size]
+            cursor.execute(
+                insert_sql % ', '.join([row_sql] * len(batch)),
+                [f.get_db_prep_save(f.pre_save(x, True), connection=connection) for x in batch for f in fields]
+            )
+            # Note: the ids are returned in the order of the inserted rows.
+            for notification, (pk,) in zip(batch, cursor.fetchall()):
+                notification.pk = pk
+                notification._state.adding = False
+                notification._state.db = connection.alias
+
+    return new_notifications
+
+
+def _get_notification_group_key(notification):
+    # key of the notifications of the same actor, verb and timestamp:
+    return (notification.actor_content_type_id, text_type(notification.actor_object_id), notification.verb, notification.timestamp)
+
+
+def bulk_create_notifications(recipients, actor, verb, **kwargs):
+    """
+    Creates the same notification of the actor (and optional target/action_object) for all the recipients in bulk
+    inserts, and returns the created Notification instances (ordered by pk).
+    Note: The notifications are created without save() and post_save signals.
+    """
+    kwargs['timestamp'] = kwargs.get('timestamp') or utc_now()
+    return _bulk_save_notifications([
+        _make_notification(recipient, actor, verb, **dict(kwargs)) for recipient in recipients
+    ])
+
+
+def fan_out_notifications(notifications_groups, _mail_template=None, _mail_template_notification_to_email_data=None):
+    """
+    Creates the notifications of the groups [(recipients, actor, verb, kwargs), ...] (recipients are users) in bulk
+    inserts, and optionally emails them with the mail template. The email data is rendered once per group (the
+    notifications of a group are the same except for their ids), and the emails are handed off in chunks to
+    send_mail_template tasks. Returns the created Notification instances.
+    """
+    # Create the notifications of all the groups in bulk (sharing the same timestamp):
+    timestamp = utc_now()
+    recipients_by_pk = {}
+    new_notifications = []
+    groups_keys_kwargs = []
+    for recipients, actor, verb, kwargs in notifications_groups:
+        group_notifications = [
+            _make_notification(recipient, actor, verb, **dict(kwargs, timestamp=timestamp)) for recipient in recipients
+        ]
+        if group_notifications:
+            groups_keys_kwargs.append((_get_notification_group_key(group_notifications[0]), kwargs))
+        new_notifications += group_notifications
+        recipients_by_pk.update({recipient.pk: recipient for recipient in recipients})
+    new_notifications = _bulk_save_notifications(new_notifications)
+    if not new_notifications or not _mail_template:
+        return new_notifications
+
+    # Import NotificationSerializer for default notification to email data to pass to mail server (defined in NotificationSerializer class):
+    if not _mail_template_notification_to_email_data:
+        from api.serializers.serializers import NotificationSerializer
+        _mail_template_notification_to_email_data = NotificationSerializer().notification_to_email_data
+
+    # Prepare email notification for each recipient, with the email data of its group:
+    groups_data = {}
+    emails = []
+    for notification in new_notifications:
+        group_key = _get_notification_group_key(notification)
+        if group_key not in groups_data:
+            groups_data[group_key] = _mail_template_notification_to_email_data(notification, _mail_template)
+        notification_data = copy.deepcopy(groups_data[group_key])
+        notification_data['id'] = notification.id
+        recipient = recipients_by_pk[notification.recipient_id]
+        emails.append({
+            'recipient': {
+                'name': recipient.name,
+                'address': recipient.email,
+            },
+            'email_data': {
+                'notification': notification_data,
+            },
+        })
 
     # Send emails about projects (or projects drafts) in review mode to staff emails group
-    if new_notification and settings.STAFF_EMAILS and kwargs.get('draftPublishMode', kwargs.get('publishMode', '')) == api.models.Project.PUBLISH_MODE_REVIEW:
-        notification_data = _mail_template_notification_to_email_data(new_notification, _mail_template)
-        staff_emails = [{
-                'recipient': {
-                    'name': email,
-                    'address': email,
-                },
-                'email_data': {
-                    'notification': notification_data,
-                },
-            } for email in settings.STAFF_EMAILS]
-        if len(staff_emails) > 0:
-            emails += staff_emails
-
-    # Send emails notifications:
-    if _mail_template and emails:
-        send_mail_template.run(_mail_template, emails)
+    for group_key, kwargs in groups_keys_kwargs:
+        if settings.STAFF_EMAILS and group_key in groups_data and kwargs.get('draftPublishMode', kwargs.get('publishMode', '')) == api.models.Project.PUBLISH_MODE_REVIEW:
+            emails += [{
+                    'recipient': {
+                        'name': email,
+                        'address': email,
+                    },
+                    'email_data': {
+                        'notification': groups_data[group_key],
+                    },
+                } for email in settings.STAFF_EMAILS]
+
+    # Hand off the emails notifications in chunks:
+    chunk_size = settings.NOTIFICATIONS_EMAILS_CHUNK_SIZE
+    for i in xrange(0, len(emails), chunk_size):
+        send_mail_template.delay(_mail_template, emails[i:i+chunk_size])
+
+    return new_notifications
+
+
+@task()
+def notify_user(recipient, actor, verb, **kwargs):
+    """
+    Handler function to create Notification instance upon action signal call.
+    The recipient is user pk, and the actor (and optional target/action_object) are object references (see
+    get_object_ref). Returns the notification pk.
+    """
+    recipient = _get_task_object(get_user_model(), recipient)
+    actor = _get_task_ref_object(actor)
+    for opt in ('target', 'action_object'):
+        if opt in kwargs:
+            kwargs[opt] = _get_task_ref_object(kwargs[opt])
+    if recipient is None or actor is None:
+        return None
+
+    return create_notification(recipient, actor, verb, **kwargs).pk
+
+
+@task()
+def notify_and_mail_users(recipients, actor, verb, _mail_template=None, **kwargs):
+    """
+    Notifies the recipients (users pks), and optionally emails the notification with the mail template.
+    The actor (and optional target/action_object) are object references (see get_object_ref).
+    The notifications are created in bulk, and the emails are sent in chunks by send_mail_template tasks.
+    Note: The email data is rendered by NotificationSerializer.notification_to_email_data (callables can not be passed
+    to the task through the JSON serializer).
+    """
+    kwargs.pop('_mail_template_notification_to_email_data', None)  #old queued messages
+
+    # Get the recipients and the notification objects:
+    recipients = get_user_model().objects.filter(pk__in=_get_task_objects_pks(recipients))
+    actor = _get_task_ref_object(actor)
+    for opt in ('target', 'action_object'):
+        if opt in kwargs:
+            kwargs[opt] = _get_task_ref_object(kwargs[opt])
+    if actor is None:
+        return
+
+    # Create the notifications of all the recipients in bulk, and send the emails:
+    fan_out_notifications(
+        [(list(recipients), actor, verb, kwargs)],
+        _mail_template=_mail_template,
+    )
+
+
+@task()
+def notify_and_mail_users_bulk(notifications, _mail_template=None):
+    """
+    Notifies in bulk - notifications is list of {recipients (users pks), actor, verb, **kwargs} of notify_and_mail_users,
+    and optionally emails the notifications with the mail template (see fan_out_notifications).
+    """
+    # Get the recipients and the notifications objects in one query per model:
+    users_by_pk = get_user_model().objects.in_bulk(set(sum([_get_task_objects_pks(x['recipients']) for x in notifications], [])))
+    objects = _get_task_ref_objects(sum([[x.get(opt) for opt in ('actor', 'target', 'action_object')] for x in notifications], []))
+
+    def get_object(ref):
+        if isinstance(ref, dict):
+            return objects.get((ref['model'], ref['pk']))
+        return ref  #None, or the object itself for old queued messages
+
+    notifications_groups = []
+    for notification in notifications:
+        kwargs = dict(notification)
+        recipients = [users_by_pk[x] for x in _get_task_objects_pks(kwargs.pop('recipients')) if x in users_by_pk]
+        actor = get_object(kwargs.pop('actor'))
+        verb = kwargs.pop('verb')
+        for opt in ('target', 'action_object'):
+            if opt in kwargs:
+                kwargs[opt] = get_object(kwargs[opt])
+        if actor is not None:
+            notifications_groups.append((recipients, actor, verb, kwargs))
+
+    fan_out_notifications(notifications_groups, _mail_template=_mail_template)
 # endregion Notification Tasks
 
 
 # region Maintenance Tasks
-@task()
+@task(base=CoalescedTask, coalesce_debounce=5)
 def fix_lesson_counter(project_id):
-    #todo: add cache lock
     project = api.models.Project.objects.filter(id=project_id,
                                                 lessons__is_deleted=False
                                                 ).annotate(num_lessons=Count('lessons'))[0]
@@ -388,15 +775,32 @@ def fix_lesson_counter(project_id):
         project.save(update_fields=['lesson_count'])
 
 
-# Invitations Tasks
 @task()
+def check_task_queues_depth():
+    """
+    Logs the number of messages waiting in each task queue (see utils_app.task_queues), and warns of the queues that
+    are backed up.
+    """
+    from utils_app.task_queues import get_task_queues_depth
+    queues_depth = get_task_queues_depth()
+    logger = get_task_logger('check_task_queues_depth')
+    for queue_name, depth in sorted(queues_depth.items()):
+        if depth >= settings.TASK_QUEUES_DEPTH_WARNING:
+            logger.warning('Task queue %s is backed up: %i messages waiting.', queue_name, depth)
+        else:
+            logger.info('Task queue %s: %i messages waiting.', queue_name, depth)
+    return queues_depth
+
+
+# Invitations Tasks
+@task(base=SingleRunTask)
 def delete_stale_delegate_invites(stale_days=None):
     api.models.DelegateInvite.delete_stale_invitations(stale_days=stale_days)  # stale_days None defaults to settings.DELEGATE_INVITES_LIFE_DAYS
 
 
 # User Tasks
 @task()
-def sync_logged_in_user(user, session_id, session_secure_id):
+def sync_logged_in_user(user_id, session_id, session_secure_id):
     #TODO: Handle situation when a child user becomes an adult (maybe handle it in OxygenOperations.sync_child_approved_status?).
     #get Oxygen operations instance, initialized with the SparkDrive session:
     oxygen_operations = OxygenOperations(
@@ -404,6 +808,10 @@ def sync_logged_in_user(user, session_id, session_secure_id):
         secure_session_id=session_secure_id
     )
 
+    user = _get_task_object(get_user_model(), user_id)
+    if user is None:
+        return
+
     if user.is_child:
         #check if child user is approved:
         try:
@@ -422,21 +830,16 @@ def sync_logged_in_user(user, session_id, session_secure_id):
         except oxygen_operations.OxygenRequestFailed:
             pass  #ignore exception
 
-@task()
+@task(base=SingleRunTask)
 def logout_non_approved_users(days_to_wait):
-    non_approved_users_list = IgniteUser.objects.filter(
+    non_approved_users_list = list(IgniteUser.objects.filter(
                                    is_child=True,
                                    is_approved=False,
                                    added__gte=utc_now() - timedelta(days=days_to_wait)
-                               ).values_list('pk', flat=True)
+                               ).values_list('pk', flat=True))
     if len(non_approved_users_list) > 0:
-        sessions = Session.objects.all()
-        for session in sessions:
-            session_uid = session.get_decoded().get('_auth_user_id')
-            if session_uid in non_approved_users_list:
-                session.delete()
-
-        Token.objects.filter(user__pk__in=non_approved_users_list).delete()
+        # Delete the users sessions (found by the user sessions mapping) and tokens:
+        api.models.UserSession.logout_users(non_approved_users_list)
 
 # Adding the user to step and lesson state
 @task()
@@ -450,7 +853,7 @@ def update_states_user():
         lesson_state.save(update_fields=['user'])
 
 #todo: add this to scheduler once all the lesson states are populated on prod
-@task()
+@task(base=SingleRunTask)
 def update_remaining_step_states_user():
     step_states = api.models.StepState.objects.filter(user__isnull=True).select_related('lesson_state', 'lesson_state__project_state')[:100]
 
@@ -458,7 +861,7 @@ def update_remaining_step_states_user():
         step_state.user = step_state.lesson_state.project_state.user
         step_state.save(update_fields=['user'])
 
-@task()
+@task(base=SingleRunTask)
 def refresh_three_last_blog_posts():
     feed = feedparser.parse(settings.BLOG_URL)
     entries = [
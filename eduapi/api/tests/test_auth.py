@@ -9,7 +9,10 @@ import urllib
 
 from collections import Counter
 
-from django.test import override_settings
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.auth import login
+from django.contrib.sessions.models import Session
+from django.contrib.sessions.backends.db import SessionStore
 from django.core.urlresolvers import reverse
 from django.conf import settings
 from django.db.models import Count, Sum, Q
@@ -25,7 +28,7 @@ from .mock_oxygen import MockOxygen
 from .utils.mock_spark_drive_api import MockSparkDriveApi
 from .base_test_case import BaseTestCase
 
-from ..models import IgniteUser, Project, ChildGuardian, Review, ProjectState, LessonState, ClassroomState
+from ..models import IgniteUser, Project, ChildGuardian, Review, ProjectState, LessonState, ClassroomState, UserSession
 from ..serializers import FullUserSerializer
 from ..views.authentication import RedisAuthentication
 from ..views import VerifyAdulthood
@@ -2353,3 +2356,33 @@ class AuthTokenTests(BaseTestCase, DRFTestCase):
         self.assertEqual(db_user.avatar, member_data['avatar'])
         self.assertTrue(db_user.avatar.startswith('https://'))
 
+
+class UserSessionTests(TestCase):
+
+    fixtures = ['test_projects_fixture_1.json']
+
+    def _login(self, user):
+        request = RequestFactory().get('/')
+        request.session = SessionStore()
+        user.backend = 'django.contrib.auth.backends.ModelBackend'
+        login(request, user)
+        request.session.save()
+        return request.session.session_key
+
+    def test_logout_users_everywhere(self):
+        user, other_user = get_user_model().objects.all()[:2]
+        sessions_keys = [self._login(user), self._login(user)]
+        other_session_key = self._login(other_user)
+
+        # Sessions are mapped to the users on login:
+        self.assertSetEqual(
+            set(UserSession.objects.filter(user=user).values_list('session_id', flat=True)),
+            set(sessions_keys)
+        )
+
+        UserSession.logout_users([user.pk])
+
+        self.assertFalse(Session.objects.filter(pk__in=sessions_keys).exists())
+        self.assertFalse(UserSession.objects.filter(user=user).exists())
+        self.assertFalse(Token.objects.filter(user=user).exists())
+        self.assertTrue(Session.objects.filter(pk=other_session_key).exists())
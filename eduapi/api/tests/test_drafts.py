@@ -13,6 +13,7 @@ from django.utils.timezone import now as utc_now
 from django.test.utils import override_settings
 from rest_framework.test import APITestCase
 from api.models import Step, Lesson, Project, OwnerDelegate
+from api.drafts_diff import get_project_draft_diff
 
 from rest_framework.test import APITestCase as DRFTestCase
 from .base_test_case import BaseTestCase, mock_sendwithus_templates
@@ -68,6 +69,34 @@ class DraftsTest(TestCase):
             for step in lesson.steps.all():
                 self.assertFalse(step.has_draft)
 
+    def test_draft_bulk_create_tree(self):
+        project = self.published_project
+        draft_project, created = project.draft_get_or_create()
+        self.assertTrue(created)
+
+        # check all lessons and steps drafts are linked to their origins and placed under the draft tree:
+        lessons = list(project.lessons.all())
+        lessons_drafts = Lesson.objects.filter(project=draft_project)
+        self.assertEqual(len(lessons), lessons_drafts.count())
+        self.assertSetEqual(set([x.id for x in lessons]), set([x.draft_origin_id for x in lessons_drafts]))
+        for lesson_draft in lessons_drafts:
+            self.assertEqual(lesson_draft.order, lesson_draft.draft_origin.order)
+            self.assertEqual(lesson_draft.title, lesson_draft.draft_origin.title)
+            steps_drafts = lesson_draft.steps.all()
+            self.assertSetEqual(
+                set(lesson_draft.draft_origin.steps.values_list('id', flat=True)),
+                set([x.draft_origin_id for x in steps_drafts])
+            )
+            # check counters were fixed:
+            self.assertEqual(lesson_draft.steps_count, steps_drafts.count())
+        self.assertEqual(Project.objects_with_drafts.get(pk=draft_project.pk).lesson_count, len(lessons))
+
+        # check that creating draft again does not create new drafts:
+        draft_project_again, created = project.draft_get_or_create()
+        self.assertFalse(created)
+        self.assertEqual(draft_project_again.pk, draft_project.pk)
+        self.assertEqual(Lesson.draft_bulk_create(lessons, {'project_id': draft_project.pk}), {})
+
     def test_draft_deep_apply(self):
         # get lesson with steps, and create draft for one of its steps:
         project = self.published_project
@@ -87,6 +116,58 @@ class DraftsTest(TestCase):
         self.assertTrue(step.has_draft)
         self.assertEqual(step.title, draft_step.title)
 
+    def test_draft_bulk_apply_only_changed(self):
+        project = self.published_project
+        draft_project, _ = project.draft_get_or_create()
+        lesson_draft = Lesson.objects.filter(project=draft_project)[0]
+        lesson_draft.title = 'Draft Lesson Title'
+        lesson_draft.save()
+        other_lessons_updated = dict(project.lessons.exclude(pk=lesson_draft.draft_origin_id).values_list('id', 'updated'))
+
+        # check diff fields are computed for all the lessons drafts:
+        lessons_diff_fields = Lesson.draft_bulk_diff_fields(Lesson.objects.filter(project=draft_project))
+        self.assertListEqual(lessons_diff_fields.pop(lesson_draft.id), ['title'])
+        self.assertTrue(all(not x for x in lessons_diff_fields.values()))
+
+        # apply and check that only the changed lesson was updated:
+        project.draft_apply()
+        self.assertEqual(Lesson.objects.get(pk=lesson_draft.draft_origin_id).title, lesson_draft.title)
+        self.assertDictEqual(
+            other_lessons_updated,
+            dict(project.lessons.exclude(pk=lesson_draft.draft_origin_id).values_list('id', 'updated'))
+        )
+        self.assertGreater(Project.objects.get(pk=project.pk).updated, project.updated)
+        # the project and the lesson applied got the same 'updated' timestamp:
+        self.assertEqual(Project.objects.get(pk=project.pk).updated, Lesson.objects.get(pk=lesson_draft.draft_origin_id).updated)
+
+    def test_project_draft_diff(self):
+        project = self.published_project
+        self.assertIsNone(get_project_draft_diff(project))
+
+        draft_project, _ = project.draft_get_or_create()
+        self.assertTrue(all(not x['diffFields'] for x in get_project_draft_diff(project)['lessons']))
+
+        # change step draft, and check the diff is recalculated (cache is keyed by the trees state):
+        step_draft = Step.objects.filter(lesson__project=draft_project)[0]
+        step_draft.title = 'Draft Step Title'
+        step_draft.save()
+        draft_diff = get_project_draft_diff(draft_project)
+        self.assertEqual(draft_diff['id'], project.id)
+        self.assertListEqual(draft_diff['diffFields'], [])
+        lessons_diff = {x['id']: x for x in draft_diff['lessons']}
+        self.assertSetEqual(set(lessons_diff.keys()), set(project.lessons.values_list('id', flat=True)))
+        steps_diff = {x['id']: x for x in lessons_diff[step_draft.draft_origin.lesson_id]['steps']}
+        self.assertEqual(steps_diff[step_draft.draft_origin_id]['title'], 'Draft Step Title')
+        self.assertListEqual(steps_diff[step_draft.draft_origin_id]['diffFields'], ['title'])
+
+        # change the origin step the same, and check the diff is recalculated (cache is keyed by the trees state):
+        step_origin = step_draft.draft_origin
+        step_origin.title = 'Draft Step Title'
+        step_origin.save()
+        lessons_diff = {x['id']: x for x in get_project_draft_diff(draft_project)['lessons']}
+        steps_diff = {x['id']: x for x in lessons_diff[step_origin.lesson_id]['steps']}
+        self.assertListEqual(steps_diff[step_origin.id]['diffFields'], [])
+
     def test_draft_writable_data_fields(self):
         project = self.published_project
         draft_project, _ = project.draft_get_or_create()
@@ -3,7 +3,6 @@ import mock
 
 from datetime import datetime
 
-from django.db import IntegrityError
 from django.utils.timezone import now as utc_now
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse
@@ -477,7 +476,7 @@ class ProjectPermissionsTests(BaseTestCase, DRFTestCase):
 
         self.client.force_authenticate(self.owner)
 
-        with mock.patch('api.tasks.add_permissions_to_classroom_students.delay') as my_mock:
+        with mock.patch('api.tasks.add_permissions_to_classroom_students.coalesce') as my_mock:
             resp = self.client.put(
                 reverse('api:classroom-project-detail', kwargs={
                     'classroom_pk': classroom.id,
@@ -489,7 +488,7 @@ class ProjectPermissionsTests(BaseTestCase, DRFTestCase):
 
             self.assertEqual(resp.status_code, 200)
 
-            my_mock.assert_called_with(classroom)
+            my_mock.assert_called_with(classroom.id, project_id=self.locked_projects.first().id)
 
         # Cleanup
         ClassroomState.objects.filter(classroom=classroom).delete()
@@ -523,7 +522,7 @@ class ProjectPermissionsTests(BaseTestCase, DRFTestCase):
             status=ClassroomState.APPROVED_STATUS
         ).save()
 
-        with mock.patch('api.tasks.add_permissions_to_classroom_students.delay') as my_mock:
+        with mock.patch('api.tasks.add_permissions_to_classroom_students.coalesce') as my_mock:
             resp = self.client.put(reverse(
                 'api:classroom-students-detail',  kwargs={
                     'classroom_pk': classroom.id,
@@ -533,7 +532,7 @@ class ProjectPermissionsTests(BaseTestCase, DRFTestCase):
 
             self.assertEqual(resp.status_code, 200)
 
-            my_mock.assert_called_with(classroom)
+            my_mock.assert_called_with(classroom.id, student_id=new_student.id)
 
         # Cleanup
         ClassroomState.objects.filter(classroom=classroom).delete()
@@ -543,7 +542,7 @@ class ProjectPermissionsTests(BaseTestCase, DRFTestCase):
         classroom2.delete()
         Purchase.objects.filter(added__gte=timestamp).delete()
 
-    def test_integrity_error_doesnt_cause_problems(self):
+    def test_existing_purchases_are_skipped(self):
 
         timestamp = utc_now()
         
@@ -568,20 +567,62 @@ class ProjectPermissionsTests(BaseTestCase, DRFTestCase):
         # Add last student and
         [cs.save() for cs in classroom_states]
 
-        # Patch Purchase.save() to raise an IntegrityError once.
-        patcher = mock.patch('api.models.Purchase.save')
-        my_mock = patcher.start()
-        def side_effect(*args, **kwargs):
-            patcher.stop()
-            raise IntegrityError('boom')
-        my_mock.side_effect = side_effect
+        # Add a purchase of one of the students beforehand (e.g. added concurrently).
+        Purchase(
+            project=self.locked_projects.first(),
+            user=classroom_states[0].user,
+            permission=Purchase.TEACH_PERM
+        ).save()
 
         purchases_count = Purchase.objects.all().count()
-        add_permissions_to_classroom_students(classroom)
+        added_count = add_permissions_to_classroom_students(classroom)
 
-        # Make sure that all of the purchases were added, but one.
+        # Make sure that all of the purchases were added, but the existing one.
         new_purchases = students.count() - 1
+        self.assertEqual(added_count, new_purchases)
         self.assertEqual(purchases_count + new_purchases, Purchase.objects.all().count())
+        self.assertEqual(Purchase.objects.get(
+            project=self.locked_projects.first(),
+            user=classroom_states[0].user
+        ).permission, Purchase.TEACH_PERM)
+
+        # Make sure that calling again adds nothing.
+        self.assertEqual(add_permissions_to_classroom_students(classroom), 0)
+
+        # Cleanup
+        [cs.delete() for cs in classroom_states]
+        pic.delete()
+        classroom.delete()
+        Purchase.objects.filter(added__gte=timestamp).delete()
+
+    def test_update_permissions_scoped_to_student(self):
+
+        timestamp = utc_now()
+
+        classroom = Classroom(title='my classroom', owner=self.owner)
+        classroom.save()
+
+        pic = ProjectInClassroom(project=self.locked_projects.first(), classroom=classroom, order=0)
+        pic.save()
+
+        students = list(get_user_model().objects.filter(
+            is_child=False
+        ).exclude(
+            id__in=Purchase.objects.all().values_list('user_id', flat=True)
+        ).distinct()[:2])
+        classroom_states = [ClassroomState(
+            classroom=classroom,
+            user=s,
+            status=ClassroomState.APPROVED_STATUS
+        ) for s in students]
+        [cs.save() for cs in classroom_states]
+
+        added_count = add_permissions_to_classroom_students(classroom, student_id=students[0].id)
+
+        # Make sure that only the permission of the scoped student was added.
+        self.assertEqual(added_count, 1)
+        self.assertTrue(Purchase.objects.filter(user=students[0], project=self.locked_projects.first()).exists())
+        self.assertFalse(Purchase.objects.filter(user=students[1], project=self.locked_projects.first()).exists())
 
         # Cleanup
         [cs.delete() for cs in classroom_states]
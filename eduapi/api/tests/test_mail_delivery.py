@@ -0,0 +1,173 @@
+import json
+
+import mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django_redis import get_redis_connection
+
+from .base_test_case import BaseTestCase
+
+from api.tasks import send_mail_template, SendMailTemplate
+from api.mail_delivery import MailDeliveryError, LocMemMailProvider, PooledSendWithUsApi, LazyMailProvider, get_mail_provider, REDIS_LIST_DEAD_LETTERS, get_dead_letters, pop_dead_letters
+
+
+@override_settings(
+    CELERY_EAGER_PROPAGATES_EXCEPTIONS=True,
+    CELERY_ALWAYS_EAGER=True,
+    BROKER_BACKEND='memory',
+    EMAIL_DELIVERY_CONCURRENCY=4,
+    EMAIL_DELIVERY_MAX_RETRIES=2)
+class MailDeliveryTests(BaseTestCase, TestCase):
+
+    def setUp(self):
+        super(MailDeliveryTests, self).setUp()
+        self.provider = LocMemMailProvider()
+        LocMemMailProvider.outbox = []
+        LocMemMailProvider.failures = {}
+        get_redis_connection('default').delete(REDIS_LIST_DEAD_LETTERS)
+        self.emails = [{
+            'recipient': {'name': 'User %s' % i, 'address': 'user%s@example.com' % i},
+            'email_data': {'index': i},
+        } for i in xrange(20)]
+
+    def tearDown(self):
+        get_redis_connection('default').delete(REDIS_LIST_DEAD_LETTERS)
+        super(MailDeliveryTests, self).tearDown()
+
+    def test_send_emails_concurrently(self):
+        with mock.patch.object(send_mail_template, 'mail_provider', self.provider):
+            num_sent = send_mail_template.run('IGNITE_notification_general', self.emails)
+
+        self.assertEqual(num_sent, len(self.emails))
+        self.assertItemsEqual(
+            [email['recipient']['address'] for email in LocMemMailProvider.outbox],
+            [email['recipient']['address'] for email in self.emails]
+        )
+        self.assertTrue(all(email['email_id'] == 'IGNITE_notification_general' for email in LocMemMailProvider.outbox))
+
+    def test_failed_emails_are_retried_and_dead_lettered(self):
+        # Fail once (retried), and fail more than the max retries (dead lettered):
+        LocMemMailProvider.failures = {
+            'user1@example.com': 1,
+            'user2@example.com': 10,
+        }
+        with mock.patch.object(send_mail_template, 'mail_provider', self.provider):
+            send_mail_template.run('IGNITE_notification_general', self.emails)
+
+        sent_addresses = [email['recipient']['address'] for email in LocMemMailProvider.outbox]
+        self.assertEqual(len(sent_addresses), len(self.emails) - 1)
+        self.assertIn('user1@example.com', sent_addresses)
+        self.assertNotIn('user2@example.com', sent_addresses)
+        # first send and 2 retries:
+        self.assertEqual(LocMemMailProvider.failures['user2@example.com'], 10 - 3)
+
+        dead_letters = get_dead_letters()
+        self.assertEqual(len(dead_letters), 1)
+        self.assertEqual(dead_letters[0]['template_name'], 'IGNITE_notification_general')
+        self.assertEqual(dead_letters[0]['email'], self.emails[2])
+
+        self.assertEqual(pop_dead_letters(), dead_letters)
+        self.assertListEqual(get_dead_letters(), [])
+
+    def test_emails_of_not_found_template_are_retried_and_dead_lettered(self):
+        with mock.patch.object(send_mail_template, 'mail_provider', self.provider), \
+                mock.patch.object(self.provider, 'requires_template_id', True), \
+                mock.patch.object(SendMailTemplate, 'get_template_by_name', return_value=None) as mock_get_template_by_name:
+            num_sent = send_mail_template.run('IGNITE_notification_general', self.emails[:2])
+
+        self.assertEqual(num_sent, 0)
+        self.assertListEqual(LocMemMailProvider.outbox, [])
+        # first send and 2 retries:
+        self.assertEqual(mock_get_template_by_name.call_count, 3)
+        self.assertItemsEqual([x['email'] for x in get_dead_letters()], self.emails[:2])
+
+
+class SendWithUsApiTests(TestCase):
+
+    def test_sdk_requests_sent_through_pooled_session(self):
+        client = PooledSendWithUsApi(api_key='test_api_key')
+        with mock.patch.object(client.session, 'request') as mock_request:
+            client.send(
+                email_id='tem_1',
+                recipient={'address': 'user@example.com'},
+                email_data={'index': 1},
+                tags=['notification'],
+            )
+
+        method, path = mock_request.call_args[0]
+        request_kwargs = mock_request.call_args[1]
+        self.assertEqual(method, 'POST')
+        self.assertTrue(path.endswith('/send'))
+        self.assertEqual(request_kwargs['auth'], ('test_api_key', ''))
+        self.assertIn(client.API_HEADER_CLIENT, request_kwargs['headers'])
+        # the payload is built by the SDK:
+        self.assertDictEqual(json.loads(request_kwargs['data']), {
+            'email_id': 'tem_1',
+            'recipient': {'address': 'user@example.com'},
+            'email_data': {'index': 1},
+            'tags': ['notification'],
+        })
+
+    @override_settings(EMAIL_DELIVERY_PROVIDER='api.mail_delivery.LocMemMailProvider')
+    def test_mail_provider_created_on_first_use(self):
+        class MailSender(object):
+            mail_provider = LazyMailProvider()
+
+        with mock.patch('api.mail_delivery.get_mail_provider', wraps=get_mail_provider) as mock_get_mail_provider:
+            self.assertEqual(mock_get_mail_provider.call_count, 0)
+            mail_provider = MailSender.mail_provider
+            self.assertIsInstance(mail_provider, LocMemMailProvider)
+            self.assertIs(MailSender().mail_provider, mail_provider)
+        self.assertEqual(mock_get_mail_provider.call_count, 1)
+
+
+class MailTemplatesCacheTests(TestCase):
+
+    templates = {'IGNITE_notification_general': {'id': 'tem_1', 'name': 'IGNITE_notification_general'}}
+
+    def setUp(self):
+        send_mail_template.clear_templates_cache()
+
+    def tearDown(self):
+        send_mail_template.clear_templates_cache()
+
+    @override_settings(EMAIL_TEMPLATES_CACHE_TIMEOUT=300)
+    def test_templates_cached_in_worker(self):
+        with mock.patch.object(send_mail_template.mail_provider, 'get_templates', return_value=self.templates):
+            send_mail_template.get_templates(force_refresh=True)
+            self.assertEqual(send_mail_template.get_template_by_name('IGNITE_notification_general')['id'], 'tem_1')
+
+            # Cached - no Redis round trips:
+            with mock.patch('api.tasks.get_redis_connection') as mock_get_redis_connection:
+                self.assertEqual(send_mail_template.get_template_by_name('IGNITE_notification_general')['id'], 'tem_1')
+                self.assertFalse(mock_get_redis_connection.called)
+
+            # Purge - the local cache is cleared, and the workers are broadcast to clear their cache:
+            with mock.patch('api.tasks.app.control.broadcast') as mock_broadcast:
+                send_mail_template.purge_templates()
+                mock_broadcast.assert_called_with('purge_mail_templates_cache')
+            self.assertEqual(send_mail_template.templates_cache, {})
+
+    @override_settings(EMAIL_TEMPLATES_CACHE_TIMEOUT=0)
+    def test_templates_reloaded_when_version_changed(self):
+        with mock.patch.object(send_mail_template.mail_provider, 'get_templates', return_value=self.templates):
+            send_mail_template.get_templates(force_refresh=True)
+            send_mail_template.get_template_by_name('IGNITE_notification_general')
+
+        # Refreshed by another worker - the version is changed:
+        new_templates = {'IGNITE_notification_general': {'id': 'tem_2', 'name': 'IGNITE_notification_general'}}
+        with mock.patch.object(send_mail_template.mail_provider, 'get_templates', return_value=new_templates):
+            send_mail_template.get_templates(force_refresh=True)
+        self.assertEqual(send_mail_template.get_template_by_name('IGNITE_notification_general')['id'], 'tem_2')
+
+    @override_settings(EMAIL_TEMPLATES_CACHE_TIMEOUT=300)
+    def test_failed_templates_load_not_cached(self):
+        get_redis_connection('default').hdel(send_mail_template.redis_hash_templates, 'templates', 'load_time')
+        with mock.patch.object(send_mail_template.mail_provider, 'get_templates', side_effect=MailDeliveryError('Failed')):
+            self.assertIsNone(send_mail_template.get_template_by_name('IGNITE_notification_general'))
+        self.assertEqual(send_mail_template.templates_cache, {})
+
+        # loaded again on next use:
+        with mock.patch.object(send_mail_template.mail_provider, 'get_templates', return_value=self.templates):
+            self.assertEqual(send_mail_template.get_template_by_name('IGNITE_notification_general')['id'], 'tem_1')
@@ -1,14 +1,18 @@
+import json
+import mock
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.test.utils import override_settings
 from django.core.urlresolvers import reverse
+from django.utils.timezone import now as utc_now
 
 from rest_framework.test import APITestCase
 
 from notifications.models import Notification
 
 from api.models import Classroom
-from api.tasks import notify_user
+from api.tasks import notify_user, notify_and_mail_users, get_object_ref, create_notification, fan_out_notifications
 from api.serializers import NotificationSerializer
 
 
@@ -37,6 +41,82 @@ class NotificationsTests(TestCase):
         self.assertEquals(notifications.count(), 1, 'More than one notification created.')
         self.assertEquals(notifications[0].unread, True, 'New notification is not marked unread.')
 
+    def test_notification_created_by_notify_task_with_json_payload(self):
+        recipients = list(get_user_model().objects.filter(name__in=["Jane Doe", "John Doe"]))
+        actor = get_user_model().objects.filter(name="Ofir Ovadia")[0]
+        target_classroom = Classroom.objects.filter(title__icontains='Super Star Destroyer')[0]
+        # Payload as serialized in the task message:
+        payload = json.loads(json.dumps({
+            'recipients': [x.pk for x in recipients],
+            'actor': get_object_ref(actor),
+            'verb': 'added to',
+            'target': get_object_ref(target_classroom),
+        }))
+        notify_and_mail_users(**payload)
+        for recipient in recipients:
+            notifications = Notification.objects.filter(
+                recipient=recipient,
+                actor_object_id=actor.pk,
+                target_object_id=target_classroom.pk,
+            )
+            self.assertEquals(notifications.count(), 1)
+
+
+    @override_settings(NOTIFICATIONS_EMAILS_CHUNK_SIZE=2, STAFF_EMAILS=[])
+    def test_notifications_fan_out_created_in_bulk_and_emailed_in_chunks(self):
+        recipients = list(get_user_model().objects.all()[:5])
+        actor = get_user_model().objects.filter(name="Ofir Ovadia")[0]
+        target_classroom = Classroom.objects.filter(title__icontains='Super Star Destroyer')[0]
+        with mock.patch('api.tasks.send_mail_template.delay') as mock_send_delay:
+            notify_and_mail_users(
+                [x.pk for x in recipients],
+                get_object_ref(actor),
+                'fanned out to',
+                _mail_template='IGNITE_notification_general',
+                target=get_object_ref(target_classroom),
+            )
+
+        notifications = Notification.objects.filter(actor_object_id=actor.pk, verb='fanned out to')
+        self.assertSetEqual({x.recipient_id for x in notifications}, {x.pk for x in recipients})
+        self.assertTrue(all(str(x.target_object_id) == str(target_classroom.pk) for x in notifications))
+
+        # Emails are handed off in chunks, with the notification of each recipient:
+        self.assertEqual(mock_send_delay.call_count, (len(recipients) + 1) // 2)
+        emails = sum([call[0][1] for call in mock_send_delay.call_args_list], [])
+        self.assertSetEqual(
+            {(email['recipient']['address'], email['email_data']['notification']['id']) for email in emails},
+            {(x.recipient.email, x.id) for x in notifications}
+        )
+
+    @override_settings(STAFF_EMAILS=[])
+    def test_notifications_fan_out_emails_only_its_own_notifications(self):
+        recipients = list(get_user_model().objects.all()[:2])
+        other_recipient = get_user_model().objects.exclude(pk__in=[x.pk for x in recipients])[0]
+        actor = get_user_model().objects.filter(name="Ofir Ovadia")[0]
+        timestamp = utc_now()
+
+        # another fan out of the same actor and verb, at the same timestamp:
+        other_notification = create_notification(other_recipient, actor, 'fanned out to', timestamp=timestamp)
+
+        with mock.patch('api.tasks.utc_now', return_value=timestamp), \
+                mock.patch('api.tasks.send_mail_template.delay') as mock_send_delay:
+            notifications = fan_out_notifications(
+                [(recipients, actor, 'fanned out to', {})],
+                _mail_template='IGNITE_notification_general',
+            )
+
+        self.assertSetEqual({x.recipient_id for x in notifications}, {x.pk for x in recipients})
+        self.assertNotIn(other_notification.pk, [x.pk for x in notifications])
+        self.assertSetEqual(
+            {x.pk for x in notifications},
+            set(Notification.objects.filter(recipient__in=recipients, verb='fanned out to').values_list('pk', flat=True))
+        )
+        emails = sum([call[0][1] for call in mock_send_delay.call_args_list], [])
+        self.assertSetEqual(
+            {email['email_data']['notification']['id'] for email in emails},
+            {x.pk for x in notifications}
+        )
+
 
 @override_settings(
     CELERY_EAGER_PROPAGATES_EXCEPTIONS=True,
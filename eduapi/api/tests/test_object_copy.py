@@ -5,6 +5,7 @@ from django.db.models import Count, Q
 from django.test import TestCase
 from rest_framework.test import APITestCase
 from api.models import Step, Lesson, Project
+from marketplace.models import Purchase
 import json
 
 class NotificationsTests(TestCase):
@@ -131,6 +132,37 @@ class ObjectCopyApiTests(APITestCase):
             self.assertEqual(resp.data[idx]['projectId'], project_3.id)
             self.assertEqual(len(resp.data[idx]['stepsIds']), l.steps.count())
 
+    def test_copy_multiple_lessons_with_copy_report(self):
+        # get user owning 2 projects and authenticate
+        user = get_user_model().objects.annotate(projects_count=Count('authored_projects')).filter(projects_count__gt=1)[0]
+        self.client.force_authenticate(user)
+
+        projects = user.authored_projects.all()
+        project_1 = projects.annotate(num_lessons=Count('lessons')).filter(num_lessons__gt=1)[0]
+        lessons = list(project_1.lessons.all())
+        project_2 = projects.filter(publish_mode=Project.PUBLISH_MODE_EDIT).exclude(id=project_1.id)[0]
+        project_2_lessons_count = project_2.lessons.count()
+
+        # Send the request
+        url_to_copy = reverse('api:project-lesson-list', kwargs={'project_pk': project_2.id })
+        url_to_copy += '?copyFromLessonsIds=%s' % ', '.join([str(x.id) for x in lessons])
+        url_to_copy += '&copyReport=true'
+        resp = self.client.post(
+            url_to_copy,
+            json.dumps({}),
+            content_type='application/json'
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(len(resp.data['lessons']), len(lessons))
+        self.assertListEqual([x['id'] for x in resp.data['copyReport']], [x.id for x in lessons])
+        for idx, report_item in enumerate(resp.data['copyReport']):
+            self.assertEqual(report_item['status'], 'copied')
+            self.assertEqual(report_item['newId'], resp.data['lessons'][idx]['id'])
+            new_lesson = Lesson.objects.get(id=report_item['newId'])
+            self.assertEqual(new_lesson.order, project_2_lessons_count + idx)
+            self.assertEqual(new_lesson.steps.count(), lessons[idx].steps.count())
+        self.assertEqual(Project.objects.get(id=project_2.id).lesson_count, project_2_lessons_count + len(lessons))
+
     def test_copy_owned_lesson_to_not_owned_project_should_fail(self):
         # get user owning 2 projects and authenticate
         user = get_user_model().objects.annotate(projects_count=Count('authored_projects')).filter(projects_count__gt=1)[0]
@@ -202,6 +234,7 @@ class ObjectCopyApiTests(APITestCase):
             content_type='application/json'
         )
         self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data['copyReport'], [{'id': lesson_to_copy.id, 'status': 'notAllowed'}])
 
     def test_copy_multiple_lessons_with_lessons_init_settings(self):
         # get user owning 3 projects and authenticate
@@ -271,3 +304,69 @@ class ObjectCopyApiTests(APITestCase):
                 self.fail(msg='Lesson init in destination project is not found in any source project.')
             expected_lessons_ids_src = [x for x in lessons_group_match['lessonsIds'] if x in lessons_to_copy_ids]
             self.assertEqual(lessons_ids_src, expected_lessons_ids_src)
+
+    def test_fork_project_by_owner(self):
+        project = Project.objects.annotate(num_lessons=Count('lessons')).filter(
+            num_lessons__gt=1,
+            publish_mode=Project.PUBLISH_MODE_EDIT,
+        )[0]
+        self.client.force_authenticate(project.owner)
+
+        resp = self.client.post(
+            reverse('api:project-fork', kwargs={'project_pk': project.id}),
+            json.dumps({'title': 'Forked project'}),
+            content_type='application/json'
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data['title'], 'Forked project')
+        self.assertEqual(resp.data['forkedFrom'], project.id)
+
+        fork_project = Project.objects.get(pk=resp.data['id'])
+        self.assertEqual(fork_project.owner, project.owner)
+        self.assertEqual(fork_project.publish_mode, Project.PUBLISH_MODE_EDIT)
+        self.assertEqual(fork_project.lesson_count, project.lessons.count())
+
+        # Check that the lessons and steps are copied in the same order:
+        fork_lessons = list(fork_project.lessons.order_by('order'))
+        for lesson, fork_lesson in zip(project.lessons.order_by('order'), fork_lessons):
+            self.assertEqual(fork_lesson.title, lesson.title)
+            self.assertEqual(fork_lesson.steps_count, lesson.steps.count())
+            self.assertListEqual(
+                list(fork_lesson.steps.order_by('order').values_list('title', flat=True)),
+                list(lesson.steps.order_by('order').values_list('title', flat=True)),
+            )
+
+    def test_fork_project_by_not_permitted_user_should_fail(self):
+        project = Project.objects.filter(publish_mode=Project.PUBLISH_MODE_EDIT)[0]
+        user = [
+            u for u in get_user_model().objects.exclude(id=project.owner_id)
+            if not u.is_child and not project.is_editor(u) and not project.can_teach(u)
+        ][0]
+        self.client.force_authenticate(user)
+
+        resp = self.client.post(
+            reverse('api:project-fork', kwargs={'project_pk': project.id}),
+            json.dumps({}),
+            content_type='application/json'
+        )
+        self.assertIn(resp.status_code, [403, 404])
+
+    def test_fork_locked_project_by_purchaser_should_fail(self):
+        project = Project.objects.filter(publish_mode=Project.PUBLISH_MODE_PUBLISHED)[0]
+        project.lock = Project.BUNDLED
+        project.save()
+        user = [
+            u for u in get_user_model().objects.exclude(id=project.owner_id)
+            if not u.is_child and not project.is_editor(u)
+        ][0]
+        Purchase.objects.update_or_create(project=project, user=user, defaults={'permission': Purchase.TEACH_PERM})
+        self.assertTrue(project.can_teach(user))
+        self.client.force_authenticate(user)
+
+        resp = self.client.post(
+            reverse('api:project-fork', kwargs={'project_pk': project.id}),
+            json.dumps({}),
+            content_type='application/json'
+        )
+        self.assertEqual(resp.status_code, 403)
+        self.assertFalse(Project.objects.filter(forked_from=project).exists())
@@ -855,6 +855,41 @@ class ProjectTests(EduApiTestCase, DRFTestCase):
         returned_ids = [x['id'] for x in response.data['results'] ]
         self.assertEqual(idList, returned_ids)
 
+    def test_tags_filter_and_tags_facet(self):
+        '''
+        Test that projects are filtered by the project tags table (case insensitive), and the tags facet counts the
+        filtered projects.
+        '''
+        project_1, project_2 = self.all_user_objects[:2]
+        project_1.tags = 'Unique Tag,Other Tag'
+        project_1.save()
+        project_2.tags = 'Unique Tag'
+        project_2.save()
+
+        response = self.client.get(self.api_list_url, {'tags': 'Unique Tag,Other Tag'})
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([x['id'] for x in response.data['results']], [project_1.id])
+
+        # tags are matched case insensitive:
+        response = self.client.get(self.api_list_url, {'tags': 'unique TAG'})
+        self.assertItemsEqual([x['id'] for x in response.data['results']], [project_1.id, project_2.id])
+
+        response = self.client.get(reverse('api:project-tags-facet'), {'pageSize': 100})
+        self.assertEqual(response.status_code, 200)
+        tags_counts = {x['tag']: x['count'] for x in response.data['results']}
+        self.assertEqual(tags_counts['unique tag'], 2)
+        self.assertEqual(tags_counts['other tag'], 1)
+
+        # facet of filtered projects:
+        response = self.client.get(reverse('api:project-tags-facet'), {'idList': str(project_2.id)})
+        self.assertListEqual(response.data['results'], [{'tag': 'unique tag', 'count': 1}])
+
+        # removed tags are removed from the tags table:
+        project_1.tags = 'Other Tag'
+        project_1.save()
+        response = self.client.get(self.api_list_url, {'tags': 'Unique Tag'})
+        self.assertListEqual([x['id'] for x in response.data['results']], [project_2.id])
+
 
     def test_get_projects_queries_num(self):
         """Test that number of queries doesn't sky rocket"""
@@ -0,0 +1,174 @@
+import time
+
+import mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from api.models import Project, Lesson
+from api.search_indexes import index_queue, results_cache, reindex
+from api.tasks import flush_search_index_queue, reindex_owner_projects
+
+
+@override_settings(SEARCH_INDEX_QUEUE_ENABLED=True)
+class SearchIndexQueueTests(TestCase):
+    fixtures = ['test_projects_fixture_1.json']
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.redis.delete(index_queue.REDIS_HASH_QUEUE, index_queue.REDIS_KEY_FLUSH_SCHEDULED)
+        index_queue._pending_on_commit.objects = None
+
+    def tearDown(self):
+        self.redis.delete(index_queue.REDIS_HASH_QUEUE, index_queue.REDIS_KEY_FLUSH_SCHEDULED)
+        index_queue._pending_on_commit.objects = None
+
+    @mock.patch.object(flush_search_index_queue, 'apply_async')
+    @mock.patch('api.search_indexes.index_queue.update_objects_index')
+    def test_saves_are_coalesced_and_flushed_in_bulk(self, mock_update_objects_index, mock_apply_async):
+        project = Project.objects.filter(lesson_count__gt=1)[0]
+        lessons = list(project.lessons.all())
+
+        # save the project several times and its lessons:
+        for i in range(3):
+            project.save()
+        for lesson in lessons:
+            lesson.save()
+
+        # check objects are enqueued only after the transaction (the test runs inside a transaction):
+        self.assertEqual(index_queue.get_objects_index_queue_stats()['pending_count'], 0)
+        index_queue.enqueue_pending_objects_index()
+
+        # check objects are pending and coalesced, and flush is scheduled only once:
+        self.assertEqual(mock_update_objects_index.call_count, 0)
+        self.assertEqual(mock_apply_async.call_count, 1)
+        self.assertEqual(index_queue.get_objects_index_queue_stats()['pending_count'], len(lessons) + 1)
+
+        # flush the queue and check each model is indexed in one bulk update:
+        flush_stats = index_queue.flush_objects_index_queue()
+        self.assertEqual(flush_stats['count'], len(lessons) + 1)
+        indexed_models_pks = {call[0][0]: set(call[0][1]) for call in mock_update_objects_index.call_args_list}
+        self.assertEqual(mock_update_objects_index.call_count, 2)
+        self.assertSetEqual(indexed_models_pks[Project], {project.id})
+        self.assertSetEqual(indexed_models_pks[Lesson], {x.id for x in lessons})
+
+        # check the queue is empty, and stats were saved:
+        queue_stats = index_queue.get_objects_index_queue_stats()
+        self.assertEqual(queue_stats['pending_count'], 0)
+        self.assertEqual(queue_stats['last_flush_count'], len(lessons) + 1)
+        self.assertIsNotNone(queue_stats['last_flush_time'])
+
+    @mock.patch.object(flush_search_index_queue, 'apply_async')
+    @mock.patch('api.search_indexes.index_queue.update_objects_index', side_effect=Exception('Search engine is down'))
+    def test_failed_flush_keeps_objects_in_queue(self, mock_update_objects_index, mock_apply_async):
+        project = Project.objects.all()[0]
+        project.save()
+        index_queue.enqueue_pending_objects_index()
+
+        self.assertRaises(Exception, index_queue.flush_objects_index_queue)
+        self.assertEqual(index_queue.get_objects_index_queue_stats()['pending_count'], 1)
+
+    @mock.patch.object(flush_search_index_queue, 'apply_async')
+    def test_drafts_are_not_enqueued(self, mock_apply_async):
+        project = Project.objects.filter(lesson_count__gt=0, publish_mode=Project.PUBLISH_MODE_PUBLISHED)[0]
+        draft_project, _ = project.draft_get_or_create()
+        draft_project.title = 'Draft Title'
+        draft_project.save()
+        for draft_lesson in draft_project.lessons.all():
+            draft_lesson.save()
+
+        index_queue.enqueue_pending_objects_index()
+        self.assertEqual(index_queue.get_objects_index_queue_stats()['pending_count'], 0)
+        self.assertEqual(mock_apply_async.call_count, 0)
+
+    @mock.patch.object(reindex_owner_projects, 'delay')
+    def test_owner_rename_reindexes_owner_projects_in_background(self, mock_reindex_delay):
+        owner = Project.objects.all()[0].owner
+
+        # saving the owner without changing the name does not reindex:
+        owner.save()
+        self.assertEqual(mock_reindex_delay.call_count, 0)
+
+        owner.name = 'New Owner Name'
+        owner.save()
+        mock_reindex_delay.assert_called_once_with(owner.pk)
+
+    @mock.patch('api.search_indexes.updates.update_objects_index')
+    def test_reindex_owner_projects(self, mock_update_objects_index):
+        owner = Project.objects.all()[0].owner
+        with override_settings(SEARCH_INDEX_QUEUE_BATCH_SIZE=1):
+            projects_count = reindex_owner_projects(owner.pk)
+        self.assertEqual(projects_count, Project.objects.filter(owner=owner).count())
+        self.assertEqual(mock_update_objects_index.call_count, projects_count)
+        self.assertSetEqual(
+            {call[0][1][0] for call in mock_update_objects_index.call_args_list},
+            set(Project.objects.filter(owner=owner).values_list('id', flat=True))
+        )
+
+    @override_settings(SEARCH_RESULTS_CACHE_TIMEOUT=60)
+    def test_search_results_are_cached_until_index_is_updated(self):
+        results_cache.bump_search_results_generation()
+        get_results = mock.Mock(return_value=[1, 2])
+
+        # same normalized query uses the cached results:
+        self.assertEqual(results_cache.normalize_search_query('Robot  arduino robot'), 'arduino robot')
+        for search_query in ['Robot  arduino robot', 'arduino Robot']:
+            params = {'q': results_cache.normalize_search_query(search_query)}
+            self.assertListEqual(results_cache.get_cached_search_results('test', params, get_results), [1, 2])
+        self.assertEqual(get_results.call_count, 1)
+
+        # flushing the index queue invalidates the cached results:
+        index_queue.flush_objects_index_queue()
+        results_cache.get_cached_search_results('test', params, get_results)
+        self.assertEqual(get_results.call_count, 1)  # queue was empty, nothing was indexed
+        with mock.patch('api.search_indexes.index_queue.update_objects_index'), mock.patch.object(flush_search_index_queue, 'apply_async'):
+            Project.objects.all()[0].save()
+            index_queue.enqueue_pending_objects_index()
+            index_queue.flush_objects_index_queue()
+        results_cache.get_cached_search_results('test', params, get_results)
+        self.assertEqual(get_results.call_count, 2)
+
+    @mock.patch('api.search_indexes.reindex.catch_up_reindex', return_value=0)
+    def test_reindex_search_resumes_from_checkpoint(self, mock_catch_up_reindex):
+        self.redis.delete(reindex.REDIS_HASH_REINDEX_RUN, reindex.REDIS_SET_REINDEX_DONE_CHUNKS)
+        chunks = reindex.plan_reindex_chunks('default', 2)
+        self.assertGreater(len(chunks), 2)
+
+        # crash on the second chunk:
+        with mock.patch('api.search_indexes.reindex.reindex_chunk', side_effect=[2, Exception('Worker crashed')]):
+            self.assertRaises(Exception, reindex.reindex_search, workers=1, chunk_size=2, resume=False)
+        reindex_run = reindex.get_reindex_run()
+        self.assertEqual(reindex_run['chunks_count'], len(chunks))
+        self.assertEqual(reindex_run['done_chunks_count'], 1)
+
+        # resume the run, and check only the pending chunks are reindexed:
+        with mock.patch('api.search_indexes.reindex.reindex_chunk', return_value=2) as mock_reindex_chunk:
+            reindex_stats = reindex.reindex_search(workers=1)
+        self.assertEqual(reindex_stats['run_id'], reindex_run['run_id'])
+        self.assertEqual(mock_reindex_chunk.call_count, len(chunks) - 1)
+        self.assertIsNone(reindex.get_reindex_run())
+
+    def test_catch_up_reindex_removes_objects_deleted_during_run(self):
+        self.redis.delete(reindex.REDIS_SET_REINDEX_FLUSHED_OBJECTS)
+        started = time.time() - 10
+        project = Project.objects.all()[0]
+        updated_project = Project.objects.exclude(pk=project.pk)[0]
+
+        # soft delete a project during the run, and log a flushed (e.g hard deleted) lesson:
+        # Note: update() does not send signals, as the objects were indexed to the old index only.
+        Project.objects.filter(pk=project.pk).update(is_deleted=True, updated=timezone.now())
+        Project.objects.filter(pk=updated_project.pk).update(updated=timezone.now())
+        self.redis.sadd(reindex.REDIS_SET_REINDEX_FLUSHED_OBJECTS, 'api.lesson.999999')
+
+        mock_backend = mock.Mock()
+        with mock.patch('api.search_indexes.reindex.get_reindex_backend', return_value=mock_backend):
+            catch_up_count = reindex.catch_up_reindex('default', None, started)
+
+        self.assertEqual(catch_up_count, 3)
+        removed_markers = {call[0][0] for call in mock_backend.remove.call_args_list}
+        self.assertSetEqual(removed_markers, {'api.project.%s' % project.pk, 'api.lesson.999999'})
+        updated_pks = {x.pk for call in mock_backend.update.call_args_list for x in call[0][1]}
+        self.assertSetEqual(updated_pks, {updated_project.pk})
+        self.assertFalse(self.redis.exists(reindex.REDIS_SET_REINDEX_FLUSHED_OBJECTS))
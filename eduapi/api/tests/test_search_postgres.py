@@ -0,0 +1,138 @@
+import datetime
+import mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from haystack import connections
+from haystack.query import SearchQuerySet, SQ
+
+from api.models import Project, Lesson, SearchDocument
+from api.search_indexes.postgres_backend import PostgresSearchEngine
+from api.search_indexes.consistency import check_model_index_consistency
+from api.search_indexes.queries import get_projects_search_query_set, get_projects_search_suggestions, SearchQuerySetObjects
+
+
+class PostgresSearchBackendTests(TestCase):
+    fixtures = ['test_projects_fixture_1.json']
+
+    def setUp(self):
+        if not isinstance(connections['default'], PostgresSearchEngine):
+            self.skipTest('Postgres search engine is not the default search connection.')
+        self.backend = connections['default'].get_backend()
+        self.unified_index = connections['default'].get_unified_index()
+        self.backend.clear()
+        self.backend.update(self.unified_index.get_index(Project), Project.objects.all())
+        self.backend.update(self.unified_index.get_index(Lesson), Lesson.objects.filter(project__in=Project.objects.all()))
+
+    def test_update_and_remove_documents(self):
+        self.assertEqual(SearchDocument.objects.filter(django_ct='api.project').count(), Project.objects.count())
+
+        project = Project.objects.all()[0]
+        self.backend.remove('api.project.%s' % project.id)
+        self.assertFalse(SearchDocument.objects.filter(django_ct='api.project', django_id=project.id).exists())
+
+    def test_search_ranks_title_matches_first(self):
+        project_1, project_2 = Project.objects.all()[:2]
+        project_1.title = 'Zebracorn robot'
+        project_1.description = ''
+        project_2.title = 'Other project'
+        project_2.description = 'Learn how to build a zebracorn.'
+        self.backend.update(self.unified_index.get_index(Project), [project_1, project_2])
+
+        results_ids = list(SearchQuerySet().models(Project).filter(content__startswith='zebrac').values_list('pk', flat=True))
+        self.assertListEqual([int(x) for x in results_ids], [project_1.id, project_2.id])
+
+        # search only in title:
+        results_ids = list(SearchQuerySet().models(Project).filter(title='zebracorn').values_list('pk', flat=True))
+        self.assertListEqual([int(x) for x in results_ids], [project_1.id])
+
+    def test_search_exact_tags_and_exclude(self):
+        project = Project.objects.all()[0]
+        project.tags = 'Unique Tag,Arduino'
+        self.backend.update(self.unified_index.get_index(Project), [project])
+
+        results = SearchQuerySet().models(Project).filter(tags__exact='Unique Tag')
+        self.assertListEqual([int(x) for x in results.values_list('pk', flat=True)], [project.id])
+        self.assertEqual(results.exclude(content='arduino').count(), 0)
+
+    def test_search_lessons_project_ids(self):
+        lesson = Lesson.objects.filter(project__in=Project.objects.all())[0]
+        results = SearchQuerySet().models(Lesson).filter(id__in=[lesson.id])
+        self.assertListEqual(list(results.values_list('project_id', flat=True)), [lesson.project_id])
+
+    def test_search_results_objects_are_paginated_by_rank(self):
+        projects = list(Project.objects.all()[:3])
+        for i, project in enumerate(projects):
+            project.title = 'Zebracorn' if i == 0 else 'Other project'
+            project.description = 'Learn how to build a zebracorn.'
+        self.backend.update(self.unified_index.get_index(Project), projects)
+
+        search_results_objects = SearchQuerySetObjects(get_projects_search_query_set('zebrac'), Project.objects.all())
+        self.assertEqual(len(search_results_objects), 3)
+        first_page = search_results_objects[0:2]
+        self.assertEqual(len(first_page), 2)
+        self.assertEqual(first_page[0].id, projects[0].id)
+
+        # objects not in the queryset are omitted from the page:
+        search_results_objects = SearchQuerySetObjects(get_projects_search_query_set('zebrac'), Project.objects.exclude(pk=projects[0].id))
+        self.assertNotIn(projects[0].id, [x.id for x in search_results_objects[0:3]])
+
+    def test_search_in_lessons_titles(self):
+        lesson = Lesson.objects.filter(project__in=Project.objects.all())[0]
+        lesson.title = 'Quokkatronics'
+        lesson.save()
+        self.backend.update(self.unified_index.get_index(Project), [lesson.project])
+
+        self.assertEqual(get_projects_search_query_set('quokkatron').count(), 0)
+        results_ids = get_projects_search_query_set('quokkatron', search_in_lesson=True).values_list('pk', flat=True)
+        self.assertListEqual([int(x) for x in results_ids], [lesson.project_id])
+
+    @override_settings(SEARCH_RESULTS_CACHE_TIMEOUT=0)
+    def test_search_suggestions_by_words_prefix(self):
+        project = Project.objects.all()[0]
+        project.title = 'Quokka Robotics'
+        project.tags = 'Quokkas,Arduino'
+        self.backend.update(self.unified_index.get_index(Project), [project])
+
+        suggestions = get_projects_search_suggestions('quok')
+        self.assertIn({'text': 'Quokka Robotics', 'type': 'title', 'projectId': project.id}, suggestions)
+        self.assertIn({'text': 'Quokkas', 'type': 'tag', 'projectId': project.id}, suggestions)
+        self.assertNotIn('Arduino', [x['text'] for x in suggestions])
+
+        suggestions = get_projects_search_suggestions('robo quok')
+        self.assertListEqual([x['text'] for x in suggestions], ['Quokka Robotics'])
+
+    @mock.patch('api.search_indexes.consistency.index_objects')
+    def test_index_consistency_check(self, mock_index_objects):
+        drift = check_model_index_consistency(Project, chunk_size=2)
+        self.assertEqual(drift['db_count'], Project.objects.count())
+        self.assertListEqual(drift['missing'] + drift['stale'] + drift['orphans'], [])
+
+        # drift the index: remove a document, update a project without indexing, and add a document of no project:
+        missing_project, stale_project = Project.objects.order_by('id')[:2]
+        self.backend.remove('api.project.%s' % missing_project.id)
+        Project.objects.filter(pk=stale_project.pk).update(updated=stale_project.updated + datetime.timedelta(minutes=5))
+        SearchDocument.objects.create(id='api.project.999999', django_ct='api.project', django_id=999999, data={})
+
+        drift = check_model_index_consistency(Project, chunk_size=2)
+        self.assertListEqual(drift['missing'], [missing_project.id])
+        self.assertListEqual(drift['stale'], [stale_project.id])
+        self.assertListEqual(drift['orphans'], [999999])
+        mock_index_objects.assert_called_with(Project, {missing_project.id, stale_project.id, 999999})
+
+    def test_search_filters_projects_visibility(self):
+        project_1, project_2, project_3 = Project.objects.all()[:3]
+        project_1.publish_mode, project_1.is_searchable = Project.PUBLISH_MODE_PUBLISHED, True
+        project_2.publish_mode, project_2.is_searchable = Project.PUBLISH_MODE_EDIT, True
+        project_3.publish_mode, project_3.is_searchable = Project.PUBLISH_MODE_PUBLISHED, False
+        self.backend.update(self.unified_index.get_index(Project), [project_1, project_2, project_3])
+
+        search_query_set = SearchQuerySet().models(Project).filter(id__in=[project_1.id, project_2.id, project_3.id])
+        published_sq_filter = SQ(publish_mode=Project.PUBLISH_MODE_PUBLISHED) & SQ(is_searchable=True)
+        results_ids = search_query_set.filter(published_sq_filter).values_list('pk', flat=True)
+        self.assertListEqual([int(x) for x in results_ids], [project_1.id])
+
+        # owner can see also its unpublished project:
+        results_ids = search_query_set.filter(published_sq_filter | SQ(owner_id__in=[project_2.owner_id])).values_list('pk', flat=True)
+        self.assertIn(project_2.id, [int(x) for x in results_ids])
+        self.assertEqual(search_query_set.filter(published_sq_filter | SQ(owner_id__in=[project_2.owner_id])).count(), len(results_ids))
@@ -0,0 +1,51 @@
+import time
+
+import mock
+
+from django.test import TestCase
+from django_redis import get_redis_connection
+
+from api.tasks import refresh_three_last_blog_posts
+
+
+class SingleRunTasksTests(TestCase):
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.lock_key = refresh_three_last_blog_posts.get_single_run_key((), {})
+        self.redis.delete(self.lock_key)
+
+    def tearDown(self):
+        self.redis.delete(self.lock_key)
+
+    @mock.patch.object(refresh_three_last_blog_posts, 'run')
+    def test_run_holds_lock_and_releases_it(self, mock_run):
+        mock_run.side_effect = lambda: self.redis.exists(self.lock_key)
+        self.assertTrue(refresh_three_last_blog_posts.apply().get())
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertFalse(self.redis.exists(self.lock_key))
+
+    @mock.patch.object(refresh_three_last_blog_posts, 'run')
+    def test_run_skipped_while_locked(self, mock_run):
+        # another run holds the lock:
+        lock = self.redis.lock(self.lock_key, timeout=60)
+        self.assertTrue(lock.acquire(blocking=False))
+
+        refresh_three_last_blog_posts.apply()
+        self.assertEqual(mock_run.call_count, 0)
+
+        lock.release()
+        refresh_three_last_blog_posts.apply()
+        self.assertEqual(mock_run.call_count, 1)
+
+    @mock.patch.object(refresh_three_last_blog_posts, 'single_run_lease', 1)
+    @mock.patch.object(refresh_three_last_blog_posts, 'run')
+    def test_lease_renewed_while_running(self, mock_run):
+        # the run takes longer than the lease:
+        def long_run():
+            time.sleep(1.5)
+            return self.redis.exists(self.lock_key)
+        mock_run.side_effect = long_run
+        self.assertTrue(refresh_three_last_blog_posts.apply().get())
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertFalse(self.redis.exists(self.lock_key))
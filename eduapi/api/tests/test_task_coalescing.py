@@ -0,0 +1,40 @@
+import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.tasks import fix_lesson_counter
+
+
+class TaskCoalescingTests(TestCase):
+
+    def setUp(self):
+        cache.delete(fix_lesson_counter.get_coalesce_key((1,), {}))
+        cache.delete(fix_lesson_counter.get_coalesce_key((2,), {}))
+
+    tearDown = setUp
+
+    @mock.patch.object(fix_lesson_counter, 'apply_async')
+    def test_enqueues_in_debounce_window_are_merged(self, mock_apply_async):
+        self.assertIsNotNone(fix_lesson_counter.coalesce(1))
+        for i in range(5):
+            self.assertIsNone(fix_lesson_counter.coalesce(1))
+        mock_apply_async.assert_called_once_with(args=(1,), kwargs={}, countdown=fix_lesson_counter.coalesce_debounce)
+
+        # different dedup key is enqueued separately:
+        fix_lesson_counter.coalesce(2)
+        self.assertEqual(mock_apply_async.call_count, 2)
+
+    @mock.patch.object(fix_lesson_counter, 'run')
+    def test_dedup_key_released_when_task_runs(self, mock_run):
+        with mock.patch.object(fix_lesson_counter, 'apply_async') as mock_apply_async:
+            fix_lesson_counter.coalesce(1)
+            self.assertIsNone(fix_lesson_counter.coalesce(1))
+        self.assertEqual(mock_apply_async.call_count, 1)
+
+        # run the enqueued task - new enqueues are not merged into it anymore:
+        fix_lesson_counter.apply(args=(1,))
+        mock_run.assert_called_once_with(1)
+        with mock.patch.object(fix_lesson_counter, 'apply_async') as mock_apply_async:
+            fix_lesson_counter.coalesce(1)
+        self.assertEqual(mock_apply_async.call_count, 1)
@@ -0,0 +1,34 @@
+from django.test import TestCase
+from django_redis import get_redis_connection
+
+from utils_app.celeryapp import app
+from utils_app.task_queues import TASK_ROUTES, QUEUE_INTERACTIVE, QUEUE_BATCH, get_task_queues_depth
+
+from api.tasks import check_task_queues_depth
+
+
+class TaskQueuesTests(TestCase):
+
+    test_queue_name = 'test_task_queue'
+
+    def setUp(self):
+        self.redis = get_redis_connection('default')
+        self.redis.delete(self.test_queue_name, self.test_queue_name + '\x06\x163')
+
+    tearDown = setUp
+
+    def test_routes_of_existing_tasks(self):
+        app.loader.import_default_modules()
+        for task_name in TASK_ROUTES:
+            self.assertIn(task_name, app.tasks)
+        self.assertEqual(TASK_ROUTES['api.tasks.add_permissions_to_classroom_students']['queue'], QUEUE_INTERACTIVE)
+        self.assertEqual(TASK_ROUTES['api.tasks.notify_user']['queue'], QUEUE_INTERACTIVE)
+        self.assertEqual(TASK_ROUTES['api.tasks.update_states_user']['queue'], QUEUE_BATCH)
+
+    def test_queues_depth(self):
+        self.redis.rpush(self.test_queue_name, 'message1', 'message2')
+        self.redis.rpush(self.test_queue_name + '\x06\x163', 'message3')
+        self.assertEqual(get_task_queues_depth([self.test_queue_name]), {self.test_queue_name: 3})
+
+        queues_depth = check_task_queues_depth.run()
+        self.assertItemsEqual(queues_depth.keys(), ['interactive', 'celery', 'batch'])
@@ -14,8 +14,11 @@ from .views import (
     LessonDetailOnlyGet,
 
     ProjectList,
+    ProjectTagsFacet,
+    ProjectSearchSuggest,
     ProjectDetail,
     ProjectModeDetail,
+    ProjectFork,
     ProjectProjectStateList,
     ProjectProjectStateDetail,
     ProjectReviewList,
@@ -40,6 +43,7 @@ from .views import (
     ClassroomCodeStateDetail,
 
     ProjectDraftDetail,
+    ProjectDraftDiff,
     LessonDraftList,
     LessonDraftDetail,
     ProjectLessonStepDraftList,
@@ -91,7 +95,10 @@ project_urls = patterns('',
     url(r'^/(?P<pk>\d+)/$', ProjectDetail.as_view(), name='project-detail'),
     url(r'^/(?P<project_id>\d+)/view_invitation/$', ViewInviteDetail.as_view(), name='view-invite-detail'),
     url(r'^/(?P<project_pk>\d+)/mode/$', ProjectModeDetail.as_view(), name='project-mode-detail'),  #->/mode/
+    url(r'^/(?P<project_pk>\d+)/fork/$', ProjectFork.as_view(), name='project-fork'),
     url(r'^/$', ProjectList.as_view(), name='project-list'),
+    url(r'^/tags/$', ProjectTagsFacet.as_view(), name='project-tags-facet'),
+    url(r'^/suggest/$', ProjectSearchSuggest.as_view(), name='project-search-suggest'),
 
     # Project -> State
     url(r'^/state/$', ProjectProjectStateList.as_view(), name='project-state-list'),
@@ -99,6 +106,7 @@ project_urls = patterns('',
 
     # Project -> Draft
     url(r'^/(?P<project_pk>\d+)/draft/$', ProjectDraftDetail.as_view(), name='project-draft-detail'),
+    url(r'^/(?P<project_pk>\d+)/draft/diff/$', ProjectDraftDiff.as_view(), name='project-draft-diff'),
     url(r'^/(?P<project_pk>\d+)/lessons/draft/$', LessonDraftList.as_view(), name='project-lesson-draft-list'),
     url(r'^/(?P<project_pk>\d+)/lessons/(?P<lesson_pk>\d+)/draft/$', LessonDraftDetail.as_view(), name='project-lesson-draft-detail'),
     url(r'^/(?P<project_pk>\d+)/lessons/(?P<lesson_pk>\d+)/steps/draft/$', ProjectLessonStepDraftList.as_view(), name='project-lesson-step-draft-list'),
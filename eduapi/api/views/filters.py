@@ -9,14 +9,13 @@ from url_filter.filtersets import FilterSet, ModelFilterSet, StrictMode
 from url_filter.filters import Filter, FilterSpec
 from url_filter.backends.django import DjangoFilterBackend, LOOKUP_SEP
 
-from api.search_indexes.queries import get_projects_ids_searched_by_exact_tags
-
 from ..models import (
     Project,
     Lesson,
     Classroom,
     ClassroomState,
     ProjectState,
+    ProjectTag,
     ChildGuardian,
     Notification,
 )
@@ -38,8 +37,9 @@ class IgniteFilterBackend(DjangoFilterBackend):
         if spec_tags:
             if not len(spec_tags.value):  #if value is empty list (not None)
                 return qs.none()
-            search_ids = get_projects_ids_searched_by_exact_tags(spec_tags.value)
-            qs = qs.filter(id__in=search_ids)
+            # filter by the indexed project tags table (the tags spec components lead to the project field):
+            projects_lookup = LOOKUP_SEP.join(spec_tags.components[:-1] + ['in']) if len(spec_tags.components) > 1 else 'pk__in'
+            qs = qs.filter(**{projects_lookup: ProjectTag.get_projects_with_tags(spec_tags.value)})
 
         # handle ordering for filtering with order:
         for spec in self.includes:
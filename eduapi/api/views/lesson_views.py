@@ -141,43 +141,57 @@ class LessonList(LessonViewMixin,
     search_fields = ('title',)
 
     def _copy_lessons_to_project(self, copy_from_lessons_ids):
-        # Get lessons to copy and check permissions:
-        disallowed_lessons_ids = []
-        copy_lessons = []
+        """
+        Copies the lessons (with their steps) to the project in bulk, and returns tuple of (new lessons, copy report).
+        The copy report lists for each requested lesson id its copy status, and the new lesson id when copied.
+        """
+        # Validate and normalize the lessons ids (keep the requested order, without duplicates):
+        lessons_ids = []
         for copy_lesson_id in copy_from_lessons_ids:
             if not copy_lesson_id.isnumeric():
                 raise exceptions.ParseError('Copy from lessons IDs must be list of integers only.')
-            try:
-                copy_lesson = Lesson.objects.get(id=copy_lesson_id)
-            except Lesson.DoesNotExist:
-                disallowed_lessons_ids.append(copy_lesson_id)
+            if int(copy_lesson_id) not in lessons_ids:
+                lessons_ids.append(int(copy_lesson_id))
+
+        # Get lessons to copy and check permissions of all of them at once:
+        existing_lessons_ids = set(Lesson.objects.filter(id__in=lessons_ids).values_list('id', flat=True))
+        allowed_lessons = {
+            lesson.id: lesson
+            for lesson in Lesson.objects.filter(
+                Project.is_editor_q(self.request.user, project_field='project'),
+                id__in=existing_lessons_ids,
+            ).select_related('project')
+        }
+
+        copy_report = []
+        for lesson_id in lessons_ids:
+            if lesson_id not in existing_lessons_ids:
+                copy_status = 'notFound'
+            elif lesson_id not in allowed_lessons:
+                copy_status = 'notAllowed'
             else:
-                # check that lesson is allowed to be copied:
-                if not copy_lesson.project.is_editor(self.request.user):
-                    disallowed_lessons_ids.append(copy_lesson_id)
-                    continue
-                # add lesson to copy list:
-                copy_lessons.append(copy_lesson)
+                copy_status = 'allowed'
+            copy_report.append({'id': lesson_id, 'status': copy_status})
 
         # If some of the lessons are not allowed to be copied:
+        disallowed_lessons_ids = [str(x['id']) for x in copy_report if x['status'] != 'allowed']
         if disallowed_lessons_ids:
-            raise exceptions.ParseError(
-                'Some of the lessons are not allowed to be copied [%s].' %
-                ', '.join(disallowed_lessons_ids)
-            )
+            raise exceptions.ValidationError({
+                'detail': 'Some of the lessons are not allowed to be copied [%s].' % ', '.join(disallowed_lessons_ids),
+                'copyReport': copy_report,
+            })
 
         # Get the project to copy to (should not fail, since permission_classes validate this):
         project = Project.objects.get(pk=self.kwargs.get('project_pk'))
 
-        # Copy the lessons:
-        new_lessons = []
-        copied_lessons_to_new_dict = {}  # gather all copied lessons to new lessons ids
-        copied_projects_set = set()  # gather all projects copied from
-        for copy_lesson in copy_lessons:
-            new_lesson = copy_lesson.copy_lesson_to_project(project)
-            new_lessons.append(new_lesson)
-            copied_lessons_to_new_dict[copy_lesson.id] = new_lesson.id
-            copied_projects_set.add(copy_lesson.project)
+        # Copy the lessons and their steps in bulk:
+        copy_lessons = [allowed_lessons[x] for x in lessons_ids]
+        copied_lessons_to_new_dict = Lesson.bulk_copy_lessons_to_project(copy_lessons, project)
+        new_lessons_by_id = Lesson.objects.in_bulk(copied_lessons_to_new_dict.values())
+        new_lessons = [new_lessons_by_id[copied_lessons_to_new_dict[x.id]] for x in copy_lessons]
+        for copy_report_item in copy_report:
+            copy_report_item['status'] = 'copied'
+            copy_report_item['newId'] = copied_lessons_to_new_dict[copy_report_item['id']]
 
         # Set extra lessonsInit of new lessons in target project:
         new_lessons_init = []
@@ -213,7 +227,7 @@ class LessonList(LessonViewMixin,
             instance = new_lessons[-1]
             instance.change_parent_updated_field(instance.updated)
 
-        return new_lessons
+        return new_lessons, copy_report
 
     def bulk_destroy(self, request, *args, **kwargs):
         id_list = request.QUERY_PARAMS.get('idList', '')
@@ -233,8 +247,14 @@ class LessonList(LessonViewMixin,
         copy_from_lessons_ids_str = self.request.GET.get('copyFromLessonsIds', '')
         copy_from_lessons_ids = filter(None, [x.strip() for x in unicode(copy_from_lessons_ids_str).split(',')])
         if copy_from_lessons_ids:
-            new_lessons = self._copy_lessons_to_project(copy_from_lessons_ids)
+            new_lessons, copy_report = self._copy_lessons_to_project(copy_from_lessons_ids)
             serializer = self.get_serializer(instance=new_lessons, many=True)
+            # Return the copy report together with the new lessons, when requested:
+            if self.request.GET.get('copyReport', '').lower() not in ['', '0', 'false']:
+                return Response(data={
+                    'lessons': serializer.data,
+                    'copyReport': copy_report,
+                }, status=status.HTTP_201_CREATED)
             return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
         # Regular create:
@@ -7,6 +7,7 @@ from rest_framework import generics
 from rest_framework import exceptions
 from rest_framework.request import clone_request
 from rest_framework.filters import OrderingFilter
+from haystack.query import SQ
 
 from .filters import MappedOrderingFilter
 from ..models import Classroom, Project, Lesson, Step, Review, ClassroomState, ProjectState, LessonState, StepState, IgniteUser, Purchase
@@ -556,6 +557,43 @@ class FilterAllowedMixin(object):
 
         return filters
 
+    def get_allowed_sq_filter(self, model=None):
+        """
+        Returns the search engine SQ filter of the allowed searchable projects (same as get_allowed_q_filter with
+        exclude_non_searchable_projects, using the visibility fields indexed), or None if all projects are allowed.
+        Note: The 'hash' query param is not supported by the search engine filter.
+        """
+        # Default model:
+        if model is None:
+            model = self.model
+
+        # If model not supported, then raise error:
+        if model != Project:
+            raise AssertionError('ProgrammingError: \'%s\' does not support \'%s\' model for search.' % (self.__class__.__name__, model.__name__))
+
+        user = self.request.user
+
+        # If super user, then do not filter:
+        if user.is_superuser:
+            return None
+
+        # Filter by published content and searchable:
+        filters = SQ(publish_mode=Project.PUBLISH_MODE_PUBLISHED) & SQ(is_searchable=True)
+
+        # If the user is logged in
+        if user and not user.is_anonymous():
+            # If user is affiliated with any app, show all projects:
+            if Lesson.get_user_app_groups(user):
+                return None
+
+            # Or unpublished content that belongs to the user or her delegators/children:
+            owners_ids = [user.pk]
+            owners_ids += list(user.delegators.values_list('pk', flat=True))
+            owners_ids += list(user.children.values_list('pk', flat=True))
+            filters |= SQ(owner_id__in=sorted(set(owners_ids)))
+
+        return filters
+
     def _get_allowed_q_filter_for_classroom(self, model, include_children_classrooms=True, exclude_archived_classrooms=False):
         user = self.request.user
 
@@ -573,6 +573,17 @@ class LessonCopyPermission(permissions.BasePermission):
         return True
 
 
+class ProjectForkPermission(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        #allow to fork project that the user can edit:
+        if obj.is_editor(request.user):
+            return True
+
+        #allow to fork project that the user can teach, only if not locked (the fork owner must not get a copy of the
+        #purchased content, that could be shared with others):
+        return obj.lock == Project.NO_LOCK and obj.can_teach(request.user)
+
+
 class IsReferredProjectOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         project = None
@@ -4,7 +4,17 @@ from rest_framework import generics
 from rest_framework import exceptions
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from api.search_indexes.queries import get_searched_projects_ids, get_projects_ids_searched_by_lesson_titles, get_projects_ids_searched_by_title_tags_author
+from rest_framework import status
+from rest_framework.response import Response
+from api.search_indexes.queries import (
+    get_searched_projects_ids,
+    get_projects_ids_searched_by_lesson_titles,
+    get_projects_ids_searched_by_title_tags_author,
+    get_projects_search_query_set,
+    get_projects_search_suggestions,
+    SearchQuerySetObjects,
+)
+from api.search_indexes.results_cache import normalize_search_query
 
 from utils_app.counter import ExtendQuerySetWithSubRelated
 
@@ -18,6 +28,8 @@ from .permissions import (
     ProjectAndLessonDraftPermission,
     ProjectDraftEditLock,
     ProjectDraftModePermission,
+    ProjectForkPermission,
+    IsNotChild,
 )
 
 from .mixins import (
@@ -29,6 +41,7 @@ from .mixins import (
     EnrichSerializerContextMixin,
     MappedOrderingView,
     UpdateWithCreateMixin,
+    DisableHttpMethodsMixin,
 )
 from drafts.views import DraftViewMixin
 
@@ -44,10 +57,13 @@ from ..serializers import (
 from ..models import (
     Project,
     ProjectState,
+    ProjectTag,
     Lesson,
     LessonState,
 )
 
+from ..drafts_diff import get_project_draft_diff
+
 from marketplace.models import Purchase
 
 from .lesson_views import (
@@ -56,6 +72,7 @@ from .lesson_views import (
 )
 
 from ..serializers import querysets
+from ..tasks import fork_project
 
 
 ######################
@@ -71,10 +88,12 @@ class ProjectViewMixin(CacheRootObjectMixin,
     embed_choices = ('lessons', 'lessonsIds', 'draft',)
     embed_user_related = ('state', 'enrolled',)
     allowed_filter_exclude_non_searchable_projects = False
+    optimize_for_serializer = True
 
     def get_queryset(self):
         queryset = Project.objects.all()
-        queryset = querysets.optimize_for_serializer_project(queryset, user=self.request.user, embed_list=self.embed_list, embed_user=self.embed_user, with_counters=True, with_permissions=True)
+        if self.optimize_for_serializer:
+            queryset = querysets.optimize_for_serializer_project(queryset, user=self.request.user, embed_list=self.embed_list, embed_user=self.embed_user, with_counters=True, with_permissions=True)
         q_filter = self.get_allowed_q_filter(exclude_non_searchable_projects=self.allowed_filter_exclude_non_searchable_projects)
         queryset = queryset.filter(q_filter)
         return queryset
@@ -99,6 +118,23 @@ class ProjectList(ProjectViewMixin,
     }
     # search_fields = ('title', 'description', 'teacher_info')
     allowed_filter_exclude_non_searchable_projects = True
+    # query params that allow to rank and paginate the search results in the indexing engine:
+    search_engine_pagination_params = ('q', 'searchTagsAuthor', 'searchInLesson', 'page', 'pageSize', 'embed', 'user', 'fields', 'format',)
+
+    def use_search_engine_pagination(self):
+        """
+        Whether to rank and paginate the searched projects in the indexing engine (only the page ids are fetched), or
+        to filter the queryset by all the searched projects ids.
+        Only search without ordering and other filters is paginated in the indexing engine.
+        """
+        return all(param in self.search_engine_pagination_params for param in self.request.QUERY_PARAMS.keys())
+
+    def paginate_queryset(self, queryset):
+        # If searched projects are ranked in the indexing engine, then paginate the search results:
+        search_query_set = getattr(self, 'search_query_set', None)
+        if search_query_set is not None:
+            queryset = SearchQuerySetObjects(search_query_set, queryset, cache_params=self.search_cache_params)
+        return super(ProjectList, self).paginate_queryset(queryset)
 
     def get_queryset(self):
         ### Technical Note: Do not do prefetch_related inside Prefetch queryset, since django will execute the query
@@ -168,7 +204,25 @@ class ProjectList(ProjectViewMixin,
 
         # Search with indexing engine
         project_search_query = self.request.QUERY_PARAMS.get('q', False)
-        if project_search_query:
+        self.search_query_set = None
+        if project_search_query and self.use_search_engine_pagination():
+            # Note: the queryset is filtered later by the ids of the page of the ranked search results.
+            allowed_sq_filter = self.get_allowed_sq_filter()
+            self.search_cache_params = {
+                'q': normalize_search_query(project_search_query),
+                'search_in_lesson': bool(self.request.QUERY_PARAMS.get('searchInLesson', False)),
+                'search_tags_author': bool(self.request.QUERY_PARAMS.get('searchTagsAuthor', False)),
+                'allowed': repr(allowed_sq_filter),
+            }
+            self.search_query_set = get_projects_search_query_set(
+                project_search_query,
+                search_in_lesson=self.search_cache_params['search_in_lesson'],
+                search_tags_author=self.search_cache_params['search_tags_author'],
+            )
+            # Filter the allowed projects in the search engine, so the pages and the total count are full:
+            if allowed_sq_filter is not None:
+                self.search_query_set = self.search_query_set.filter(allowed_sq_filter)
+        elif project_search_query:
             searchTagsAuthor = self.request.QUERY_PARAMS.get('searchTagsAuthor', False)
             if searchTagsAuthor:
                 search_ids = get_projects_ids_searched_by_title_tags_author(project_search_query)
@@ -183,6 +237,63 @@ class ProjectList(ProjectViewMixin,
         return queryset
 
 
+class ProjectTagsFacet(DisableHttpMethodsMixin, ProjectList):
+    """
+    Returns the tags of the projects list (with the same filters and search), with the number of projects of each
+    tag, ordered by the most common tags.
+    """
+    disable_http_methods = ['POST']
+    optimize_for_serializer = False
+
+    def use_search_engine_pagination(self):
+        # the tags are counted for all the searched projects:
+        return False
+
+    def list(self, request, *args, **kwargs):
+        projects_queryset = self.filter_queryset(self.get_queryset())
+        tags_counts = ProjectTag.get_tags_counts(projects_queryset)
+        page = self.paginate_queryset(tags_counts)
+        tags_counts = page if page is not None else tags_counts
+        data = [{'tag': x['name'], 'count': x['count']} for x in tags_counts]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class ProjectSearchSuggest(ProjectViewMixin,
+                           generics.ListAPIView):
+    """
+    Returns suggestions to complete the projects search query (?q=), from the projects titles, tags, author names and
+    lessons titles, using the words prefix (edge n-gram) search index.
+    """
+    permission_classes = (IsNotChildOrReadOnly, ProjectAndLessonPermission,)
+    allowed_filter_exclude_non_searchable_projects = True
+    optimize_for_serializer = False
+    suggestions_limit = 10
+    suggest_min_query_length = 2
+
+    def list(self, request, *args, **kwargs):
+        search_query = request.QUERY_PARAMS.get('q', '')
+        if len(search_query.strip()) < self.suggest_min_query_length:
+            return Response([])
+
+        # Get the suggestions of the allowed projects (in a single query):
+        suggestions = get_projects_search_suggestions(search_query)
+        allowed_projects_ids = set(self.get_queryset().filter(
+            pk__in=set([x['projectId'] for x in suggestions])
+        ).values_list('pk', flat=True))
+
+        # Return unique suggestions texts:
+        data, suggested_texts = [], set()
+        for suggestion in suggestions:
+            if suggestion['projectId'] in allowed_projects_ids and suggestion['text'].lower() not in suggested_texts:
+                suggested_texts.add(suggestion['text'].lower())
+                data.append({'text': suggestion['text'], 'type': suggestion['type']})
+                if len(data) >= self.suggestions_limit:
+                    break
+        return Response(data)
+
+
 class ProjectDetail(ProjectViewMixin,
                     generics.RetrieveUpdateDestroyAPIView):
     
@@ -202,6 +313,17 @@ class ProjectDraftDetail(DraftViewMixin,
     lookup_url_kwarg = 'project_pk'
 
 
+class ProjectDraftDiff(DisableHttpMethodsMixin, ProjectDraftDetail):
+    """
+    Returns the changes of the project draft (lessons and steps included) compared to the project.
+    """
+    disable_http_methods = ['POST', 'PUT', 'PATCH', 'DELETE']
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return Response(get_project_draft_diff(instance))
+
+
 class ProjectDraftModeDetail(ProjectModeDetail):
     permission_classes = (IsAuthenticatedOrReadOnly, ProjectDraftModePermission, ProjectDraftEditLock)
 
@@ -220,6 +342,33 @@ class ProjectDraftModeDetail(ProjectModeDetail):
         return serializer
 
 
+class ProjectFork(ProjectViewMixin,
+                  generics.CreateAPIView):
+    """
+    Forks (deep copies) the project with all its lessons and steps for the current user.
+    Use 'async' to fork very large projects in the background (the user is notified when the fork is ready).
+    """
+    permission_classes = (IsNotChild, ProjectForkPermission,)
+
+    def create(self, request, *args, **kwargs):
+        project = get_object_or_404(Project.objects.all(), pk=self.kwargs.get('project_pk'))
+        self.check_object_permissions(request, project)
+
+        fork_fields = {}
+        if request.data.get('title'):
+            fork_fields['title'] = request.data['title'][:Project._meta.get_field('title').max_length]
+
+        # Fork in the background:
+        fork_async = request.data.get('async', request.QUERY_PARAMS.get('async', False))
+        if fork_async and unicode(fork_async).lower() not in ['0', 'false']:
+            fork_project.delay(project.id, request.user.id, fork_fields)
+            return Response(status=status.HTTP_202_ACCEPTED)
+
+        new_project = project.fork(request.user, fork_fields)
+        serializer = self.get_serializer(self.get_queryset().get(pk=new_project.pk))
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 ########################
 ##### NESTED VIEWS #####
 ########################
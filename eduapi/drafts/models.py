@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction, connection
+from django.utils.timezone import now as utc_now
 
 class ChangeableDraftModel(models.Model):
     """
@@ -70,6 +71,56 @@ class ChangeableDraftModel(models.Model):
         draft_obj.save()
         return draft_obj, True
 
+    @classmethod
+    def draft_bulk_create(cls, origin_objects, draft_create_fields=None):
+        """
+        Creates drafts for all the given origin objects with a single bulk insert (no save signals are sent).
+        Origin objects that are drafts themselves or already have draft are skipped.
+        draft_create_fields is either a dict or a callable that gets the origin object and returns a dict. Fields
+        can be set by name or by attname (e.g 'lesson' or 'lesson_id').
+        Returns dict of {origin_id: draft_id} for the drafts created.
+        """
+        draft_allowed_create_fields = list(cls.draft_writable_data_fields) + list(cls.draft_writable_meta_fields) + list(cls.draft_create_fields)
+        draft_allowed_create_fields += [cls._meta.get_field(f).attname for f in draft_allowed_create_fields]
+
+        # get the origin objects that already have draft in a single query:
+        origin_objects = [x for x in origin_objects if x.draft_origin_id is None]
+        origins_with_draft_ids = set(
+            cls._base_manager.filter(
+                draft_origin_id__in=[x.pk for x in origin_objects]
+            ).values_list('draft_origin_id', flat=True)
+        ) if origin_objects else set()
+
+        # make draft object for each origin object, copying all its concrete fields:
+        draft_objs = []
+        for origin_obj in origin_objects:
+            if origin_obj.pk in origins_with_draft_ids:
+                continue
+            draft_obj = cls(**{
+                f.attname: getattr(origin_obj, f.attname)
+                for f in cls._meta.concrete_fields if not f.primary_key
+            })
+            obj_draft_create_fields = draft_create_fields(origin_obj) if callable(draft_create_fields) else (draft_create_fields or {})
+            for draft_create_field_key, draft_create_field_value in obj_draft_create_fields.items():
+                if draft_create_field_key in draft_allowed_create_fields:
+                    setattr(draft_obj, draft_create_field_key, draft_create_field_value)
+            draft_obj.draft_origin_id = origin_obj.pk
+            draft_objs.append(draft_obj)
+
+        if not draft_objs:
+            return {}
+
+        # insert all drafts, and get the ids of the drafts created mapped by their origins ids:
+        # Note: bulk_create does not set the pk on the objects, so read the drafts ids back by their draft_origin.
+        with transaction.atomic():
+            cls._base_manager.bulk_create(draft_objs)
+            drafts_ids_map = dict(
+                cls._base_manager.filter(
+                    draft_origin_id__in=[x.draft_origin_id for x in draft_objs]
+                ).values_list('draft_origin_id', 'pk')
+            )
+        return drafts_ids_map
+
     def draft_discard(self, draft_delete_kwargs=None):
         """
         Discards the draft object (really deletes it from database).
@@ -88,10 +139,12 @@ class ChangeableDraftModel(models.Model):
 
     def draft_apply(self, only_when_changed=True, deep=True):
         """
-        If this object is draft, then apply draft_copy_fields to origin object and save.
-        You may extend this apply draft method for complex models (e.g model that has related objects drafts).
+        If this object is draft, then apply draft_writable_data_fields to origin object.
+        The changed fields are computed and applied in the database, with a single UPDATE statement for each model of
+        the drafts tree (no save signals are sent for the origins updated). Override .draft_post_apply() for handling
+        the origins applied.
         Draft is not deleted after apply, so, if needed, make sure to discard the draft after applying.
-        If only_when_changed is True, then draft origin is saved only when it is changed.
+        If only_when_changed is True, then draft origin is updated only when it is changed.
         If deep is True, then apply draft recursively for any related object that is also draft.
         """
         # get draft object:
@@ -99,35 +152,149 @@ class ChangeableDraftModel(models.Model):
         if not draft_object:
             return False
 
-        # copy draft apply fields from draft object to origin, and save origin:
-        diff_fields = draft_object.draft_diff_fields() if only_when_changed else None
-        if diff_fields or not only_when_changed:
-            # copy draft apply fields from draft object to origin:
+        # apply the drafts tree in a single transaction (all the origins applied get the same 'updated' timestamp):
+        applied_time = utc_now()
+        with transaction.atomic():
+            applied_origins_ids = self._meta.model.draft_bulk_apply_tree(
+                self._meta.model._base_manager.filter(pk=draft_object.pk),
+                only_when_changed=only_when_changed,
+                deep=deep,
+                updated=applied_time,
+            )
+
+        # refresh the origin object in memory if it was applied:
+        draft_origin = draft_object.draft_origin
+        if draft_origin.pk in applied_origins_ids.get(self._meta.model, []):
             for f in draft_object.draft_writable_data_fields:
-                setattr(draft_object.draft_origin, f, getattr(draft_object, f))
-            draft_object.draft_origin.save(update_fields=self.draft_writable_data_fields)
+                setattr(draft_origin, f, getattr(draft_object, f))
+            if hasattr(draft_origin, 'updated'):
+                draft_origin.updated = applied_time
 
-        # recursively apply draft of related objects that are also drafts:
+        draft_object.draft_post_apply(applied_origins_ids, applied_time)
+        return True
+
+    def draft_post_apply(self, applied_origins_ids, applied_time):
+        """
+        Hook called on the draft object after it was applied.
+        applied_origins_ids is dict of {model: [origins ids updated]} of the whole drafts tree applied, and applied_time
+        is the 'updated' timestamp set to the origins updated.
+        """
+        pass
+
+    @classmethod
+    def _draft_related_draft_objects_fields(cls):
+        # get all related objects fields that are instance of ChangeableDraftModel:
+        return [
+            f for f in cls._meta.get_fields()
+            if (
+                (f.one_to_one or f.one_to_many) and f.auto_created and  # related object field
+                issubclass(f.related_model, ChangeableDraftModel) and  # uses drafts
+                f.name != 'draft_object'  # exclude draft_object related object field
+            )
+        ]
+
+    @classmethod
+    def draft_bulk_apply_tree(cls, drafts_queryset, only_when_changed=True, deep=True, updated=None):
+        """
+        Applies all the drafts in the queryset, and recursively (when deep) all the related objects that are drafts.
+        Returns dict of {model: [origins ids updated]}.
+        """
+        updated = updated or utc_now()
+        applied_origins_ids = {
+            cls: cls.draft_bulk_apply(drafts_queryset, only_when_changed=only_when_changed, updated=updated),
+        }
+
+        # recursively apply drafts of related objects that are also drafts:
         if deep:
-            # go over all related objects fields that are instance of ChangeableDraftModel:
-            related_draft_objects_fields = [
-                f for f in self._meta.get_fields()
-                if (
-                    (f.one_to_one or f.one_to_many) and f.auto_created and  # related object field
-                    issubclass(f.related_model, ChangeableDraftModel) and  # uses drafts
-                    f.name != 'draft_object'  # exclude draft_object related object field
-                )
-            ]
-            for rel_field in related_draft_objects_fields:
-                # go over all related objects instances that are drafts:
-                related_draft_objects = rel_field.related_model.objects.filter(**{
-                    rel_field.field.name: draft_object,
+            for rel_field in cls._draft_related_draft_objects_fields():
+                related_drafts_queryset = rel_field.related_model.objects.filter(**{
+                    rel_field.field.name + '__in': drafts_queryset.values('pk'),
                     'draft_origin__isnull': False,
                 })
-                for related_draft_obj in related_draft_objects:
-                    related_draft_obj.draft_apply(only_when_changed=only_when_changed, deep=deep)
+                for model, origins_ids in rel_field.related_model.draft_bulk_apply_tree(
+                        related_drafts_queryset,
+                        only_when_changed=only_when_changed,
+                        deep=deep,
+                        updated=updated).items():
+                    applied_origins_ids.setdefault(model, []).extend(origins_ids)
 
-        return True
+        return applied_origins_ids
+
+    @classmethod
+    def _draft_bulk_sql_params(cls, drafts_queryset):
+        drafts_sql, drafts_params = drafts_queryset.order_by().values('pk').query.sql_with_params()
+        columns = [(f, cls._meta.get_field(f).column) for f in cls.draft_writable_data_fields]
+        return {
+            'table': cls._meta.db_table,
+            'pk': cls._meta.pk.column,
+            'draft_origin': cls._meta.get_field('draft_origin').column,
+            'drafts_sql': drafts_sql,
+        }, drafts_params, columns
+
+    @classmethod
+    def draft_bulk_apply(cls, drafts_queryset, only_when_changed=True, updated=None):
+        """
+        Applies the draft_writable_data_fields of all the drafts in the queryset to their origins, with a single
+        UPDATE statement. If only_when_changed is True, then only origins that differ from their drafts are updated.
+        The origins 'updated' field (if any) is set to updated (default: now).
+        Returns list of the origins ids updated.
+        """
+        sql_params, drafts_params, columns = cls._draft_bulk_sql_params(drafts_queryset)
+        if not columns:
+            return []
+
+        set_sql = ['"%s" = d."%s"' % (column, column) for _, column in columns]
+        params = []
+        # bump the origins 'updated' field with the same timestamp:
+        if 'updated' in [f.name for f in cls._meta.concrete_fields]:
+            set_sql.append('"%s" = %%s' % cls._meta.get_field('updated').column)
+            params.append(updated or utc_now())
+        params += list(drafts_params)
+
+        changed_sql = ''
+        if only_when_changed:
+            changed_sql = ' AND (%s)' % ' OR '.join([
+                'o."%s" IS DISTINCT FROM d."%s"' % (column, column) for _, column in columns
+            ])
+
+        sql_params.update({
+            'set_sql': ', '.join(set_sql),
+            'changed_sql': changed_sql,
+        })
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE "%(table)s" AS o SET %(set_sql)s '
+                'FROM "%(table)s" AS d '
+                'WHERE o."%(pk)s" = d."%(draft_origin)s" AND d."%(pk)s" IN (%(drafts_sql)s)%(changed_sql)s '
+                'RETURNING o."%(pk)s"' % sql_params,
+                params
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @classmethod
+    def draft_bulk_diff_fields(cls, drafts_queryset):
+        """
+        Returns dict of {draft_id: [changed fields]} for all the drafts in the queryset compared to their origins,
+        computed with a single query.
+        """
+        sql_params, drafts_params, columns = cls._draft_bulk_sql_params(drafts_queryset)
+        if not columns:
+            return {}
+
+        sql_params['diff_sql'] = ', '.join([
+            'o."%s" IS DISTINCT FROM d."%s"' % (column, column) for _, column in columns
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT d."%(pk)s", %(diff_sql)s '
+                'FROM "%(table)s" AS d INNER JOIN "%(table)s" AS o ON o."%(pk)s" = d."%(draft_origin)s" '
+                'WHERE d."%(pk)s" IN (%(drafts_sql)s)' % sql_params,
+                drafts_params
+            )
+            return {
+                row[0]: [f for (f, _), is_changed in zip(columns, row[1:]) if is_changed]
+                for row in cursor.fetchall()
+            }
 
     def draft_diff_fields(self):
         """Returns list of changed fields in draft compared to origin, or None if no draft."""
@@ -122,6 +122,18 @@ EMAIL_TEMPLATES_NAMES = {
     'DELEGATE_INVITE': os.environ.get('EDU_EMAIL_T_DELEGATE_INVITE', 'IGNITE_delegate_invitation'),
     'PROJECTS_IN_REVIEW_SUMMARY': os.environ.get('EDU_EMAIL_T_PROJECTS_IN_REVIEW_SUMMARY', 'IGNITE_projects_in_review_summary'),
 }
+# Email delivery - the mail provider class (api.mail_delivery SendWithUsMailProvider, LocMemMailProvider for offline,
+# or FileMailProvider that writes the emails to EMAIL_DELIVERY_FILE_PATH), number of concurrent sends (and pooled
+# connections), number of retries of failed emails and the backoff seconds of the first retry (doubled each retry),
+# and max number of undeliverable emails to keep as dead letters:
+EMAIL_DELIVERY_PROVIDER = os.environ.get('EMAIL_DELIVERY_PROVIDER', 'api.mail_delivery.SendWithUsMailProvider')
+EMAIL_DELIVERY_FILE_PATH = os.environ.get('EMAIL_DELIVERY_FILE_PATH', '/tmp/eduapi_emails.jsonl')
+EMAIL_DELIVERY_CONCURRENCY = int(os.environ.get('EMAIL_DELIVERY_CONCURRENCY', 8))
+EMAIL_DELIVERY_MAX_RETRIES = int(os.environ.get('EMAIL_DELIVERY_MAX_RETRIES', 3))
+EMAIL_DELIVERY_RETRY_BACKOFF = int(os.environ.get('EMAIL_DELIVERY_RETRY_BACKOFF', 30))
+EMAIL_DELIVERY_DEAD_LETTERS_MAX = int(os.environ.get('EMAIL_DELIVERY_DEAD_LETTERS_MAX', 1000))
+# Seconds to keep the mail templates in the worker-local cache before checking the templates version in Redis:
+EMAIL_TEMPLATES_CACHE_TIMEOUT = int(os.environ.get('EMAIL_TEMPLATES_CACHE_TIMEOUT', 300))
 
 # Invites Settings:
 DELEGATE_INVITES_LIFE_DAYS = os.environ.get('DELEGATE_INVITES_LIFE_DAYS', 14)
@@ -320,11 +332,21 @@ SEARCHBOX_URL = os.environ.get('SEARCHBOX_URL', False)
 
 if not SEARCHBOX_URL:
     # Local setup
-    HAYSTACK_CONNECTIONS = {
-        'default': {
-            'ENGINE': 'haystack.backends.simple_backend.SimpleEngine',
-        },
-    }
+    if os.environ.get('SEARCH_POSTGRES', 'FALSE') == 'TRUE':
+        # Postgres full text search (no external search service) - opt-in.
+        # NOTE: The search documents table is empty until indexed, so after switching run: python manage.py reindex_search
+        HAYSTACK_CONNECTIONS = {
+            'default': {
+                'ENGINE': 'api.search_indexes.postgres_backend.PostgresSearchEngine',
+                'SEARCH_CONFIG': os.environ.get('SEARCH_POSTGRES_CONFIG', 'english'),
+            },
+        }
+    else:
+        HAYSTACK_CONNECTIONS = {
+            'default': {
+                'ENGINE': 'haystack.backends.simple_backend.SimpleEngine',
+            },
+        }
 else:
     es = urlparse(SEARCHBOX_URL)
     port = es.port or 80
@@ -343,6 +365,14 @@ else:
 # HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
 HAYSTACK_SIGNAL_PROCESSOR = 'api.search_indexes.signals.IgniteSignalProcessor'
 
+# Search index queue - when enabled, saved objects are queued and indexed in bulk by a celery task (instead of realtime):
+SEARCH_INDEX_QUEUE_ENABLED = os.environ.get('SEARCH_INDEX_QUEUE_ENABLED', 'TRUE') == 'TRUE'
+SEARCH_INDEX_QUEUE_FLUSH_DELAY = int(os.environ.get('SEARCH_INDEX_QUEUE_FLUSH_DELAY', 5))  # max seconds to wait for coalescing changes
+SEARCH_INDEX_QUEUE_BATCH_SIZE = int(os.environ.get('SEARCH_INDEX_QUEUE_BATCH_SIZE', 500))
+
+# Search results cache - seconds to keep the searched ids in the shared cache (invalidated when the index is updated), 0 to disable:
+SEARCH_RESULTS_CACHE_TIMEOUT = int(os.environ.get('SEARCH_RESULTS_CACHE_TIMEOUT', 60))
+
 
 # Celery
 #########
@@ -363,6 +393,8 @@ CELERY_IMPORTS = ('api.tasks',)
 CELERY_TIMEZONE = TIME_ZONE
 RUN_STATE_UPDATE_EVERY_X_MINUTES = int(os.environ.get('RUN_STATE_UPDATE_EVERY_X_MINUTES', 2))
 RUN_STATE_UPDATE_IN_HOURS_UTC = os.environ.get('RUN_STATE_UPDATE_IN_HOURS_UTC', '5,6,7,8,9,10')
+# Number of messages waiting in a task queue to warn of the queue as backed up (see api.tasks.check_task_queues_depth):
+TASK_QUEUES_DEPTH_WARNING = int(os.environ.get('TASK_QUEUES_DEPTH_WARNING', 1000))
 
 
 # Lesson Applications
@@ -469,5 +501,9 @@ try:
 except ValueError:
     STAFF_EMAILS = []
 
+# Notifications fan-out - number of notifications rows in each bulk insert, and number of emails in each send task:
+NOTIFICATIONS_BULK_BATCH_SIZE = int(os.environ.get('NOTIFICATIONS_BULK_BATCH_SIZE', 500))
+NOTIFICATIONS_EMAILS_CHUNK_SIZE = int(os.environ.get('NOTIFICATIONS_EMAILS_CHUNK_SIZE', 100))
+
 # Blog url
 BLOG_URL = os.environ.get('EDUAPI_BLOG_RSS_LINK', 'http://blog.projectignite.autodesk.com/feed/')
\ No newline at end of file
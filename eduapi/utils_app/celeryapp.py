@@ -6,6 +6,8 @@ from celery import Celery
 
 from celery.schedules import crontab
 
+from utils_app.task_queues import TASK_QUEUES, TASK_ROUTES, QUEUE_DEFAULT
+
 # set django settings module for celery workers to use django settings:
 if not settings.configured:
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eduapi.settings')
@@ -18,6 +20,18 @@ app.conf.update(
     BROKER_URL=settings.REDIS_URL,
     CELERY_RESULT_BACKEND=settings.REDIS_URL,
 
+    # Tasks take primary keys and plain JSON arguments (see api.tasks Task Payloads).
+    # Note: pickle is still accepted for the messages queued before the switch to JSON - remove it once drained.
+    CELERY_TASK_SERIALIZER='json',
+    CELERY_RESULT_SERIALIZER='json',
+    CELERY_ACCEPT_CONTENT=['json', 'pickle'],
+
+    # Tasks are routed to the interactive, default and batch queues by the routing table (see utils_app.task_queues).
+    # Each queue is consumed by its own worker (see Procfile), so the interactive tasks are not delayed by batch jobs.
+    CELERY_QUEUES=TASK_QUEUES,
+    CELERY_ROUTES=(TASK_ROUTES,),
+    CELERY_DEFAULT_QUEUE=QUEUE_DEFAULT,
+
     # IMPORTANT NOTES ABOUT REDIS:
     #   1. When using celery with Redis, each celery-worker initializes with 9 redis connections.
     #   2. Each celery task been executed will add 2 more redis connections
@@ -29,6 +43,8 @@ app.conf.update(
     # In addition, in your app, if using django-redis connections pool, then add this number of redis connections increase:
     #   MAX_AMOUNT_REDIS_CONNECTIONS = celery_worker_initial + (web_workers * 2) + (web_workers * num_connections_in_pool)
 
+    # The schedule is run by a dedicated scheduler process (celery beat, see Procfile), so the workers can be scaled
+    # out. The periodic tasks that must not run concurrently are based on utils_app.single_run.SingleRunTask.
     CELERYBEAT_SCHEDULE = {
         # Following task logs out users that are unconfirmed for more than 13 days
         'logout-if-not-confirmed': {
@@ -64,6 +80,24 @@ app.conf.update(
                                 hour=settings.RUN_STATE_UPDATE_IN_HOURS_UTC), # Executes every day 5-11 am (0-6 east coast) every 5 minutes
         },
 
+        # Following task indexes the objects pending in the search index queue (in case a scheduled flush was lost)
+        'flush-search-index-queue': {
+            'task': 'api.tasks.flush_search_index_queue',
+            'schedule': crontab(minute='*'),  #default: run every minute
+        },
+
+        # Following task audits the search index against the database, and reindexes the drifted objects
+        'check-search-index-consistency': {
+            'task': 'api.tasks.check_search_index_consistency',
+            'schedule': crontab(**getattr(settings, 'SEARCH_INDEX_CONSISTENCY_CRONTAB_TIME', {'hour': '3', 'minute': '30'})),  #default: run every day at 3:30
+        },
+
+        # Following task logs the number of messages waiting in the task queues, and warns of backed up queues
+        'check-task-queues-depth': {
+            'task': 'api.tasks.check_task_queues_depth',
+            'schedule': crontab(minute='*'),  #default: run every minute
+        },
+
         # Following task fetches 3 last blog posts and put it to cache
         'fetch-blog-posts': {
             'task': 'api.tasks.refresh_three_last_blog_posts',
@@ -0,0 +1,47 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+
+from celery.task import Task
+
+
+class CoalescedTask(Task):
+    '''
+    Base class of tasks that coalesce repeated enqueues.
+    Enqueue the task with coalesce() (instead of delay()): the task runs once after the debounce window
+    (coalesce_debounce seconds) for all the enqueues with the same dedup key in the window. The dedup key is released
+    when the task starts to run, so enqueues while it runs schedule a new run.
+
+    Usage:
+        @task(base=CoalescedTask, coalesce_debounce=5)
+        def my_task(object_id):
+            ...
+        my_task.coalesce(object_id)
+    '''
+    abstract = True
+
+    # seconds to wait for more enqueues before running the task:
+    coalesce_debounce = 5
+    # seconds to keep the dedup key after the debounce window, in case the workers are late to run the task:
+    coalesce_grace = 60
+
+    def get_coalesce_key(self, args, kwargs):
+        '''Returns the dedup key of the task call (by default the task name and arguments).'''
+        params_hash = hashlib.md5(json.dumps([list(args), kwargs], sort_keys=True)).hexdigest()
+        return 'coalesce_task_%s_%s' % (self.name, params_hash)
+
+    def coalesce(self, *args, **kwargs):
+        '''
+        Enqueues the task to run after the debounce window, unless it is already enqueued with the same dedup key.
+        Returns the AsyncResult of the enqueued task, or None if merged into the already enqueued task.
+        '''
+        if not cache.add(self.get_coalesce_key(args, kwargs), True, timeout=self.coalesce_debounce + self.coalesce_grace):
+            return None
+        return self.apply_async(args=args, kwargs=kwargs, countdown=self.coalesce_debounce)
+
+    def __call__(self, *args, **kwargs):
+        # release the dedup key when run by a worker (not when the task function is called directly):
+        if not self.request.called_directly:
+            cache.delete(self.get_coalesce_key(args, kwargs))
+        return super(CoalescedTask, self).__call__(*args, **kwargs)
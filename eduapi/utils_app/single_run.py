@@ -0,0 +1,63 @@
+import threading
+
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+
+from celery.task import Task
+from celery.utils.log import get_task_logger
+
+
+class SingleRunTask(Task):
+    '''
+    Base class of periodic tasks that must not run concurrently, e.g when several workers (or schedulers) got the same
+    scheduled task.
+    The task run holds a Redis lock (single_run_lease seconds), that is renewed while the task runs, so a long run
+    keeps the lock, and the lock of a crashed worker expires after the lease. A run that can't get the lock is skipped.
+
+    Usage:
+        @task(base=SingleRunTask, single_run_lease=60)
+        def my_periodic_task():
+            ...
+    '''
+    abstract = True
+
+    # seconds of the lock lease (renewed every third of the lease while the task runs):
+    single_run_lease = 60
+
+    def get_single_run_key(self, args, kwargs):
+        '''Returns the lock key of the task run (by default the task name - single run of the task at a time).'''
+        return 'single_run_task_%s' % (self.name,)
+
+    def __call__(self, *args, **kwargs):
+        lock = get_redis_connection('default').lock(
+            self.get_single_run_key(args, kwargs),
+            timeout=self.single_run_lease,
+            thread_local=False,  #the lock is renewed by another thread
+        )
+        if not lock.acquire(blocking=False):
+            get_task_logger(self.name).info('Skipped %s, since another run of the task is in progress.', self.name)
+            return None
+
+        # renew the lock lease while the task runs:
+        stop_renew = threading.Event()
+        def renew_lease():
+            renew_interval = self.single_run_lease / 3.0
+            while not stop_renew.wait(renew_interval):
+                try:
+                    lock.extend(renew_interval)
+                except LockError:
+                    get_task_logger(self.name).warning('Lost the single run lock of %s.', self.name)
+                    return
+        renew_thread = threading.Thread(target=renew_lease, name='single-run-lease-%s' % (self.name,))
+        renew_thread.daemon = True
+        renew_thread.start()
+
+        try:
+            return super(SingleRunTask, self).__call__(*args, **kwargs)
+        finally:
+            stop_renew.set()
+            renew_thread.join()
+            try:
+                lock.release()
+            except LockError:
+                pass  #the lease has expired
@@ -0,0 +1,70 @@
+from kombu import Queue
+
+from django_redis import get_redis_connection
+
+
+# Tasks that users wait on (e.g the students wait for the permissions of a locked project), served by their own worker:
+QUEUE_INTERACTIVE = 'interactive'
+# Other background tasks (the queue name is celery default, to keep the messages queued before the routing):
+QUEUE_DEFAULT = 'celery'
+# Periodic and bulk jobs, that may take long and must not delay the other tasks:
+QUEUE_BATCH = 'batch'
+
+TASK_QUEUES = (
+    Queue(QUEUE_INTERACTIVE, routing_key=QUEUE_INTERACTIVE),
+    Queue(QUEUE_DEFAULT, routing_key=QUEUE_DEFAULT),
+    Queue(QUEUE_BATCH, routing_key=QUEUE_BATCH),
+)
+
+# Routing table of the tasks to the queues (tasks not in the table are routed to the default queue):
+TASK_ROUTES_QUEUES = {
+    QUEUE_INTERACTIVE: (
+        'api.tasks.notify_user',
+        'api.tasks.add_permissions_to_classroom_students',
+        'api.tasks.sync_logged_in_user',
+        'api.tasks.fix_lesson_counter',
+        'states.tasks.check_if_lesson_state_completed',
+    ),
+    QUEUE_BATCH: (
+        'api.tasks.publish_ready_projects',
+        'api.tasks.notify_and_mail_users_bulk',
+        'api.tasks.send_staff_emails_of_projects_in_review_summary',
+        'api.tasks.check_search_index_consistency',
+        'api.tasks.reindex_owner_projects',
+        'api.tasks.delete_stale_delegate_invites',
+        'api.tasks.logout_non_approved_users',
+        'api.tasks.update_states_user',
+        'api.tasks.update_remaining_step_states_user',
+        'api.tasks.refresh_three_last_blog_posts',
+    ),
+}
+TASK_ROUTES = {
+    task_name: {'queue': queue_name, 'routing_key': queue_name}
+    for queue_name, tasks_names in TASK_ROUTES_QUEUES.items()
+    for task_name in tasks_names
+}
+
+# Separator of the Redis lists of the messages priorities of a queue (see kombu.transport.redis):
+_REDIS_PRIORITY_SEP = '\x06\x16'
+_REDIS_PRIORITY_STEPS = (3, 6, 9)
+
+
+def get_task_queues_depth(queues_names=None):
+    """
+    Returns dict of {queue name: number of messages waiting in the queue} of the task queues (default: all the
+    queues), from the Redis lists of the broker.
+    """
+    if queues_names is None:
+        queues_names = [queue.name for queue in TASK_QUEUES]
+    redis_conn = get_redis_connection('default')
+    pipe = redis_conn.pipeline()
+    for queue_name in queues_names:
+        pipe.llen(queue_name)
+        for priority in _REDIS_PRIORITY_STEPS:
+            pipe.llen('%s%s%s' % (queue_name, _REDIS_PRIORITY_SEP, priority))
+    lists_lengths = pipe.execute()
+    lists_per_queue = 1 + len(_REDIS_PRIORITY_STEPS)
+    return {
+        queue_name: sum(lists_lengths[i*lists_per_queue:(i+1)*lists_per_queue])
+        for i, queue_name in enumerate(queues_names)
+    }